@@ -1,39 +1,86 @@
+import contextvars
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
 from sqlalchemy.orm import Session
-import time
-
-
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
 
 from pydantic import BaseModel, Field
-from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 
 
-from app.models.domains import ComplianceDomain
+from app.models.domains import ComplianceDomain, DomainTaxonomyVersion
 from app.core.llm import get_llm
-from app.core.rate_limiter import rate_limiter
-
+from app.core.llm_policy import call_llm
+from app.core.tokens import fit_to_budget, estimate_prompt_tokens
+from app.core.embeddings import get_embedding_model
 
-#Load embedding model
-model = SentenceTransformer("all-mpnet-base-v2")
 
 EMBEDDING_THRESHOLD = 0.50
 AI_THRESHOLD = 0.70
 
+#Multi-label: primary domain plus secondary domains scoring at least this much
+TOP_K_DOMAINS = 3
+SECONDARY_MIN_SCORE = 0.40
+
 
 #Domain Cache (Avoid recomputing embeddings)
+#Keyed on the taxonomy version, so edits from seed_domains apply on the next lookup
 _domain_cache = {
     "names": None,
     "embeddings": None,
-    "timestamp": None
+    "version": None
 }
 
-CACHE_TTL = 600
+#Taxonomy Version
+
+def get_taxonomy_version(db: Session) -> int:
+    
+    row = db.query(DomainTaxonomyVersion.version).filter(DomainTaxonomyVersion.id == 1).first()
+    return row.version if row else 0
+
+
+def bump_taxonomy_version(db: Session) -> int:
+    
+    row = db.query(DomainTaxonomyVersion).filter(DomainTaxonomyVersion.id == 1).first()
+    
+    if row:
+        row.version += 1
+    else:
+        row = DomainTaxonomyVersion(id=1, version=1)
+        db.add(row)
+        
+    db.flush()
+    return row.version
+
+
+def encode_domain_embeddings(domains: List[ComplianceDomain]) -> bool:
+    """
+    Fills in missing or outdated domain embeddings in place.
+    Returns True if any domain was (re-)encoded.
+    """
+    
+    encoder = get_embedding_model()
+    
+    stale = [
+        d for d in domains
+        if d.embedding is None or d.embedding_model != encoder.model_id
+    ]
+    
+    if not stale:
+        return False
+    
+    embeddings = encoder.encode(
+        [d.description or d.name for d in stale],
+        normalize_embeddings=True
+    )
+    
+    for domain, embedding in zip(stale, embeddings):
+        domain.embedding = np.asarray(embedding, dtype=np.float32).tobytes()
+        domain.embedding_model = encoder.model_id
+        
+    return True
 
 #Load Domains from Database
 
@@ -41,25 +88,41 @@ def load_domains_from_db(db: Session) -> Tuple[List[str], np.ndarray]:
     
     global _domain_cache
     
-    if (_domain_cache["names"] is not None and time.time() - _domain_cache["timestamp"] < CACHE_TTL):
+    version = get_taxonomy_version(db)
+    
+    if _domain_cache["names"] is not None and _domain_cache["version"] == version:
         return _domain_cache["names"], _domain_cache["embeddings"]
     
-    domains = db.query(ComplianceDomain).all()
+    domains = (
+        db.query(ComplianceDomain)
+        .filter(ComplianceDomain.is_active.is_(True))
+        .order_by(ComplianceDomain.id)
+        .all()
+    )
     
     if not domains:
-        raise ValueError("No domains found in database.")
+        raise ValueError("No active domains found in database.")
     
-    names = [d.name for d in domains]
-    descriptions = [d.description for d in domains]
+    #Stored embeddings are normally current; encoding here only covers domains
+    #added outside seed_domains or a process running a different backend.
+    #It stays in memory: the caller's session may hold uncommitted work.
+    model_id = get_embedding_model().model_id
     
-    embeddings = model.encode(
-        descriptions,
-        normalize_embeddings=True
-    )
+    if any(d.embedding is None or d.embedding_model != model_id for d in domains):
+        embeddings = get_embedding_model().encode(
+            [d.description or d.name for d in domains],
+            normalize_embeddings=True
+        )
+    else:
+        embeddings = np.vstack([
+            np.frombuffer(d.embedding, dtype=np.float32) for d in domains
+        ])
+    
+    names = [d.name for d in domains]
     
     _domain_cache["names"] = names
     _domain_cache["embeddings"] = embeddings
-    _domain_cache["timestamp"] = time.time()
+    _domain_cache["version"] = version
     
     return names, embeddings
     
@@ -104,15 +167,18 @@ class DomainPrediction(BaseModel):
     
 parser = PydanticOutputParser(pydantic_object=DomainPrediction)
 
-llm = get_llm()
-
 def ai_classify(paragraph: str, valid_domains: List[str]) -> Dict:
+    """
+    LLM classification of an ambiguous paragraph. Provider errors are raised
+    once the call policy gives up; {} means the answer named no valid domain.
+    """
     
+    #Domains are a prompt input, so the JSON example below stays literal
     prompt = ChatPromptTemplate.from_messages(
         [
             (
                 "system",
-                f"""
+                """
                 You must classify the paragraph into EXACTLY ONE domain from this list:
                 
                 {valid_domains}
@@ -132,30 +198,57 @@ def ai_classify(paragraph: str, valid_domains: List[str]) -> Dict:
         ]
     )
     
-    chain = prompt| llm | parser
+    chain = prompt| get_llm() | parser
     
-    try:
-        rate_limiter.wait()  # Ensure we respect rate limits
-        result = chain.invoke({"paragraph": paragraph})
+    inputs = {
+        "valid_domains": str(valid_domains),
+        "paragraph": fit_to_budget(paragraph, stage="classification")
+    }
+    
+    result = call_llm(
+        lambda: chain.invoke(inputs),
+        stage="classification",
+        prompt_tokens=estimate_prompt_tokens(prompt, inputs)
+    )
         
-        if result.domain in valid_domains:
-            return {
-                "domain": result.domain,
-                "confidence": round(result.confidence, 3),
-                "method": "ai-based"
-            }
-            
-    except Exception:
-        pass
+    if result.domain in valid_domains:
+        return {
+            "domain": result.domain,
+            "confidence": round(result.confidence, 3),
+            "method": "ai-based"
+        }
     
     return {}
 
 
-#Single Paragraph Classification
+#Multi-Label Domains
 
-def classify_paragraph(paragraph: str, db: Session)-> Dict:
+def top_domain_labels(result: Dict, valid_domains: List[str], similarities: np.ndarray) -> List[Dict]:
+    """
+    Primary domain first, then the next best domains from the same
+    similarity row, so cross-domain obligations are searchable in each.
+    """
     
-    valid_domains, domain_embeddings = load_domains_from_db(db)
+    labels = [{"domain": result["domain"], "score": result["confidence"]}]
+    
+    for index in np.argsort(-similarities):
+        if len(labels) >= TOP_K_DOMAINS:
+            break
+        
+        score = float(similarities[index])
+        
+        if score < SECONDARY_MIN_SCORE:
+            break
+        
+        if valid_domains[index] != result["domain"]:
+            labels.append({"domain": valid_domains[index], "score": round(score, 3)})
+            
+    return labels
+
+
+#Single Paragraph Classification
+
+def _classify(paragraph: str, valid_domains: List[str], similarities: np.ndarray) -> Dict:
     
     #Rule-based first
     rule_result = rule_based_classification(paragraph, valid_domains)
@@ -164,16 +257,6 @@ def classify_paragraph(paragraph: str, db: Session)-> Dict:
         return rule_result
     
     #Embeddingd-based
-    paragraph_embedding = model.encode(
-        [paragraph],
-        normalize_embeddings=True
-    )
-    
-    similarities = cosine_similarity(
-        paragraph_embedding,
-        domain_embeddings
-    )[0]
-    
     best_index = int(np.argmax(similarities))
     best_score = float(similarities[best_index])
     predicted_domain = valid_domains[best_index]
@@ -199,26 +282,63 @@ def classify_paragraph(paragraph: str, db: Session)-> Dict:
         "confidence": round(best_score, 3),
         "method": "low-confidence"
     }
+
+
+def classify_texts(texts: List[str], db: Session, max_workers: int = 1) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Classifies many paragraphs with one embedding batch. Paragraphs that
+    fall through to the AI classifier run on max_workers threads.
+    Returns the results and the normalized paragraph embeddings.
+    """
+    
+    valid_domains, domain_embeddings = load_domains_from_db(db)
+    
+    if not texts:
+        return [], np.zeros((0, domain_embeddings.shape[1]), dtype=np.float32)
+    
+    embeddings = get_embedding_model().encode(texts, normalize_embeddings=True)
+    
+    #Embeddings are normalized, so the dot product is the cosine similarity
+    similarities = embeddings @ domain_embeddings.T
+    
+    def classify_row(index: int) -> Dict:
+        result = _classify(texts[index], valid_domains, similarities[index])
+        result["labels"] = top_domain_labels(result, valid_domains, similarities[index])
+        return result
+    
+    if max_workers <= 1 or len(texts) == 1:
+        return [classify_row(i) for i in range(len(texts))], embeddings
+    
+    #Each task runs in a copy of this context, so LLM usage is still attributed to the run
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, classify_row, i)
+            for i in range(len(texts))
+        ]
+        results = [f.result() for f in futures]
+    
+    return results, embeddings
+
+
+def classify_paragraph(paragraph: str, db: Session)-> Dict:
+    
+    results, _ = classify_texts([paragraph], db)
+    
+    return results[0]
     
         
 #Batch Classification
-def classify_paragraphs(paragraphs: List[Dict], db: Session) -> List[Dict]:
+def classify_paragraphs(paragraphs: List[Dict], db: Session, max_workers: int = 1) -> List[Dict]:
     
-    valid_domains, domain_embeddings = load_domains_from_db(db)
-    results =[]
+    results, _ = classify_texts([para["text"] for para in paragraphs], db, max_workers)
     
-    for para in paragraphs:
-        result = classify_paragraph(
-            para["text"],
-            valid_domains,
-            domain_embeddings
-        )
-        
-        results.append({
+    return [
+        {
             "paragraph_id": para["paragraph_id"],
             "domain": result["domain"],
             "confidence": result["confidence"],
-            "method": result["method"]
-        })
-        
-    return results
\ No newline at end of file
+            "method": result["method"],
+            "labels": result["labels"]
+        }
+        for para, result in zip(paragraphs, results)
+    ]
@@ -0,0 +1,510 @@
+"""
+Offline batch runs, for nightly jobs off the API nodes.
+
+    python -m app.cli ingest policies/acme --document-type vendor --output acme-ingest.jsonl
+    python -m app.cli match --client 12 --vendor 30 31 --output acme.parquet
+    python -m app.cli reaudit --all --output reaudit-2026-10-19.jsonl
+
+Results are appended to --output as JSONL, or as Parquet when it ends in
+.parquet (needs pyarrow). Finished work is recorded in a checkpoint file
+next to the output, so re-running the same command after a crash or
+Ctrl-C skips what is already done; use a new output name for a new run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+#Register all models before any query
+import app.models.documents
+import app.models.paragraph
+import app.models.paragraph_classification
+import app.models.domains
+
+from app.db.database import WorkerSessionLocal
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+from app.comparison.document_matcher import match_documents
+from app.ingestion.bulk import BulkBatch, BulkItem, ALLOWED_EXTENSIONS, run_bulk_ingestion
+from app.ingestion.upload import UPLOAD_DIR, MAX_FILE_SIZE_MB
+from app.core.config import CLI_MATCH_WORKERS, BULK_EXTRACT_PROCESSES, BULK_MAX_FILES
+
+#Parquet rows are buffered and written (and checkpointed) one row group at a time
+PARQUET_FLUSH_ROWS = 200
+
+INGEST_FIELDS = (
+    ("path", "string"),
+    ("filename", "string"),
+    ("document_id", "int64"),
+    ("batch_id", "string"),
+    ("status", "string"),
+    ("paragraphs", "int64"),
+    ("error", "string"),
+)
+
+MATCH_FIELDS = (
+    ("client_document_id", "int64"),
+    ("vendor_document_id", "int64"),
+    ("status", "string"),
+    ("error", "string"),
+    ("seconds", "float64"),
+    ("document_summary", "string"),
+    ("matched", "string"),
+    ("unmatched_client_paragraphs", "string"),
+)
+
+
+class Checkpoint:
+    """
+    Keys of finished work, one per line, appended and synced as each
+    result is written. Ingestion also records the document created for
+    each file key (in <checkpoint>.claims) before processing it, so a
+    resumed run reuses that document instead of inserting another.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.claims_path = path + ".claims"
+        self.done = set()
+        self.claims: Dict[str, int] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+        if os.path.exists(self.claims_path):
+            with open(self.claims_path, encoding="utf-8") as f:
+                for line in f:
+                    key, _, document_id = line.rstrip("\n").rpartition("\t")
+                    if key:
+                        self.claims[key] = int(document_id)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, keys: List[str]):
+
+        if not keys:
+            return
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(key + "\n" for key in keys))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.done.update(keys)
+
+    def claim(self, documents: Dict[str, int]):
+
+        if not documents:
+            return
+
+        with open(self.claims_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{key}\t{document_id}\n" for key, document_id in documents.items()))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.claims.update(documents)
+
+
+class JsonlWriter:
+
+    def __init__(self, path: str, checkpoint: Checkpoint, fields):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, key: str, record: Dict, done: bool = True):
+        self.file.write(json.dumps(record, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        if done:
+            self.checkpoint.add([key])
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Nested values (match lists, summaries) are stored as JSON strings so
+    every run shares one flat schema.
+    """
+
+    def __init__(self, path: str, checkpoint: Checkpoint, fields):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); or write to a .jsonl file.")
+
+        self.pa = pa
+        self.pq = pq
+        self.checkpoint = checkpoint
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in fields])
+
+        #A Parquet file cannot be appended to: a resumed run writes the next part
+        self.path = path
+        part = 0
+        while os.path.exists(self.path):
+            part += 1
+            self.path = f"{path[:-len('.parquet')]}.part-{part:04d}.parquet"
+
+        self.writer = None
+        self.rows: List[Dict] = []
+        self.keys: List[str] = []
+
+    def write(self, key: str, record: Dict, done: bool = True):
+        self.rows.append({
+            name: json.dumps(record.get(name), default=str) if isinstance(record.get(name), (dict, list)) else record.get(name)
+            for name in self.schema.names
+        })
+
+        if done:
+            self.keys.append(key)
+
+        if len(self.rows) >= PARQUET_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+
+        if not self.rows:
+            return
+
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+
+        self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+        self.checkpoint.add(self.keys)
+        self.rows, self.keys = [], []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(output: str, checkpoint: Checkpoint, fields):
+
+    if output.lower().endswith(".parquet"):
+        return ParquetWriter(output, checkpoint, fields)
+
+    return JsonlWriter(output, checkpoint, fields)
+
+
+#Ingestion
+
+def find_policy_files(directory: str) -> List[str]:
+
+    paths = []
+
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.lower().endswith(ALLOWED_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+
+    return sorted(paths)
+
+
+def file_key(path: str) -> str:
+    #A file edited since the last run is ingested again
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _copy_upload(path: str, file_id: str) -> str:
+
+    file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{os.path.basename(path)}")
+    shutil.copyfile(path, file_path)
+    return file_path
+
+
+def create_batch(paths: List[str], keys: List[str], document_type: str, checkpoint: Checkpoint) -> Tuple[BulkBatch, List[BulkItem]]:
+    """
+    One item per file, in order, and the batch of those still to ingest.
+    Files claimed by an interrupted run reuse their document: a completed
+    one is returned as is, any other is reset to processing and ingested
+    again. New documents are claimed before they are committed.
+    """
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    db = WorkerSessionLocal()
+    documents = []
+
+    try:
+        claimed_ids = [checkpoint.claims[key] for key in keys if key in checkpoint.claims]
+        claimed = {
+            d.id: d
+            for d in db.query(Document).filter(Document.id.in_(claimed_ids)).all()
+        } if claimed_ids else {}
+
+        new_documents = {}
+
+        for path, key in zip(paths, keys):
+            document = claimed.get(checkpoint.claims.get(key))
+
+            if document is None:
+                file_id = str(uuid.uuid4())
+                document = Document(
+                    filename=os.path.basename(path),
+                    file_path=_copy_upload(path, file_id),
+                    document_id=file_id,
+                    document_type=document_type,
+                    status="processing"
+                )
+                db.add(document)
+                new_documents[key] = document
+
+            elif document.status == "completed":
+                #Written before the crash, but not checkpointed
+                documents.append((document, True))
+                continue
+
+            else:
+                print("Resuming orphaned document:", document.id, path)
+                if not os.path.exists(document.file_path):
+                    document.file_path = _copy_upload(path, document.document_id)
+                document.status = "processing"
+
+            documents.append((document, False))
+
+        db.flush()
+        checkpoint.claim({key: document.id for key, document in new_documents.items()})
+        db.commit()
+
+        items = []
+
+        for document, finished in documents:
+            item = BulkItem(document.id, document.filename, document.file_path)
+
+            if finished:
+                item.status = "completed"
+                item.paragraphs = db.query(Paragraph).filter(Paragraph.document_id == document.id).count()
+
+            items.append(item)
+
+    except Exception:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+    return BulkBatch(document_type, [item for item in items if item.status != "completed"]), items
+
+
+def ingest(directory: str, document_type: str, writer, checkpoint: Checkpoint, processes: int, batch_size: int):
+
+    max_bytes = MAX_FILE_SIZE_MB*1024*1024
+    paths = []
+
+    for path in find_policy_files(directory):
+        key = file_key(path)
+
+        if key in checkpoint:
+            continue
+
+        if os.path.getsize(path) > max_bytes:
+            print("Skipping, file too large:", path)
+            writer.write(key, {"path": path, "filename": os.path.basename(path), "status": "skipped", "error": f"larger than {MAX_FILE_SIZE_MB} MB"}, done=False)
+            continue
+
+        paths.append(path)
+
+    print(f"Ingesting {len(paths)} files from {directory}")
+
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        keys = [file_key(path) for path in chunk]
+
+        batch, items = create_batch(chunk, keys, document_type, checkpoint)
+
+        if batch.items:
+            run_bulk_ingestion(batch, extract_processes=processes)
+
+        for path, key, item in zip(chunk, keys, items):
+            record = item.to_dict()
+            record.update({"path": path, "batch_id": batch.batch_id})
+            writer.write(key, record, done=item.status == "completed")
+
+        print(f"[{start + len(chunk)}/{len(paths)}] batch {batch.batch_id} ({batch.status}): {batch.to_dict()['counts']}")
+
+
+#Matching
+
+def pair_key(client_document_id: int, vendor_document_id: int) -> str:
+    return f"{client_document_id}:{vendor_document_id}"
+
+
+def match_pair(client_document_id: int, vendor_document_id: int) -> Dict:
+    """
+    Runs in a worker process: one session, one full match report.
+    """
+
+    db = WorkerSessionLocal()
+    started = time.perf_counter()
+
+    record = {
+        "client_document_id": client_document_id,
+        "vendor_document_id": vendor_document_id,
+        "status": "completed",
+        "error": None,
+    }
+
+    try:
+        record.update(match_documents(db, client_document_id, vendor_document_id))
+
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+
+    finally:
+        db.close()
+
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_pairs(pairs: Iterable[Tuple[int, int]], writer, checkpoint: Checkpoint, workers: int):
+
+    pending_pairs = [pair for pair in pairs if pair_key(*pair) not in checkpoint]
+    total = len(pending_pairs)
+
+    print(f"Matching {total} document pairs on {workers} processes")
+
+    if not pending_pairs:
+        return
+
+    pairs_iter = iter(pending_pairs)
+    running = {}
+    finished = 0
+
+    #spawn: each worker loads its own models and DB pool instead of inheriting the parent's
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        def submit_next() -> bool:
+            pair = next(pairs_iter, None)
+            if pair is None:
+                return False
+
+            running[pool.submit(match_pair, *pair)] = pair
+            return True
+
+        #A short queue per worker keeps every process busy without holding every pair in flight
+        while len(running) < workers * 2 and submit_next():
+            pass
+
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    pair = running.pop(future)
+                    record = future.result()
+                    writer.write(pair_key(*pair), record, done=record["status"] == "completed")
+
+                    finished += 1
+                    coverage = (record.get("document_summary") or {}).get("coverage_percentage")
+                    print(f"[{finished}/{total}] client {pair[0]} vs vendor {pair[1]}: {record['status']} coverage={coverage} in {record['seconds']}s")
+
+                    submit_next()
+
+        except KeyboardInterrupt:
+            print("Interrupted; finished pairs are checkpointed.")
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def audit_pairs(db) -> List[Tuple[int, int]]:
+    """
+    Every client x vendor pair of documents that ingested successfully.
+    """
+
+    def document_ids(document_type: str) -> List[int]:
+        rows = (
+            db.query(Document.id)
+            .filter(
+                Document.document_type == document_type,
+                Document.status != "failed",
+                Document.paragraphs.any()
+            )
+            .order_by(Document.id)
+            .all()
+        )
+        return [r.id for r in rows]
+
+    vendors = document_ids("vendor")
+    return [(client_id, vendor_id) for client_id in document_ids("client") for vendor_id in vendors]
+
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_output(command, default: str):
+        command.add_argument("--output", default=default, help="Results file: .jsonl or .parquet")
+        command.add_argument("--checkpoint", help="Defaults to <output>.checkpoint")
+
+    ingest_cmd = commands.add_parser("ingest", help="Ingest every PDF/DOCX under a directory")
+    ingest_cmd.add_argument("directory")
+    ingest_cmd.add_argument("--document-type", required=True, choices=("client", "vendor"))
+    ingest_cmd.add_argument("--processes", type=int, default=min(os.cpu_count() or BULK_EXTRACT_PROCESSES, BULK_EXTRACT_PROCESSES), help="Extraction processes, at most BULK_EXTRACT_PROCESSES")
+    ingest_cmd.add_argument("--batch-size", type=int, default=BULK_MAX_FILES, help="Files per pipeline run (and checkpoint)")
+    add_output(ingest_cmd, "ingest.jsonl")
+
+    match_cmd = commands.add_parser("match", help="Match one client document against vendor documents")
+    match_cmd.add_argument("--client", type=int, required=True)
+    match_cmd.add_argument("--vendor", type=int, nargs="+", required=True)
+    match_cmd.add_argument("--workers", type=int, default=CLI_MATCH_WORKERS)
+    add_output(match_cmd, "matches.jsonl")
+
+    reaudit_cmd = commands.add_parser("reaudit", help="Match every client document against every vendor document")
+    reaudit_cmd.add_argument("--all", action="store_true", required=True)
+    reaudit_cmd.add_argument("--workers", type=int, default=CLI_MATCH_WORKERS)
+    add_output(reaudit_cmd, "reaudit.jsonl")
+
+    args = parser.parse_args(argv)
+
+    #Each extraction process holds a parsed document; BULK_EXTRACT_PROCESSES is the memory budget
+    if args.command == "ingest" and args.processes > BULK_EXTRACT_PROCESSES:
+        print(f"Capping --processes at BULK_EXTRACT_PROCESSES={BULK_EXTRACT_PROCESSES}")
+        args.processes = BULK_EXTRACT_PROCESSES
+
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint")
+    fields = INGEST_FIELDS if args.command == "ingest" else MATCH_FIELDS
+    writer = open_writer(args.output, checkpoint, fields)
+
+    started = time.perf_counter()
+
+    try:
+        if args.command == "ingest":
+            ingest(args.directory, args.document_type, writer, checkpoint, args.processes, args.batch_size)
+
+        elif args.command == "match":
+            run_pairs([(args.client, vendor_id) for vendor_id in args.vendor], writer, checkpoint, args.workers)
+
+        else:
+            db = WorkerSessionLocal()
+            try:
+                pairs = audit_pairs(db)
+            finally:
+                db.close()
+
+            run_pairs(pairs, writer, checkpoint, args.workers)
+
+    finally:
+        writer.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s. Results: {writer.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import coo_matrix, vstack
+
+#A vendor paragraph may back this many client paragraphs before reuse costs anything
+FREE_REUSE_SLOTS = 5
+REUSE_PENALTY = 0.05
+
+
+def reuse_penalty(slot: int) -> float:
+    """
+    Penalty for the (slot + 1)-th client paragraph assigned to the same vendor paragraph.
+    """
+    return REUSE_PENALTY * max(0, slot + 1 - FREE_REUSE_SLOTS)
+
+
+def assign_vendor_paragraphs(candidates: Dict[int, List[Tuple[int, float]]]) -> Dict[int, Tuple[int, float]]:
+    """
+    Picks one vendor paragraph per client paragraph so the summed score,
+    after reuse penalties, is maximal over the whole document.
+
+    candidates maps client paragraph id -> [(vendor paragraph id, final_score)]
+    for its verified matches. Returns client paragraph id -> (vendor paragraph
+    id, penalized score).
+
+    Solved as a min-cost flow: client -> vendor edges carry the match score,
+    and each vendor drains through FREE_REUSE_SLOTS free units followed by
+    unit slots of increasing penalty. The constraint matrix is a network
+    matrix, so the simplex solution is integral. Ids are sorted up front so
+    the result does not depend on paragraph order.
+    """
+
+    client_ids = sorted(cid for cid, options in candidates.items() if options)
+
+    if not client_ids:
+        return {}
+
+    vendor_ids = sorted({vid for cid in client_ids for vid, _ in candidates[cid]})
+    vendor_index = {vid: i for i, vid in enumerate(vendor_ids)}
+
+    #Best score per (client, vendor) edge
+    edges: Dict[Tuple[int, int], float] = {}
+    for row, cid in enumerate(client_ids):
+        for vid, score in candidates[cid]:
+            key = (row, vendor_index[vid])
+            edges[key] = max(score, edges.get(key, float("-inf")))
+
+    n_clients, n_vendors, n_edges = len(client_ids), len(vendor_ids), len(edges)
+
+    edge_rows = np.fromiter((k[0] for k in edges), dtype=np.int64, count=n_edges)
+    edge_vendors = np.fromiter((k[1] for k in edges), dtype=np.int64, count=n_edges)
+    edge_scores = np.fromiter(edges.values(), dtype=np.float64, count=n_edges)
+
+    #Slot variables: one free block per vendor, then one unit per possible extra reuse
+    demand = np.bincount(edge_vendors, minlength=n_vendors)
+    extra = np.maximum(demand - FREE_REUSE_SLOTS, 0)
+
+    slot_vendors = np.concatenate((np.arange(n_vendors), np.repeat(np.arange(n_vendors), extra)))
+    slot_rank = np.concatenate((np.zeros(n_vendors), np.concatenate([np.arange(1, e + 1) for e in extra]) if extra.any() else []))
+    slot_costs = REUSE_PENALTY * slot_rank
+    slot_bounds = np.where(slot_rank == 0, FREE_REUSE_SLOTS, 1)
+
+    n_slots = len(slot_vendors)
+
+    #Each client takes exactly one edge
+    client_rows = coo_matrix(
+        (np.ones(n_edges), (edge_rows, np.arange(n_edges))),
+        shape=(n_clients, n_edges + n_slots)
+    )
+
+    #Flow into each vendor equals the flow through its slots
+    vendor_rows = coo_matrix(
+        (
+            np.concatenate((np.ones(n_edges), -np.ones(n_slots))),
+            (np.concatenate((edge_vendors, slot_vendors)), np.arange(n_edges + n_slots))
+        ),
+        shape=(n_vendors, n_edges + n_slots)
+    )
+
+    result = linprog(
+        c=np.concatenate((-edge_scores, slot_costs)),
+        A_eq=vstack((client_rows, vendor_rows)).tocsr(),
+        b_eq=np.concatenate((np.ones(n_clients), np.zeros(n_vendors))),
+        bounds=np.column_stack((
+            np.zeros(n_edges + n_slots),
+            np.concatenate((np.ones(n_edges), slot_bounds))
+        )),
+        method="highs-ds"
+    )
+
+    if not result.success:
+        raise ValueError(f"Vendor assignment failed: {result.message}")
+
+    #One chosen edge per client; rounding guards against solver noise
+    flow = result.x[:n_edges]
+    chosen = {}
+    for edge in np.flatnonzero(flow > 0.5):
+        chosen[int(edge_rows[edge])] = int(edge_vendors[edge])
+
+    #Penalties land on the later clients in document order, as reuse did before
+    assignments = {}
+    reuse_count = np.zeros(n_vendors, dtype=np.int64)
+
+    for row in range(n_clients):
+        vendor = chosen[row]
+        score = edges[(row, vendor)] - reuse_penalty(int(reuse_count[vendor]))
+        reuse_count[vendor] += 1
+        assignments[client_ids[row]] = (vendor_ids[vendor], max(0.0, round(float(score), 3)))
+
+    return assignments
@@ -3,12 +3,9 @@ from typing import Optional, Dict
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from app.core.llm import get_llm
-import time
 import random
-from langchain_mistralai import ChatMistralAI
-from app.core.rate_limiter import rate_limiter
-
-llm = get_llm()
+from app.core.llm_policy import call_llm
+from app.core.tokens import fit_to_budget, estimate_prompt_tokens
 
 AI_MATCH_CACHE: Dict[str, "AtomicMatchResult"] = {}
 
@@ -56,7 +53,14 @@ MATCH_PROMPT = ChatPromptTemplate.from_messages(
     ]
 )
 
-chain = MATCH_PROMPT | llm | parser
+_chain = None
+
+def get_chain():
+    global _chain
+
+    if _chain is None:
+        _chain = MATCH_PROMPT | get_llm() | parser
+    return _chain
 
 def atomic_ai_match(client_atomic: str, vendor_candidate: str):
     cache_key = f"{client_atomic.strip()} || {vendor_candidate.strip()}"
@@ -64,26 +68,22 @@ def atomic_ai_match(client_atomic: str, vendor_candidate: str):
     if cache_key in AI_MATCH_CACHE:
         return AI_MATCH_CACHE[cache_key]
     
-    max_retries = 3
+    inputs = {
+        "client": fit_to_budget(client_atomic, stage="atomic_match"),
+        "vendor": fit_to_budget(vendor_candidate, stage="atomic_match")
+    }
     
-    for attempt in range(max_retries):
-        
-        try:
-            rate_limiter.wait()  # Ensure we respect rate limits
-            result = chain.invoke({
-                "client": client_atomic,
-                "vendor": vendor_candidate
-            })
-            
-            AI_MATCH_CACHE[cache_key] = result
-            return result
+    try:
+        # Retries, backoff and pacing are handled by call_llm
+        result = call_llm(
+            lambda: get_chain().invoke(inputs),
+            stage="atomic_match",
+            prompt_tokens=estimate_prompt_tokens(MATCH_PROMPT, inputs)
+        )
         
-        except Exception as e:
-            
-            if "429" in str(e):
-                wait_time = 5*(attempt + 1)
-                print(f"Rate limit hit. Waiting {wait_time} seconds ...")
-                time.sleep(wait_time)
-            else:
-                break
-    return None
\ No newline at end of file
+    except Exception as e:
+        print("Atomic AI match failed:", e)
+        return None
+    
+    AI_MATCH_CACHE[cache_key] = result
+    return result
\ No newline at end of file
@@ -0,0 +1,608 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from filelock import FileLock
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db, WorkerSessionLocal
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+from app.models.paragraph_classification import ParagraphClassification
+from app.models.domains import ComplianceDomain
+from app.core.embeddings import get_embedding_model
+from app.comparison.vector_store import DomainVectorStore, cosine_to_similarity, document_index_dir
+from app.core.config import (
+    CORPUS_INDEX_DIR,
+    CORPUS_HNSW_M,
+    CORPUS_HNSW_EF_CONSTRUCTION,
+    CORPUS_HNSW_EF_SEARCH,
+)
+
+router = APIRouter(
+    prefix="/corpus-search",
+    tags=["Corpus Search"]
+)
+
+#New documents land in the small delta shard; it is folded into base once this large
+DELTA_MAX_VECTORS = 50000
+
+#Filters matching at most this many paragraphs are scored exactly instead of via HNSW
+EXACT_FILTER_LIMIT = 20000
+
+SHARDS = ("base", "delta")
+
+#Ids of documents removed from the corpus
+TOMBSTONES = "tombstones"
+
+
+class CorpusShard:
+    """
+    One HNSW index over vendor paragraph embeddings (ids = paragraphs.id)
+    plus the metadata arrays used for document and domain filters.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.index = None
+        self.paragraph_ids = np.zeros(0, dtype=np.int64)
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.label_paragraph_ids = np.zeros(0, dtype=np.int64)
+        self.label_domain_ids = np.zeros(0, dtype=np.int64)
+
+        #Paragraph ids of removed documents, and the (tombstones, size) they were computed for
+        self.removed_ids = np.zeros(0, dtype=np.int64)
+        self.removed_key = None
+
+    def __len__(self):
+        return len(self.paragraph_ids)
+
+    @staticmethod
+    def new_index(dimension: int):
+        import faiss
+
+        hnsw = faiss.IndexHNSWFlat(dimension, CORPUS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = CORPUS_HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(hnsw)
+
+    def add(self, vectors: np.ndarray, paragraph_ids: np.ndarray, document_ids: np.ndarray, label_paragraph_ids: np.ndarray, label_domain_ids: np.ndarray):
+
+        if self.index is None:
+            self.index = self.new_index(vectors.shape[1])
+
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), paragraph_ids)
+
+        self.paragraph_ids = np.concatenate((self.paragraph_ids, paragraph_ids))
+        self.document_ids = np.concatenate((self.document_ids, document_ids))
+        self.label_paragraph_ids = np.concatenate((self.label_paragraph_ids, label_paragraph_ids))
+        self.label_domain_ids = np.concatenate((self.label_domain_ids, label_domain_ids))
+
+    def vectors(self) -> np.ndarray:
+        if self.index is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.index.reconstruct_batch(self.paragraph_ids)
+
+    def removed_paragraph_ids(self, removed: np.ndarray) -> np.ndarray:
+        """
+        Paragraph ids of this shard belonging to removed documents. Computed
+        once per tombstone list and shard size, not per query.
+        """
+
+        key = (removed.tobytes(), len(self))
+
+        if key != self.removed_key:
+            self.removed_ids = self.paragraph_ids[np.isin(self.document_ids, removed)] if len(removed) else np.zeros(0, dtype=np.int64)
+            self.removed_key = key
+
+        return self.removed_ids
+
+    def allowed_ids(self, domain_id: Optional[int], document_ids: Optional[List[int]], removed_ids: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Paragraph ids passing the domain and document filters, or None when
+        nothing is filtered. Paragraphs in removed_ids never pass.
+        """
+
+        if domain_id is None and not document_ids:
+            return None
+
+        mask = np.ones(len(self.paragraph_ids), dtype=bool)
+
+        if document_ids:
+            mask &= np.isin(self.document_ids, document_ids)
+
+        if len(removed_ids):
+            mask &= ~np.isin(self.paragraph_ids, removed_ids)
+
+        if domain_id is not None:
+            labelled = self.label_paragraph_ids[self.label_domain_ids == domain_id]
+            mask &= np.isin(self.paragraph_ids, labelled)
+
+        return self.paragraph_ids[mask]
+
+    def search(self, query: np.ndarray, top_k: int, domain_id: Optional[int], document_ids: Optional[List[int]], removed: np.ndarray):
+        import faiss
+
+        if self.index is None or not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        removed_ids = self.removed_paragraph_ids(removed)
+        allowed = self.allowed_ids(domain_id, document_ids, removed_ids)
+
+        if allowed is not None and len(allowed) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        #Narrow filters: exact scores over the few matching vectors
+        if allowed is not None and len(allowed) <= EXACT_FILTER_LIMIT:
+            scores = self.index.reconstruct_batch(allowed) @ query[0]
+            top = np.argsort(-scores)[:top_k]
+            return allowed[top], scores[top]
+
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(CORPUS_HNSW_EF_SEARCH, top_k)
+        searchable = len(self)
+
+        if allowed is not None:
+            selector = faiss.IDSelectorBatch(allowed)
+            params.sel = selector
+            searchable = len(allowed)
+
+        #Unfiltered: a deny-list of the (few) removed paragraphs, not an allow-list of the shard
+        elif len(removed_ids):
+            denied = faiss.IDSelectorBatch(removed_ids)
+            selector = faiss.IDSelectorNot(denied)
+            params.sel = selector
+            searchable = len(self) - len(removed_ids)
+
+        if searchable <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores, ids = self.index.search(query, min(top_k, searchable), params=params)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+    def without_documents(self, removed: np.ndarray) -> "CorpusShard":
+        """
+        A copy of this shard with the given documents' paragraphs dropped.
+        """
+
+        keep = ~np.isin(self.document_ids, removed)
+        keep_labels = np.isin(self.label_paragraph_ids, self.paragraph_ids[keep])
+        shard = CorpusShard(self.name)
+
+        if np.any(keep):
+            shard.add(
+                self.vectors()[keep],
+                self.paragraph_ids[keep],
+                self.document_ids[keep],
+                self.label_paragraph_ids[keep_labels],
+                self.label_domain_ids[keep_labels],
+            )
+
+        return shard
+
+    def save(self, directory: str):
+        import faiss
+
+        index_path = os.path.join(directory, f"{self.name}.faiss")
+        meta_path = os.path.join(directory, f"{self.name}_meta.npz")
+
+        if self.index is None:
+            for path in (index_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        #Write then rename, so readers never see a half-written file
+        faiss.write_index(self.index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+
+        with open(meta_path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                paragraph_ids=self.paragraph_ids,
+                document_ids=self.document_ids,
+                label_paragraph_ids=self.label_paragraph_ids,
+                label_domain_ids=self.label_domain_ids,
+            )
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "CorpusShard":
+        import faiss
+
+        shard = cls(name)
+        index_path = os.path.join(directory, f"{name}.faiss")
+        meta_path = os.path.join(directory, f"{name}_meta.npz")
+
+        if not os.path.exists(meta_path):
+            return shard
+
+        meta = np.load(meta_path)
+        index = faiss.read_index(index_path)
+
+        #Caught between the index and metadata renames of a concurrent save
+        if index.ntotal != len(meta["paragraph_ids"]):
+            raise RuntimeError(f"Corpus shard {name} is being written")
+
+        shard.index = index
+        shard.paragraph_ids = meta["paragraph_ids"]
+        shard.document_ids = meta["document_ids"]
+        shard.label_paragraph_ids = meta["label_paragraph_ids"]
+        shard.label_domain_ids = meta["label_domain_ids"]
+        return shard
+
+
+class CorpusIndex:
+    """
+    Approximate nearest-neighbour index over every stored vendor paragraph.
+
+    The index lives on disk in a large base shard and a small delta shard.
+    Ingestion appends to the delta (rewriting only that file) under a file
+    lock shared by all processes; the base is rewritten only when the delta
+    is merged into it. Removed documents (deleted or superseded by a new
+    revision) are recorded as tombstones, hidden from searches and dropped
+    from the shards at the next merge. Readers reload a file when it changes.
+    """
+
+    def __init__(self, directory: str = CORPUS_INDEX_DIR):
+        self.directory = directory
+        self.shards: Dict[str, CorpusShard] = {name: CorpusShard(name) for name in SHARDS}
+        self.removed = np.zeros(0, dtype=np.int64)
+        self.loaded_versions: Dict[str, Optional[int]] = {name: None for name in SHARDS + (TOMBSTONES,)}
+        self.lock = threading.Lock()
+
+    def _file_lock(self) -> FileLock:
+        os.makedirs(self.directory, exist_ok=True)
+        return FileLock(os.path.join(self.directory, "corpus.lock"))
+
+    def _path(self, name: str) -> str:
+        if name == TOMBSTONES:
+            return os.path.join(self.directory, f"{TOMBSTONES}.npy")
+        return os.path.join(self.directory, f"{name}_meta.npz")
+
+    def _version(self, name: str) -> Optional[int]:
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _save(self, names):
+        """
+        Writes the named shards (and/or tombstones) and records their versions,
+        so this process does not reload its own writes.
+        """
+
+        for name in names:
+            if name == TOMBSTONES:
+                path = self._path(TOMBSTONES)
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, self.removed)
+                os.replace(path + ".tmp", path)
+            else:
+                self.shards[name].save(self.directory)
+
+            self.loaded_versions[name] = self._version(name)
+
+    def refresh(self):
+        """
+        Picks up shards written by other processes.
+        """
+
+        for name in SHARDS:
+            version = self._version(name)
+
+            if version == self.loaded_versions[name]:
+                continue
+
+            with self.lock:
+                if version == self.loaded_versions[name]:
+                    continue
+
+                try:
+                    self.shards[name] = CorpusShard.load(self.directory, name)
+                except RuntimeError:
+                    #Retried on the next refresh
+                    continue
+
+                self.loaded_versions[name] = version
+
+        version = self._version(TOMBSTONES)
+
+        if version != self.loaded_versions[TOMBSTONES]:
+            with self.lock:
+                self.removed = np.load(self._path(TOMBSTONES)) if version is not None else np.zeros(0, dtype=np.int64)
+                self.loaded_versions[TOMBSTONES] = version
+
+    def contains_document(self, document_id: int) -> bool:
+        return any(bool(np.any(s.document_ids == document_id)) for s in self.shards.values())
+
+    def is_removed(self, document_id: int) -> bool:
+        return bool(np.any(self.removed == document_id))
+
+    def _tombstone(self, document_id: int) -> bool:
+
+        if self.is_removed(document_id):
+            return False
+
+        self.removed = np.append(self.removed, np.int64(document_id))
+        return True
+
+    def remove_document(self, document_id: int) -> bool:
+        """
+        Hides a deleted document's paragraphs from searches. Returns False if
+        it was already removed.
+        """
+
+        with self._file_lock():
+            self.refresh()
+
+            with self.lock:
+                if not self._tombstone(document_id):
+                    return False
+
+                self._save([TOMBSTONES])
+
+            return True
+
+    def add_document(self, db: Session, document_id: int, supersedes: Optional[int] = None) -> int:
+        """
+        Embeds and indexes one vendor document's paragraphs, removing the
+        revision it supersedes. Returns the number of paragraphs added (0 if
+        the document was already indexed or has been removed).
+        """
+
+        with self._file_lock():
+            self.refresh()
+
+            #The superseded revision goes even if this one has nothing to add
+            if supersedes is not None:
+                with self.lock:
+                    if self._tombstone(supersedes):
+                        self._save([TOMBSTONES])
+
+            if self.contains_document(document_id) or self.is_removed(document_id):
+                return 0
+
+            paragraphs = (
+                db.query(Paragraph.id, Paragraph.text)
+                .filter(Paragraph.document_id == document_id)
+                .order_by(Paragraph.id)
+                .all()
+            )
+
+            if not paragraphs:
+                return 0
+
+            paragraph_ids = np.array([p.id for p in paragraphs], dtype=np.int64)
+
+            labels = (
+                db.query(ParagraphClassification.paragraph_id, ParagraphClassification.domain_id)
+                .filter(
+                    ParagraphClassification.paragraph_id.in_(paragraph_ids.tolist()),
+                    ParagraphClassification.domain_id.isnot(None)
+                )
+                .all()
+            )
+
+            vectors = self._document_vectors(document_id, paragraphs)
+
+            with self.lock:
+                delta = self.shards["delta"]
+                delta.add(
+                    vectors,
+                    paragraph_ids,
+                    np.full(len(paragraph_ids), document_id, dtype=np.int64),
+                    np.array([l.paragraph_id for l in labels], dtype=np.int64),
+                    np.array([l.domain_id for l in labels], dtype=np.int64),
+                )
+
+                #Base is rewritten only when the delta is folded into it
+                if len(delta) >= DELTA_MAX_VECTORS:
+                    self._merge_delta()
+                    self._save(SHARDS)
+                else:
+                    self._save(["delta"])
+
+            return len(paragraph_ids)
+
+    @staticmethod
+    def _document_vectors(document_id: int, paragraphs) -> np.ndarray:
+        """
+        Reuses the embeddings in the document's saved vector store and
+        encodes only the paragraphs it lacks.
+        """
+
+        store = DomainVectorStore.load(document_index_dir(document_id))
+        known = store.vectors_by_paragraph() if store is not None else {}
+
+        rows = [known.get(p.id) for p in paragraphs]
+        missing = [i for i, row in enumerate(rows) if row is None]
+
+        if missing:
+            encoded = get_embedding_model().encode([paragraphs[i].text for i in missing], normalize_embeddings=True)
+            for i, row in zip(missing, encoded):
+                rows[i] = row
+
+        return np.vstack(rows).astype(np.float32)
+
+    def _merge_delta(self):
+
+        base, delta = self.shards["base"], self.shards["delta"]
+
+        #Tombstoned documents are dropped for good while base is being rewritten anyway
+        if np.any(np.isin(base.document_ids, self.removed)):
+            base = self.shards["base"] = base.without_documents(self.removed)
+
+        delta = delta.without_documents(self.removed)
+
+        if not len(delta):
+            self.shards["delta"] = CorpusShard("delta")
+            return
+
+        base.add(
+            delta.vectors(),
+            delta.paragraph_ids,
+            delta.document_ids,
+            delta.label_paragraph_ids,
+            delta.label_domain_ids,
+        )
+        self.shards["delta"] = CorpusShard("delta")
+
+    def search(self, query_text: str, top_k: int = 10, domain_id: Optional[int] = None, document_ids: Optional[List[int]] = None) -> List[Dict]:
+
+        self.refresh()
+
+        query = get_embedding_model().encode([query_text], normalize_embeddings=True).astype(np.float32)
+
+        ids, scores = [], []
+        removed = self.removed
+
+        for shard in list(self.shards.values()):
+            shard_ids, shard_scores = shard.search(query, top_k, domain_id, document_ids, removed)
+            ids.append(shard_ids)
+            scores.append(shard_scores)
+
+        ids = np.concatenate(ids)
+        scores = np.concatenate(scores)
+        top = np.argsort(-scores, kind="stable")[:top_k]
+
+        return [
+            {"paragraph_id": int(ids[i]), "score": round(float(cosine_to_similarity(scores[i])), 4)}
+            for i in top
+        ]
+
+    def reset(self):
+        with self._file_lock():
+            with self.lock:
+                self.shards = {name: CorpusShard(name) for name in SHARDS}
+                self.removed = np.zeros(0, dtype=np.int64)
+                self._save(SHARDS + (TOMBSTONES,))
+
+
+_corpus_index: Optional[CorpusIndex] = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus_index() -> CorpusIndex:
+    global _corpus_index
+
+    if _corpus_index is None:
+        with _corpus_lock:
+            if _corpus_index is None:
+                _corpus_index = CorpusIndex()
+    return _corpus_index
+
+
+def add_document_to_corpus(db: Session, document_id: int) -> int:
+    """
+    Indexes a finished vendor document; other document types are skipped.
+    """
+
+    document = db.query(Document).filter(Document.id == document_id).first()
+
+    if not document or document.document_type != "vendor":
+        return 0
+
+    return get_corpus_index().add_document(db, document_id, supersedes=document.previous_document_id)
+
+
+def remove_document_from_corpus(document_id: int) -> bool:
+    """
+    Hides a deleted vendor document from corpus searches.
+    """
+
+    return get_corpus_index().remove_document(document_id)
+
+
+def rebuild_corpus_index():
+    db = WorkerSessionLocal()
+
+    try:
+        index = get_corpus_index()
+        index.reset()
+
+        #Revisions that have been superseded are left out
+        superseded = (
+            db.query(Document.previous_document_id)
+            .filter(Document.previous_document_id.isnot(None))
+        )
+
+        documents = (
+            db.query(Document.id)
+            .filter(
+                Document.document_type == "vendor",
+                Document.id.notin_(superseded)
+            )
+            .order_by(Document.id)
+            .all()
+        )
+
+        total = 0
+        for document in documents:
+            total += index.add_document(db, document.id)
+
+        print("=====================================")
+        print("Corpus Index Rebuilt")
+        print("Vendor documents:", len(documents))
+        print("Paragraphs:", total)
+        print("=====================================")
+
+    finally:
+        db.close()
+
+
+@router.get("/")
+def corpus_search(
+    q: str,
+    domain: Optional[str] = None,
+    document_id: Optional[List[int]] = Query(None),
+    top_k: int = Query(10, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+
+    domain_id = None
+
+    if domain:
+        domain_row = db.query(ComplianceDomain).filter(ComplianceDomain.name == domain).first()
+
+        if not domain_row:
+            raise HTTPException(status_code=404, detail=f"Unknown domain: {domain}")
+
+        domain_id = domain_row.id
+
+    hits = get_corpus_index().search(q, top_k, domain_id, document_id)
+
+    rows = (
+        db.query(Paragraph.id, Paragraph.text, Paragraph.document_id, Document.filename)
+        .join(Document, Document.id == Paragraph.document_id)
+        .filter(Paragraph.id.in_([h["paragraph_id"] for h in hits]))
+        .all()
+    ) if hits else []
+
+    by_id = {r.id: r for r in rows}
+
+    return {
+        "query": q,
+        "results": [
+            {
+                "paragraph_id": h["paragraph_id"],
+                "document_id": by_id[h["paragraph_id"]].document_id,
+                "filename": by_id[h["paragraph_id"]].filename,
+                "text": by_id[h["paragraph_id"]].text,
+                "score": h["score"],
+            }
+            for h in hits
+            if h["paragraph_id"] in by_id
+        ]
+    }
+
+
+if __name__ == "__main__":
+    import app.models.documents
+    import app.models.paragraph
+    import app.models.paragraph_classification
+    import app.models.domains
+
+    rebuild_corpus_index()
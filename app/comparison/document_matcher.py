@@ -1,145 +1,284 @@
+import time
 from sqlalchemy.orm import Session
-from typing import Dict, List
-from collections import defaultdict
+from typing import Dict, List, Iterable, Iterator, Tuple
 
 from app.models.paragraph import Paragraph
-from app.comparison.semantic_matcher import (match_client_paragraph, build_vendor_vector_store)
-from app.comparison.gap_analyzer import analyze_gaps
+from app.comparison.semantic_matcher import (match_client_paragraph, build_vendor_vector_store, get_domain_labels_bulk)
+from app.comparison.gap_analyzer import analyze_gaps_batch
+from app.comparison.assignment import assign_vendor_paragraphs
 from app.comparison.vector_store import DomainVectorStore
 from app.ingestion.atomic_splitter import split_into_atomic
+from app.core.usage import UsageCounter, current_usage, track_usage
+from app.core.config import GAP_ANALYSIS_BATCH, GAP_ANALYSIS_MAX_WAIT_SECONDS
 
 
-def match_documents(db: Session, client_document_id: int, vendor_document_id: int) -> Dict:
-    
+def build_document_summary(total_paragraphs: int, matched_count: int, confidence_scores: List[float]) -> Dict:
+
+    coverage = (
+        (matched_count / total_paragraphs)*100
+        if total_paragraphs > 0 else 0.0
+    )
+
+    average_confidence = (
+        sum(confidence_scores) / len(confidence_scores)
+        if confidence_scores else 0.0
+    )
+
+    return {
+        "total_client_paragraphs": total_paragraphs,
+        "matched_count" : matched_count,
+        "coverage_percentage": round(coverage, 2),
+        "average_confidence": round(average_confidence, 3)
+    }
+
+
+def build_match_record(para: Paragraph, result: Dict, vendor_match: Dict, final_score: float) -> Dict:
+    return {
+        "client_paragraph_id": para.id,
+        "client_paragraph": para.text,
+        "client_domain": result["domain"],
+        "vendor_paragraph_id": vendor_match["paragraph_id"],
+        "vendor_paragraph": vendor_match["text"],
+        "vendor_domain": vendor_match["domain"],
+        "embedding_score": vendor_match["embedding_score"],
+        "ai_score": vendor_match["ai_score"],
+        "final_score": final_score,
+        "confidence": result["confidence"],
+        "reason": vendor_match["reason"]
+    }
+
+
+def iter_document_matches(db: Session, client_document_id: int, vendor_document_id: int) -> Iterator[Dict]:
+    """
+    Yields match events as soon as each client paragraph is decided.
+    The summary carries the run's LLM usage report (see UsageCounter).
+
+    Events are dicts of the form {"event": <type>, "data": <payload>}:
+    - "match": one matched record (paragraph or atomic level)
+    - "gap": one unmatched atomic obligation
+    - "progress": client paragraphs processed so far
+    - "match_update": a paragraph-level match revised by the final assignment
+    - "summary": final document_summary, always the last event
+
+    Paragraphs without a paragraph-level match are analysed atomically in
+    batches of up to GAP_ANALYSIS_BATCH (see analyze_gaps_batch), so their
+    events follow the paragraph-level matches decided in the meantime. A
+    batch is analysed early once its first paragraph has waited
+    GAP_ANALYSIS_MAX_WAIT_SECONDS, so streams and job cancellation never
+    wait long on held gaps.
+
+    Paragraph-level matches are first emitted with their best vendor paragraph.
+    Once every paragraph is decided, vendor paragraphs are assigned globally
+    (see assign_vendor_paragraphs) and any match whose vendor paragraph or
+    penalized score changed is re-emitted, keyed by client_paragraph_id.
+    """
+
+    #Joins the caller's counter (e.g. a match job) or starts one for this run
+    usage = current_usage() or UsageCounter()
+    events = _iter_document_matches(db, client_document_id, vendor_document_id, usage)
+
+    #Re-entered per step: a streaming response may resume the generator from another context
+    try:
+        while True:
+            with track_usage(usage):
+                event = next(events, None)
+
+            if event is None:
+                return
+
+            yield event
+
+    finally:
+        events.close()
+
+
+def _iter_document_matches(db: Session, client_document_id: int, vendor_document_id: int, usage: UsageCounter) -> Iterator[Dict]:
+
     vector_store = build_vendor_vector_store(db, vendor_document_id)
-    
-    if not vector_store or not vector_store.vector_store:
-        return {
-            "matched": [],
-            "unmatched_client_paragraphs": [],
-            "document_summary": {
-                "coverage_percentage": 0.0,
-                "average_confidence": 0.0,
-                "total_client_paragraphs": 0,
-                "matched_count": 0
-            }
-        }
-        
-    
+
+    if not vector_store or vector_store.is_empty():
+        summary = build_document_summary(0, 0, [])
+        summary["usage"] = usage.report()
+        yield {"event": "summary", "data": summary}
+        return
+
+
     client_paragraphs = (
         db.query(Paragraph)
         .filter(Paragraph.document_id == client_document_id)
         .all()
     )
-    
+
     vendor_paragraphs = (
         db.query(Paragraph)
         .filter(Paragraph.document_id == vendor_document_id)
         .all()
     )
-    
+
     vendor_texts = [v.text for v in vendor_paragraphs]
     total_paragraphs = len(client_paragraphs)
-    
+
     all_vendor_atomics = []
     paragraph_ids = []
     domains = []
-    
+
     pid_counter = 0
-    
+
     for vendor_text in vendor_texts:
         vendor_atomics = split_into_atomic(vendor_text)
-        
+
         for v_atomic in vendor_atomics:
             all_vendor_atomics.append(v_atomic)
             paragraph_ids.append(pid_counter)
             domains.append("Vendor")
             pid_counter += 1
-            
+
     atomic_vector_store = DomainVectorStore()
     atomic_vector_store.build(all_vendor_atomics, paragraph_ids, domains)
-    
-    matched : List[Dict] = []
-    unmatched : List[str] = []
+
+    #Candidate vendor paragraphs for every client paragraph in one batched search
+    client_labels = get_domain_labels_bulk(db, [p.id for p in client_paragraphs])
+    client_candidates = vector_store.search_domains_batch(
+        [p.text for p in client_paragraphs],
+        [client_labels[p.id] for p in client_paragraphs]
+    )
+
+    yield {"event": "progress", "data": {"processed": 0, "total": total_paragraphs}}
+
+    matched_count = 0
+    processed = 0
     confidence_scores: List[float] = []
-    
-    #Track how many times each vendor paragraph is reused
-    vendor_match_counter = defaultdict(int)
-    
-    
-    for para in client_paragraphs:
-        result = match_client_paragraph(db, para.id, vector_store)
-        
+
+    #Paragraphs waiting for the next batched gap analysis, and since when
+    pending_gaps: List[Paragraph] = []
+    pending_since = 0.0
+
+    #Verified vendor matches per client paragraph, for the global assignment
+    paragraph_matches: Dict[int, Tuple[Paragraph, Dict]] = {}
+
+
+    for index, (para, candidates) in enumerate(zip(client_paragraphs, client_candidates), start=1):
+        result = match_client_paragraph(
+            db,
+            para.id,
+            vector_store,
+            domain_names=client_labels[para.id],
+            candidates=candidates
+        )
+
         if not result or not result.get("matched_vendor_paragraphs"):
-            
-            atomic_matched, atomic_gaps = analyze_gaps(para.text, atomic_vector_store, vendor_texts)
-            
-            
-            print("Atomic Matched:", atomic_matched)
-            print("Atomic Gaps:", atomic_gaps)
+            if not pending_gaps:
+                pending_since = time.monotonic()
+            pending_gaps.append(para)
+
+        else:
+            best_match = result["matched_vendor_paragraphs"][0]
+            paragraph_matches[para.id] = (para, result)
+            matched_count += 1
+            processed += 1
+
+            yield {
+                "event": "match",
+                "data": build_match_record(para, result, best_match, best_match["final_score"])
+            }
+            yield {"event": "progress", "data": {"processed": processed, "total": total_paragraphs}}
+
+        if not pending_gaps:
+            continue
+
+        if (
+            len(pending_gaps) < GAP_ANALYSIS_BATCH
+            and index < total_paragraphs
+            and time.monotonic() - pending_since < GAP_ANALYSIS_MAX_WAIT_SECONDS
+        ):
+            continue
+
+        gap_reports = analyze_gaps_batch([p.text for p in pending_gaps], atomic_vector_store, vendor_texts)
+
+        for gap_para, (atomic_matched, atomic_gaps) in zip(pending_gaps, gap_reports):
+
             #Add atomic matches
             for m in atomic_matched:
-                matched.append({
-                    "client_paragraph": m["client_atomic"],
-                    "confidence": m["confidence"],
-                    "atomic_level": True
-                })
+                matched_count += 1
                 confidence_scores.append(m["confidence"])
-                
+                yield {
+                    "event": "match",
+                    "data": {
+                        "client_paragraph_id": gap_para.id,
+                        "atomic_index": m["atomic_index"],
+                        "client_paragraph": m["client_atomic"],
+                        "confidence": m["confidence"],
+                        "atomic_level": True
+                    }
+                }
+
             #Track atomic gaps separately
             for g in atomic_gaps:
-                unmatched.append(g)
-            
-            continue
-        
+                yield {"event": "gap", "data": {"client_paragraph_id": gap_para.id, **g}}
+
+            processed += 1
+            yield {"event": "progress", "data": {"processed": processed, "total": total_paragraphs}}
+
+        pending_gaps = []
+
+    #Reuse of vendor paragraphs is settled across the whole document at once
+    assignments = assign_vendor_paragraphs({
+        pid: [(m["paragraph_id"], m["final_score"]) for m in result["matched_vendor_paragraphs"]]
+        for pid, (_, result) in paragraph_matches.items()
+    })
+
+    for pid, (para, result) in paragraph_matches.items():
+        vendor_id, final_score = assignments[pid]
+        confidence_scores.append(final_score)
+
         best_match = result["matched_vendor_paragraphs"][0]
-        vendor_id = best_match["paragraph_id"]
-        
-        vendor_match_counter[vendor_id] +=1
-        
-        if vendor_match_counter[vendor_id] >5:
-            penalty = 0.05*(vendor_match_counter[vendor_id] - 5)
-            best_match["final_score"] = max (
-                0.0,
-                round(best_match["final_score"] - penalty, 3)
-            )
-            
-            
-        confidence = best_match["final_score"]
-        confidence_scores.append(confidence)
-        
-        matched.append({
-            "client_paragraph": para.text,
-            "client_domain": result["domain"],
-            "vendor_paragraph_id": best_match["paragraph_id"],
-            "vendor_paragraph": best_match["text"],
-            "vendor_domain": best_match["domain"],
-            "embedding_score": best_match["embedding_score"],
-            "ai_score": best_match["ai_score"],
-            "final_score": best_match["final_score"],
-            "confidence": result["confidence"],
-            "reason": best_match["reason"]
-        })
-        
-    matched_count = len(matched)
-    
-    coverage = (
-        (matched_count / total_paragraphs)*100
-        if total_paragraphs > 0 else 0.0
-    )
-    
-    average_confidence = (
-        sum(confidence_scores) / len(confidence_scores)
-        if confidence_scores else 0.0
-    )
-            
+        if vendor_id == best_match["paragraph_id"] and final_score == best_match["final_score"]:
+            continue
+
+        vendor_match = next(
+            m for m in result["matched_vendor_paragraphs"] if m["paragraph_id"] == vendor_id
+        )
+        yield {
+            "event": "match_update",
+            "data": build_match_record(para, result, vendor_match, final_score)
+        }
+
+    summary = build_document_summary(total_paragraphs, matched_count, confidence_scores)
+    summary["usage"] = usage.report()
+
+    yield {"event": "summary", "data": summary}
+
+
+def build_match_report(events: Iterable[Dict]) -> Dict:
+
+    matched : List[Dict] = []
+    unmatched : List[Dict] = []
+    summary: Dict = {}
+
+    #Position of each paragraph-level match, so updates replace it in place
+    match_positions: Dict[int, int] = {}
+
+    for event in events:
+        if event["event"] == "match":
+            if not event["data"].get("atomic_level"):
+                match_positions[event["data"]["client_paragraph_id"]] = len(matched)
+            matched.append(event["data"])
+        elif event["event"] == "match_update":
+            matched[match_positions[event["data"]["client_paragraph_id"]]] = event["data"]
+        elif event["event"] == "gap":
+            unmatched.append(event["data"])
+        elif event["event"] == "summary":
+            summary = event["data"]
+
     return{
         "matched": matched,
         "unmatched_client_paragraphs": unmatched,
-        "document_summary": {
-            "total_client_paragraphs": total_paragraphs,
-            "matched_count" : matched_count,
-            "coverage_percentage": round(coverage, 2),
-            "average_confidence": round(average_confidence, 3)
-        } 
-    }
\ No newline at end of file
+        "document_summary": summary
+    }
+
+
+def match_documents(db: Session, client_document_id: int, vendor_document_id: int) -> Dict:
+
+    return build_match_report(
+        iter_document_matches(db, client_document_id, vendor_document_id)
+    )
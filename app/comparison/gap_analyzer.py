@@ -1,88 +1,177 @@
-from typing import List, Dict
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
 from app.ingestion.atomic_splitter import split_into_atomic
 from app.comparison.atomic_matcher import atomic_ai_match
 from app.comparison.remediation import suggest_remediation
 from app.comparison.vector_store import DomainVectorStore
+from app.core.config import GAP_ANALYSIS_WORKERS
 
 STRICT_THRESHOLD = 0.65
 AI_CALL_THRESHOLD = 0.80
 TOP_K = 2
 
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_gap_executor() -> ThreadPoolExecutor:
+    """
+    Threads for the LLM checks of every gap analysis in the process,
+    created once and shared by concurrent runs.
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=GAP_ANALYSIS_WORKERS, thread_name_prefix="gap-analysis")
+    return _executor
+
+
+def _run_concurrently(fn: Callable, calls: List[Tuple], max_workers: int) -> List:
+    """
+    fn(*args) for every args tuple, in order, on the shared gap analysis
+    threads with at most max_workers of them in flight for this call
+    (inline when max_workers <= 1). Each call runs in a copy of this
+    context, so LLM usage is still attributed to the run.
+    """
+
+    if max_workers <= 1 or len(calls) <= 1:
+        return [fn(*args) for args in calls]
+
+    pool = get_gap_executor()
+    in_flight = threading.BoundedSemaphore(max_workers)
+    futures = []
+
+    for args in calls:
+        in_flight.acquire()
+        future = pool.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(lambda _: in_flight.release())
+        futures.append(future)
+
+    return [f.result() for f in futures]
+
+
 def analyze_gaps(client_paragraph: str,  vector_store: DomainVectorStore, vendor_paragraphs: List[str]):
 
-    matched = []
-    gaps = []
-
-    atomics = split_into_atomic(client_paragraph)       
-
-    for atomic in atomics:
-
-        best_result = None
-        best_candidate_text = None
-        best_embedding_score = 0.0
-        
-        candidates = vector_store.search(
-            query_text=atomic,
-            domain=None,
-            top_k=TOP_K
-        )
-        
-        for candidate in candidates:
-            embedding_score = candidate["score"]
-            
-            if embedding_score > best_embedding_score:
-                best_embedding_score = embedding_score
-                best_candidate_text = candidate["text"]
-            
-            if embedding_score < AI_CALL_THRESHOLD:
-                continue
-            
-            result = atomic_ai_match(atomic, candidate["text"])
-    
-    
-            if not result:
-                continue
-
-            if not best_result or result.similarity_score > best_result.similarity_score:
-                best_result = result
-                
-            if result.match and result.similarity_score >= 0.80:
-                break
-            
-        is_gap = (
-            not best_result or not best_result.match or best_result.similarity_score < STRICT_THRESHOLD
-        )
-        
-        if is_gap:
-            vendor_sample = (
-                vendor_paragraphs[0]
-                if vendor_paragraphs 
-                else "No vendor text available"
-            )
-            
-            suggestion = suggest_remediation(atomic, vendor_sample)
-            
+    return analyze_gaps_batch([client_paragraph], vector_store, vendor_paragraphs)[0]
+
+
+def analyze_gaps_batch(client_paragraphs: List[str], vector_store: DomainVectorStore, vendor_paragraphs: List[str], max_workers: int = GAP_ANALYSIS_WORKERS) -> List[Tuple[List[Dict], List[Dict]]]:
+    """
+    Atomic-level matches and gaps for many client paragraphs, as one
+    (matched, gaps) pair per paragraph.
+
+    The atomics of all paragraphs are embedded and searched in one batch.
+    Candidates are verified in rounds: each round sends every atomic's
+    next candidate above AI_CALL_THRESHOLD to atomic_ai_match concurrently,
+    and an atomic stops at its first strong match, so the LLM calls are the
+    same as checking the atomics one by one.
+    """
+
+    atomics = [
+        (paragraph_index, atomic_index, atomic)
+        for paragraph_index, paragraph in enumerate(client_paragraphs)
+        for atomic_index, atomic in enumerate(split_into_atomic(paragraph))
+    ]
+
+    candidates = vector_store.search_domains_batch(
+        [atomic for _, _, atomic in atomics],
+        [[] for _ in atomics],
+        top_k_domain=0,
+        top_k_global=TOP_K
+    ) if atomics else []
+
+    best_results = [None] * len(atomics)
+    best_candidate_texts = [None] * len(atomics)
+    best_embedding_scores = [0.0] * len(atomics)
+    next_candidate = [0] * len(atomics)
+
+    active = list(range(len(atomics)))
+
+    while active:
+        #Next candidate worth an AI check, per atomic still searching
+        requests = {}
+
+        for i in active:
+            while next_candidate[i] < len(candidates[i]):
+                candidate = candidates[i][next_candidate[i]]
+                next_candidate[i] += 1
+
+                if candidate["score"] > best_embedding_scores[i]:
+                    best_embedding_scores[i] = candidate["score"]
+                    best_candidate_texts[i] = candidate["text"]
+
+                if candidate["score"] >= AI_CALL_THRESHOLD:
+                    requests[i] = candidate["text"]
+                    break
+
+        #Identical clauses across paragraphs are checked once
+        pairs = list(dict.fromkeys((atomics[i][2], text) for i, text in requests.items()))
+        results = dict(zip(pairs, _run_concurrently(atomic_ai_match, pairs, max_workers)))
+
+        active = []
+
+        for i, text in requests.items():
+            result = results[(atomics[i][2], text)]
+
+            if result:
+                if not best_results[i] or result.similarity_score > best_results[i].similarity_score:
+                    best_results[i] = result
+
+                if result.match and result.similarity_score >= 0.80:
+                    continue
+
+            active.append(i)
+
+    gap_indices = [
+        i for i, best_result in enumerate(best_results)
+        if not best_result or not best_result.match or best_result.similarity_score < STRICT_THRESHOLD
+    ]
+
+    vendor_sample = (
+        vendor_paragraphs[0]
+        if vendor_paragraphs
+        else "No vendor text available"
+    )
+
+    remediation_calls = list(dict.fromkeys((atomics[i][2], vendor_sample) for i in gap_indices))
+    suggestions = dict(zip(remediation_calls, _run_concurrently(suggest_remediation, remediation_calls, max_workers)))
+
+    reports = [([], []) for _ in client_paragraphs]
+    gap_set = set(gap_indices)
+
+    for i, (paragraph_index, atomic_index, atomic) in enumerate(atomics):
+        matched, gaps = reports[paragraph_index]
+        best_result = best_results[i]
+
+        if i in gap_set:
             gaps.append({
                 "client_atomic": atomic,
+                "atomic_index": atomic_index,
                 "gap_type": (
-                    best_result.gap_type 
-                    if best_result 
+                    best_result.gap_type
+                    if best_result
                     else "Completely absent obligation"
                 ),
                 "reason": (
-                    best_result.reason 
-                    if best_result 
+                    best_result.reason
+                    if best_result
                     else "No substantial match found."
                 ),
-                "suggested_vendor_text": suggestion,
-                "closet_vendor_text": best_candidate_text,
-                "closet_embedding_score": round(best_embedding_score, 3),
+                "suggested_vendor_text": suggestions[(atomic, vendor_sample)],
+                "closet_vendor_text": best_candidate_texts[i],
+                "closet_embedding_score": round(best_embedding_scores[i], 3),
                 "ai_similarity_score": round(best_result.similarity_score, 3) if best_result else None
             })
-        else:   
+        else:
             matched.append({
                 "client_atomic": atomic,
+                "atomic_index": atomic_index,
                 "confidence": best_result.similarity_score
             })
 
-    return matched, gaps
\ No newline at end of file
+    return reports
@@ -0,0 +1,230 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from app.db.database import WorkerSessionLocal
+from app.comparison.document_matcher import iter_document_matches, build_match_report
+from app.comparison.match_views import view_report, json_response
+from app.core.usage import UsageCounter, track_usage
+from app.core.profiler import Profile, new_profile, profile_requested, profile_run
+from app.core.config import (
+    MATCH_JOB_WORKERS,
+    MATCH_JOB_MAX_PENDING,
+    MATCH_JOB_RETENTION_SECONDS,
+)
+
+router = APIRouter(
+    prefix="/document-matching/jobs",
+    tags=["Document Matching Jobs"]
+)
+
+# Match jobs get their own bounded pool so long runs never occupy the
+# request threadpool that uploads and status calls depend on.
+executor = ThreadPoolExecutor(
+    max_workers=MATCH_JOB_WORKERS,
+    thread_name_prefix="match-job"
+)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class MatchJobCancelled(Exception):
+    pass
+
+
+class MatchJob:
+
+    def __init__(self, client_document_id: int, vendor_document_id: int, profile: Optional[Profile] = None):
+        self.job_id = str(uuid.uuid4())
+        self.client_document_id = client_document_id
+        self.vendor_document_id = vendor_document_id
+
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.processed = 0
+        self.total: Optional[int] = None
+        self.usage = UsageCounter()
+        self.profile = profile
+
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def eta_seconds(self) -> Optional[float]:
+
+        if self.status != "running" or not self.total or not self.processed:
+            return None
+
+        elapsed = time.time() - self.started_at
+        remaining = self.total - self.processed
+        return round(elapsed / self.processed * remaining, 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "client_document_id": self.client_document_id,
+            "vendor_document_id": self.vendor_document_id,
+            "status": self.status,
+            "progress": {
+                "paragraphs_processed": self.processed,
+                "total_paragraphs": self.total,
+                "llm_calls": self.usage.llm_calls,
+                "eta_seconds": self.eta_seconds(),
+            },
+            "usage": self.usage.report(),
+            "profile_url": self.profile.url if self.profile else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+_jobs: Dict[str, MatchJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def _prune_finished_jobs():
+
+    cutoff = time.time() - MATCH_JOB_RETENTION_SECONDS
+
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at and job.finished_at < cutoff:
+            del _jobs[job_id]
+
+
+def _observe(job: MatchJob, events: Iterator[Dict]) -> Iterator[Dict]:
+
+    for event in events:
+        # Cancellation takes effect between client paragraphs
+        if job.cancel_event.is_set():
+            raise MatchJobCancelled()
+
+        if event["event"] == "progress":
+            job.processed = event["data"]["processed"]
+            job.total = event["data"]["total"]
+
+        yield event
+
+
+def run_match_job(job: MatchJob):
+
+    if job.cancel_event.is_set():
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        return
+
+    job.status = "running"
+    job.started_at = time.time()
+
+    db = WorkerSessionLocal()
+    events = iter_document_matches(db, job.client_document_id, job.vendor_document_id)
+
+    try:
+        with track_usage(job.usage), profile_run(job.profile):
+            job.result = build_match_report(_observe(job, events))
+        job.status = "completed"
+
+    except MatchJobCancelled:
+        job.status = "cancelled"
+
+    except Exception as e:
+        print("Match job failed:", e)
+        job.error = str(e)
+        job.status = "failed"
+
+    finally:
+        events.close()
+        db.close()
+        job.finished_at = time.time()
+
+
+def submit_match_job(client_document_id: int, vendor_document_id: int, profile: Optional[Profile] = None) -> MatchJob:
+
+    with _jobs_lock:
+        _prune_finished_jobs()
+
+        active = sum(1 for j in _jobs.values() if j.status in ACTIVE_STATUSES)
+        if active >= MATCH_JOB_MAX_PENDING:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many document-matching jobs in progress. Try again later."
+            )
+
+        job = MatchJob(client_document_id, vendor_document_id, profile)
+        _jobs[job.job_id] = job
+
+    job.future = executor.submit(run_match_job, job)
+    return job
+
+
+def get_job(job_id: str) -> MatchJob:
+
+    job = _jobs.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return job
+
+
+@router.post("/", status_code=202)
+def create_match_job(client_document_id: int, vendor_document_id: int, profile: bool = Depends(profile_requested)):
+
+    job = submit_match_job(
+        client_document_id,
+        vendor_document_id,
+        new_profile(profile, f"match job {client_document_id} vs {vendor_document_id}")
+    )
+    return job.to_dict()
+
+
+@router.get("/{job_id}")
+def get_match_job(job_id: str):
+    return get_job(job_id).to_dict()
+
+
+@router.post("/{job_id}/cancel")
+def cancel_match_job(job_id: str):
+
+    job = get_job(job_id)
+
+    if job.status in ACTIVE_STATUSES:
+        job.cancel_event.set()
+
+        # A job still waiting in the queue never starts
+        if job.future and job.future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+
+    return job.to_dict()
+
+
+@router.get("/{job_id}/result")
+def get_match_job_result(
+    job_id: str,
+    request: Request,
+    view: str = "full",
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+
+    job = get_job(job_id)
+
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is {job.status}; result not available."
+        )
+
+    return json_response(request, view_report(job.result, view, fields, cursor, limit))
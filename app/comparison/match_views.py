@@ -0,0 +1,191 @@
+import base64
+import binascii
+import gzip
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.paragraph import Paragraph
+from app.ingestion.atomic_splitter import split_into_atomic
+
+router = APIRouter(
+    prefix="/paragraphs",
+    tags=["Paragraphs"]
+)
+
+VIEWS = ("full", "compact")
+
+#Compact records carry ids and scores; texts are fetched from /paragraphs/texts
+COMPACT_MATCH_FIELDS = (
+    "client_paragraph_id",
+    "vendor_paragraph_id",
+    "client_domain",
+    "vendor_domain",
+    "embedding_score",
+    "ai_score",
+    "final_score",
+    "confidence",
+)
+COMPACT_ATOMIC_FIELDS = (
+    "client_paragraph_id",
+    "atomic_index",
+    "atomic_level",
+    "confidence",
+)
+COMPACT_GAP_FIELDS = (
+    "client_paragraph_id",
+    "atomic_index",
+    "gap_type",
+    "closet_embedding_score",
+    "ai_similarity_score",
+)
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+MAX_TEXT_IDS = 1000
+
+#Small bodies are not worth the gzip CPU
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+def json_response(request: Request, content) -> Response:
+    """
+    orjson-serialized response, gzip-compressed when the client accepts it.
+    """
+
+    body = orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+
+    if not fields:
+        return None
+
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+
+    if not cursor:
+        return 0
+
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, offset = decoded.split(":")
+        if prefix != "o" or int(offset) < 0:
+            raise ValueError(decoded)
+        return int(offset)
+
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def project(record: Dict, fields: Optional[List[str]], compact_fields) -> Dict:
+
+    keep = fields or compact_fields
+    return {name: record[name] for name in keep if name in record}
+
+
+def view_report(report: Dict, view: str = "full", fields: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+    """
+    A match report (see build_match_report) as served to clients.
+
+    - view="compact" keeps ids and scores only; fields overrides which keys
+      every record keeps (e.g. "client_paragraph_id,final_score,reason").
+    - cursor/limit page through matched records followed by the unmatched
+      ones; next_cursor is None on the last page.
+
+    The full view without fields or paging is the report unchanged.
+    """
+
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'compact'.")
+
+    field_list = parse_fields(fields)
+    paged = cursor is not None or limit is not None
+
+    if view == "full" and not field_list and not paged:
+        return report
+
+    matched = report["matched"]
+    gaps = report["unmatched_client_paragraphs"]
+    total = len(matched) + len(gaps)
+
+    start, end = 0, total
+    if paged:
+        start = min(decode_cursor(cursor), total)
+        end = min(start + min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE), total)
+
+    #One cursor walks both lists: matched first, then unmatched
+    page_matched = matched[start:end]
+    page_gaps = gaps[max(start - len(matched), 0):max(end - len(matched), 0)]
+
+    if view == "compact" or field_list:
+        page_matched = [
+            project(m, field_list, COMPACT_ATOMIC_FIELDS if m.get("atomic_level") else COMPACT_MATCH_FIELDS)
+            for m in page_matched
+        ]
+        page_gaps = [project(g, field_list, COMPACT_GAP_FIELDS) for g in page_gaps]
+
+    result = {
+        "matched": page_matched,
+        "unmatched_client_paragraphs": page_gaps,
+        "document_summary": report["document_summary"],
+    }
+
+    if paged:
+        result["total_records"] = total
+        result["next_cursor"] = encode_cursor(end) if end < total else None
+
+    return result
+
+
+#Texts for compact match records
+@router.get("/texts")
+def paragraph_texts(
+    request: Request,
+    ids: List[int] = Query(...),
+    atomics: bool = False,
+    db: Session = Depends(get_db)
+):
+
+    if len(ids) > MAX_TEXT_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TEXT_IDS} ids per request.")
+
+    rows = (
+        db.query(Paragraph.id, Paragraph.text)
+        .filter(Paragraph.id.in_(set(ids)))
+        .all()
+    )
+
+    paragraphs = []
+    for row in rows:
+        item = {"id": row.id, "text": row.text}
+
+        #Same split as matching, so atomic_index values resolve to sentences
+        if atomics:
+            item["atomics"] = split_into_atomic(row.text)
+
+        paragraphs.append(item)
+
+    found = {row.id for row in rows}
+
+    return json_response(request, {
+        "paragraphs": paragraphs,
+        "missing": [pid for pid in dict.fromkeys(ids) if pid not in found],
+    })
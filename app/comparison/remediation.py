@@ -1,8 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate
 from app.core.llm import get_llm
-from app.core.rate_limiter import rate_limiter
-
-llm = get_llm()
+from app.core.llm_policy import call_llm
+from app.core.tokens import fit_to_budget, estimate_prompt_tokens
 
 REMEDIATION_PROMPT = ChatPromptTemplate.from_messages(
     [
@@ -30,12 +29,24 @@ REMEDIATION_PROMPT = ChatPromptTemplate.from_messages(
     ]
 )
 
-chain = REMEDIATION_PROMPT | llm
+_chain = None
+
+def get_chain():
+    global _chain
+
+    if _chain is None:
+        _chain = REMEDIATION_PROMPT | get_llm()
+    return _chain
 
 def suggest_remediation(client_text: str, vendor_text: str):
-    rate_limiter.wait()  # Ensure we respect rate limits
-    response = chain.invoke({
-        "client": client_text,
-        "vendor": vendor_text
-    })
+    inputs = {
+        "client": fit_to_budget(client_text, stage="remediation"),
+        "vendor": fit_to_budget(vendor_text, stage="remediation")
+    }
+    
+    response = call_llm(
+        lambda: get_chain().invoke(inputs),
+        stage="remediation",
+        prompt_tokens=estimate_prompt_tokens(REMEDIATION_PROMPT, inputs)
+    )
     return response.content.strip()
\ No newline at end of file
@@ -1,25 +1,18 @@
 import json
 from typing import List, Dict, Optional
 
-from sqlalchemy.orm import Session
-from sentence_transformers import SentenceTransformer
-from langchain_mistralai import ChatMistralAI
+from sqlalchemy.orm import Session, selectinload, joinedload
 from langchain_core.prompts import ChatPromptTemplate
 
+from app.models.documents import Document
 from app.models.paragraph import Paragraph
 from app.models.paragraph_classification import ParagraphClassification
-from app.comparison.vector_store import DomainVectorStore
-from app.core.rate_limiter import rate_limiter
-
-
-
-llm = ChatMistralAI(
-    model="mistral-small-latest",
-    temperature=0,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
-
-embedding_model = SentenceTransformer("all-mpnet-base-v2")
+from app.comparison.vector_store import DomainVectorStore, document_index_dir
+from app.classification.domain_classifier import get_taxonomy_version
+from app.db.database import WorkerSessionLocal
+from app.core.llm_policy import call_llm
+from app.core.tokens import fit_to_budget, estimate_prompt_tokens
+from app.core.llm import get_llm
 
 
 
@@ -74,12 +67,18 @@ def ai_semantic_match(client_text: str, vendor_text: str)-> Dict :
         ]
     )
     
-    chain = prompt | llm
-    rate_limiter.wait()  # Ensure we respect rate limits
-    result =  chain.invoke({
-        "client_text": client_text,
-        "vendor_text": vendor_text
-    })
+    chain = prompt | get_llm(json_mode=True)
+    
+    inputs = {
+        "client_text": fit_to_budget(client_text, stage="semantic_match"),
+        "vendor_text": fit_to_budget(vendor_text, stage="semantic_match")
+    }
+    
+    result = call_llm(
+        lambda: chain.invoke(inputs),
+        stage="semantic_match",
+        prompt_tokens=estimate_prompt_tokens(prompt, inputs)
+    )
     
     
     try:
@@ -93,69 +92,233 @@ def ai_semantic_match(client_text: str, vendor_text: str)-> Dict :
 
 
 
-def build_vendor_vector_store(db: Session, vendor_document_id: int) -> DomainVectorStore:
+def _vendor_store_rows(db: Session, vendor_document_id: int):
 
     vendor_paragraphs = (
         db.query(Paragraph)
+        .options(
+            selectinload(Paragraph.classifications)
+            .joinedload(ParagraphClassification.domain)
+        )
         .filter(Paragraph.document_id == vendor_document_id, Paragraph.document.has(document_type = "vendor")).all()
     )
 
     texts = []
     paragraph_ids = []
     domains = []
+    domain_labels = []
     
     
     for para in vendor_paragraphs:
-        classification = (
-            db.query(ParagraphClassification)
-            .filter(ParagraphClassification.paragraph_id == para.id)
-            .first()
-        )
+        labels = [c.domain.name for c in para.classifications if c.domain]
 
-        if classification:
+        if labels:
             texts.append(para.text)
             paragraph_ids.append(para.id)
-            domains.append(classification.domain.name)
+            domains.append(labels[0])
+            domain_labels.append(labels)
+
+    return texts, paragraph_ids, domains, domain_labels
+
+
+def carried_vectors(db: Session, document_id: int) -> Dict:
+    """
+    Embeddings of paragraphs carried over unchanged from the previous
+    revision, read from that revision's saved store.
+    """
+
+    document = db.query(Document.previous_document_id).filter(Document.id == document_id).first()
+
+    if not document or not document.previous_document_id:
+        return {}
+
+    previous_store = DomainVectorStore.load(document_index_dir(document.previous_document_id))
+
+    if previous_store is None:
+        return {}
+
+    previous_vectors = previous_store.vectors_by_paragraph()
+
+    carried = (
+        db.query(Paragraph.id, Paragraph.source_paragraph_id)
+        .filter(Paragraph.document_id == document_id, Paragraph.source_paragraph_id.isnot(None))
+        .all()
+    )
+
+    return {
+        p.id: previous_vectors[p.source_paragraph_id]
+        for p in carried
+        if p.source_paragraph_id in previous_vectors
+    }
+
+
+def persist_vendor_vector_store(db: Session, vendor_document_id: int, known_vectors: Optional[Dict] = None) -> DomainVectorStore:
+    """
+    Encodes a vendor document once and saves its store under
+    DOCUMENT_INDEX_DIR, keyed by the current domain taxonomy version.
+    Called when ingestion finishes; a revision only encodes the paragraphs
+    it did not carry over, and known_vectors (paragraph id -> embedding)
+    skips paragraphs already encoded. Documents above DENSE_SEARCH_MAX_VECTORS
+    get an in-memory FAISS store, which is not saved.
+    """
+
+    taxonomy_version = get_taxonomy_version(db)
+    texts, paragraph_ids, domains, domain_labels = _vendor_store_rows(db, vendor_document_id)
+
+    vectors = carried_vectors(db, vendor_document_id)
+    vectors.update(known_vectors or {})
 
     vector_store = DomainVectorStore()
-    vector_store.build(texts, paragraph_ids, domains)
+    vector_store.build(texts, paragraph_ids, domains, domain_labels, known_vectors=vectors)
+
+    if vector_store.matrix is None:
+        return vector_store
+
+    directory = document_index_dir(vendor_document_id)
+    vector_store.save(directory, taxonomy_version=taxonomy_version)
+
+    return DomainVectorStore.load(directory, taxonomy_version=taxonomy_version) or vector_store
+
+
+def build_vendor_vector_store(db: Session, vendor_document_id: int) -> DomainVectorStore:
+    """
+    Memory-maps the document's saved store. Documents without a current
+    one (ingested before stores were persisted, under another model or
+    taxonomy version) are built in memory for this run only; reads never
+    write to disk. persist_all_vendor_vector_stores brings them up to date.
+    """
+
+    vector_store = DomainVectorStore.load(
+        document_index_dir(vendor_document_id),
+        taxonomy_version=get_taxonomy_version(db)
+    )
+
+    if vector_store is not None:
+        return vector_store
+
+    texts, paragraph_ids, domains, domain_labels = _vendor_store_rows(db, vendor_document_id)
+
+    vector_store = DomainVectorStore()
+    vector_store.build(texts, paragraph_ids, domains, domain_labels)
 
     return vector_store
 
 
-def match_client_paragraph(db: Session, client_paragraph_id: int, vector_store: DomainVectorStore,top_k_domain: int=2, top_k_global: int = 1) -> Optional[Dict]:
+def persist_all_vendor_vector_stores():
+    """
+    Saves the store of every vendor document whose saved store is missing
+    or outdated, e.g. after seed_domains changed the taxonomy.
+    """
+
+    db = WorkerSessionLocal()
+
+    try:
+        taxonomy_version = get_taxonomy_version(db)
+
+        documents = (
+            db.query(Document.id)
+            .filter(Document.document_type == "vendor", Document.status == "completed")
+            .order_by(Document.id)
+            .all()
+        )
+
+        saved = 0
+        for document in documents:
+            if DomainVectorStore.load(document_index_dir(document.id), taxonomy_version=taxonomy_version) is not None:
+                continue
+
+            persist_vendor_vector_store(db, document.id)
+            saved += 1
+
+        print("=====================================")
+        print("Vendor Vector Stores Saved")
+        print("Vendor documents:", len(documents))
+        print("Saved:", saved)
+        print("Taxonomy version:", taxonomy_version)
+        print("=====================================")
+
+    finally:
+        db.close()
 
-    client_para = db.query(Paragraph).filter(Paragraph.id == client_paragraph_id).first()
-    
-    if not client_para:
-        return None
 
-    classification = (
+def get_domain_labels(db: Session, paragraph_id: int) -> List[str]:
+    """
+    Domain names of a paragraph's classifications, primary first.
+    """
+
+    classifications = (
         db.query(ParagraphClassification)
-        .filter(ParagraphClassification.paragraph_id == client_paragraph_id)
-        .first()
+        .options(joinedload(ParagraphClassification.domain))
+        .filter(
+            ParagraphClassification.paragraph_id == paragraph_id,
+            ParagraphClassification.domain_id.isnot(None)
+        )
+        .order_by(ParagraphClassification.rank)
+        .all()
     )
-    
-    domain_name = classification.domain.name if classification else None
 
-    domain_matches = vector_store.search(
-        client_para.text,
-        domain_name,
-        top_k=top_k_domain
-    ) if domain_name else []
-    
-    
-    global_matches = vector_store.search(
-        client_para.text,
-        None,
-        top_k=top_k_global
+    return [c.domain.name for c in classifications if c.domain]
+
+
+def get_domain_labels_bulk(db: Session, paragraph_ids: List[int]) -> Dict[int, List[str]]:
+    """
+    get_domain_labels for many paragraphs in one query.
+    """
+
+    labels: Dict[int, List[str]] = {pid: [] for pid in paragraph_ids}
+
+    if not paragraph_ids:
+        return labels
+
+    classifications = (
+        db.query(ParagraphClassification)
+        .options(joinedload(ParagraphClassification.domain))
+        .filter(
+            ParagraphClassification.paragraph_id.in_(paragraph_ids),
+            ParagraphClassification.domain_id.isnot(None)
+        )
+        .order_by(ParagraphClassification.paragraph_id, ParagraphClassification.rank)
+        .all()
     )
+
+    for c in classifications:
+        if c.domain:
+            labels[c.paragraph_id].append(c.domain.name)
+
+    return labels
+
+
+def match_client_paragraph(
+    db: Session,
+    client_paragraph_id: int,
+    vector_store: DomainVectorStore,
+    top_k_domain: int=2,
+    top_k_global: int = 1,
+    domain_names: Optional[List[str]] = None,
+    candidates: Optional[List[Dict]] = None
+) -> Optional[Dict]:
+    """
+    domain_names and candidates may be passed in when the caller has already
+    looked them up for a whole document (see search_domains_batch).
+    """
+
+    client_para = db.query(Paragraph).filter(Paragraph.id == client_paragraph_id).first()
     
-    combined = {}
-    for m in domain_matches + global_matches:
-        combined[m["paragraph_id"]] = m
-        
-    candidates = list(combined.values())
+    if not client_para:
+        return None
+
+    if domain_names is None:
+        domain_names = get_domain_labels(db, client_paragraph_id)
+    domain_name = domain_names[0] if domain_names else None
+
+    #One search covers every domain partition the paragraph belongs to plus the global hits
+    if candidates is None:
+        candidates = vector_store.search_domains(
+            client_para.text,
+            domain_names,
+            top_k_domain=top_k_domain,
+            top_k_global=top_k_global
+        )
     
     if not candidates:
         return{
@@ -185,7 +348,7 @@ def match_client_paragraph(db: Session, client_paragraph_id: int, vector_store:
         
         final_score = (embedding_score * 0.3) + (ai_score * 0.7)
 
-        if domain_name and candidate["domain"] != domain_name:
+        if domain_names and not set(candidate["domains"]).intersection(domain_names):
             final_score = max(0.0, final_score - 0.05)
         
         if ai_result.get("match") and final_score >=0.60:
@@ -209,4 +372,13 @@ def match_client_paragraph(db: Session, client_paragraph_id: int, vector_store:
         "domain": domain_name,
         "confidence": round(confidence, 3),
         "matched_vendor_paragraphs": verified_matches
-    }
\ No newline at end of file
+    }
+
+
+if __name__ == "__main__":
+    import app.models.documents
+    import app.models.paragraph
+    import app.models.paragraph_classification
+    import app.models.domains
+
+    persist_all_vendor_vector_stores()
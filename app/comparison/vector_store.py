@@ -1,81 +1,539 @@
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterable
+import json
+import os
+import shutil
+import time
+import uuid
 import numpy as np
 
+from app.core.embeddings import EncoderEmbeddings
+from app.core.config import DENSE_SEARCH_MAX_VECTORS, DOCUMENT_INDEX_DIR
+
+DOMAIN_BOOST = 1.05
+
+
+def cosine_to_similarity(cosine: np.ndarray) -> np.ndarray:
+    """
+    Same score as DomainVectorStore._distance_to_similarity: for normalized
+    vectors the squared L2 distance FAISS reports is 2 - 2*cosine.
+    """
+    return 1 / (1 + np.maximum(2 - 2 * cosine, 0))
+
+
+#Client rows scored per matrix multiplication in dense mode
+DENSE_QUERY_CHUNK = 1024
+
+#Upper bound on the query x vendor score matrix held at once (float32 cells)
+DENSE_SCORE_CELLS = 16 * 1024 * 1024
+
+
+#File naming the published version subdirectory of a saved store
+CURRENT_POINTER = "CURRENT"
+
+#Files of a store saved directly into its directory, before versioning
+LEGACY_STORE_FILES = (
+    "meta.json",
+    "vectors.faiss",
+    "paragraph_ids.npy",
+    "text_blob.npy",
+    "text_offsets.npy",
+    "label_ids.npy",
+    "label_matrix.npy",
+)
+
+LOAD_ATTEMPTS = 3
+
+#Staging files older than this were left by a crashed save
+ABANDONED_STAGING_SECONDS = 3600
+
+
+def document_index_dir(document_id: int) -> str:
+    return os.path.join(DOCUMENT_INDEX_DIR, str(document_id))
+
+
+class MappedTexts:
+    """
+    Paragraph texts decoded on access from a memory-mapped UTF-8 blob.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+
+class MappedLabels:
+    """
+    Per-row domain labels (primary first) from a memory-mapped id matrix
+    padded with -1.
+    """
+
+    def __init__(self, names: List[str], label_ids: np.ndarray):
+        self.names = names
+        self.label_ids = label_ids
+
+    def __len__(self):
+        return len(self.label_ids)
+
+    def __getitem__(self, index: int) -> List[str]:
+        return [self.names[i] for i in self.label_ids[index] if i >= 0]
+
+
 class DomainVectorStore:
+    """
+    Vendor paragraphs (or atomics) searchable by embedding similarity.
 
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2"
-        )
+    Stores up to dense_max_vectors keep a normalized embedding matrix and
+    score every query exactly with one matrix product; larger stores use a
+    FAISS index. Both modes return the same scores for the same pairs.
+
+    A dense store can be saved to disk (see save/load). Loaded stores keep
+    their matrix and metadata memory-mapped, so worker processes searching
+    the same document share one copy through the OS page cache.
+    """
+
+    def __init__(self, dense_max_vectors: int = DENSE_SEARCH_MAX_VECTORS):
+        self.embeddings = EncoderEmbeddings()
+        self.dense_max_vectors = dense_max_vectors
         self.vector_store: Optional[FAISS] = None
-        
-    def build(self, texts: List[str], paragraph_ids: List[int], domains: List[str]):
-        
+
+        #Dense mode
+        self.matrix: Optional[np.ndarray] = None
+        self.label_matrix: Optional[np.ndarray] = None
+        self.label_index: Dict[str, int] = {}
+        self.texts: List[str] = []
+        self.paragraph_ids: List[int] = []
+        self.domain_labels: List[List[str]] = []
+
+        #Loaded stores: the faiss index owning the mapped matrix
+        self.index = None
+
+    def build(self, texts: List[str], paragraph_ids: List[int], domains: List[str], domain_labels: Optional[List[List[str]]] = None, known_vectors: Optional[Dict[int, np.ndarray]] = None):
+        """
+        domains holds each paragraph's primary domain; domain_labels optionally
+        holds all of its domain labels (primary first) for multi-label boosting.
+        known_vectors maps paragraph ids to embeddings that need no encoding
+        (dense mode only), e.g. paragraphs carried over from a previous revision.
+        """
+
+        if domain_labels is None:
+            domain_labels = [[domain] for domain in domains]
+
+        self.vector_store = None
+        self.matrix = None
+
+        if not texts:
+            return
+
+        if len(texts) <= self.dense_max_vectors:
+            self._build_dense(texts, paragraph_ids, domains, domain_labels, known_vectors or {})
+            return
+
         documents = []
-        
-        for text, pid, domain in zip(texts, paragraph_ids, domains):
+
+        for text, pid, domain, labels in zip(texts, paragraph_ids, domains, domain_labels):
             documents.append(
                 Document(
                     page_content = text,
                     metadata={
                         "paragraph_id": pid,
-                        "domain": domain
+                        "domain": domain,
+                        "domains": labels
                     }
                 )
             )
-            
-        if not documents:
-            self.vector_store = None
-            return
-            
+
         self.vector_store = FAISS.from_documents(
             documents,
             self.embeddings
         )
-        
+
+    def _build_dense(self, texts: List[str], paragraph_ids: List[int], domains: List[str], domain_labels: List[List[str]], known_vectors: Dict[int, np.ndarray]):
+
+        self.texts = list(texts)
+        self.paragraph_ids = list(paragraph_ids)
+        self.domain_labels = [list(labels) for labels in domain_labels]
+
+        rows = [known_vectors.get(pid) for pid in self.paragraph_ids]
+        missing = [i for i, row in enumerate(rows) if row is None]
+
+        if missing:
+            encoded = self.embeddings.encoder.encode([self.texts[i] for i in missing], normalize_embeddings=True)
+            for i, row in zip(missing, encoded):
+                rows[i] = row
+
+        self.matrix = np.vstack(rows).astype(np.float32)
+
+        #Multi-hot domain labels, so domain overlap is one boolean matrix product
+        self.label_index = {}
+        for labels in self.domain_labels:
+            for label in labels:
+                self.label_index.setdefault(label, len(self.label_index))
+
+        self.label_matrix = np.zeros((len(self.texts), len(self.label_index)), dtype=np.float32)
+        for row, labels in enumerate(self.domain_labels):
+            for label in labels:
+                self.label_matrix[row, self.label_index[label]] = 1.0
+
+    def is_empty(self) -> bool:
+        return self.vector_store is None and self.matrix is None
+
+
+    def save(self, directory: str, taxonomy_version: Optional[int] = None):
+        """
+        Writes a dense store to directory: a faiss IndexFlatIP of the
+        embeddings plus .npy arrays for ids, texts and domain labels.
+        Each save goes to a new version subdirectory, published by
+        atomically replacing the CURRENT pointer, so concurrent readers see
+        either the previous store or the new one, never a mix or nothing.
+        taxonomy_version records the domain taxonomy the labels come from.
+        """
+        import faiss
+
+        if self.matrix is None:
+            raise ValueError("Only dense vector stores can be saved.")
+
+        os.makedirs(directory, exist_ok=True)
+        version = f"v-{uuid.uuid4().hex}"
+        staging = os.path.join(directory, f"tmp-{version}")
+        os.makedirs(staging)
+
+        try:
+            index = faiss.IndexFlatIP(self.matrix.shape[1])
+            index.add(np.ascontiguousarray(self.matrix, dtype=np.float32))
+            faiss.write_index(index, os.path.join(staging, "vectors.faiss"))
+
+            encoded = [text.encode("utf-8") for text in self.texts]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+            names = sorted(self.label_index, key=self.label_index.get)
+            width = max(len(labels) for labels in self.domain_labels)
+            label_ids = np.full((len(self.domain_labels), width), -1, dtype=np.int32)
+            for row, labels in enumerate(self.domain_labels):
+                label_ids[row, :len(labels)] = [self.label_index[label] for label in labels]
+
+            np.save(os.path.join(staging, "paragraph_ids.npy"), np.asarray(self.paragraph_ids, dtype=np.int64))
+            np.save(os.path.join(staging, "text_blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            np.save(os.path.join(staging, "text_offsets.npy"), offsets)
+            np.save(os.path.join(staging, "label_ids.npy"), label_ids)
+            np.save(os.path.join(staging, "label_matrix.npy"), self.label_matrix)
+
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({
+                    "model_id": self.embeddings.encoder.model_id,
+                    "taxonomy_version": taxonomy_version,
+                    "count": len(self.texts),
+                    "labels": names
+                }, f)
+
+            os.rename(staging, os.path.join(directory, version))
+
+            pointer = os.path.join(directory, CURRENT_POINTER)
+            with open(f"{pointer}.tmp-{version}", "w") as f:
+                f.write(version)
+            os.replace(f"{pointer}.tmp-{version}", pointer)
+
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.rmtree(os.path.join(directory, version), ignore_errors=True)
+            raise
+
+        self._remove_old_versions(directory, keep=version)
+
+    @staticmethod
+    def _current_version_dir(directory: str) -> str:
+        """
+        Directory holding the published store: the CURRENT version, or
+        directory itself for stores saved before versioning.
+        """
+
+        try:
+            with open(os.path.join(directory, CURRENT_POINTER)) as f:
+                return os.path.join(directory, f.read().strip())
+        except FileNotFoundError:
+            return directory
+
+    @classmethod
+    def _remove_old_versions(cls, directory: str, keep: str):
+        """
+        Deletes superseded versions (and a pre-versioning store). The
+        published version is always kept, even if a concurrent save replaced
+        ours; readers that already mapped an old version keep their mapping.
+        Staging directories are left to their writers unless abandoned.
+        """
+
+        current = os.path.basename(cls._current_version_dir(directory))
+
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+
+            if name in (keep, current):
+                continue
+
+            try:
+                if name.startswith("v-"):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif name.startswith("tmp-") or name.startswith(f"{CURRENT_POINTER}.tmp-"):
+                    if time.time() - os.path.getmtime(path) < ABANDONED_STAGING_SECONDS:
+                        continue
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                elif name in LEGACY_STORE_FILES:
+                    os.remove(path)
+            except FileNotFoundError:
+                #Removed by a concurrent save
+                continue
+
+
+    @classmethod
+    def load(cls, directory: str, taxonomy_version: Optional[int] = None) -> Optional["DomainVectorStore"]:
+        """
+        Memory-maps a store written by save(). Returns None when there is
+        no complete store, it was encoded by a different embedding model, or
+        (if taxonomy_version is given) it was labelled under another domain
+        taxonomy. Load time does not depend on the store size.
+        """
+
+        #A concurrent save may delete the version being opened; the pointer then names a newer one
+        for _ in range(LOAD_ATTEMPTS):
+            try:
+                return cls._load_version(cls._current_version_dir(directory), taxonomy_version)
+            except FileNotFoundError:
+                continue
+
+        return None
+
+    @classmethod
+    def _load_version(cls, version_dir: str, taxonomy_version: Optional[int]) -> Optional["DomainVectorStore"]:
+        import faiss
+
+        meta_path = os.path.join(version_dir, "meta.json")
+
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        store = cls()
+
+        if meta["model_id"] != store.embeddings.encoder.model_id:
+            return None
+
+        if taxonomy_version is not None and meta.get("taxonomy_version") != taxonomy_version:
+            return None
+
+        vectors_path = os.path.join(version_dir, "vectors.faiss")
+        if not os.path.exists(vectors_path):
+            raise FileNotFoundError(vectors_path)
+
+        #IO_FLAG_MMAP_IFC maps flat codes in place; older faiss copies them
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        store.index = faiss.read_index(vectors_path, flags)
+
+        #Zero-copy view of the mapped vectors, valid while store.index lives
+        store.matrix = faiss.rev_swig_ptr(
+            store.index.get_xb(),
+            store.index.ntotal * store.index.d
+        ).reshape(store.index.ntotal, store.index.d)
+
+        def mapped(name):
+            return np.load(os.path.join(version_dir, name), mmap_mode="r")
+
+        store.paragraph_ids = mapped("paragraph_ids.npy")
+        store.texts = MappedTexts(mapped("text_blob.npy"), mapped("text_offsets.npy"))
+        store.domain_labels = MappedLabels(meta["labels"], mapped("label_ids.npy"))
+        store.label_matrix = mapped("label_matrix.npy")
+        store.label_index = {name: i for i, name in enumerate(meta["labels"])}
+
+        return store
+
     @staticmethod
     def _distance_to_similarity(distance: float) -> float:
         """
         Converts FAISS L2 distance to a bounded similarity score(0-1).
-        
+
         """
         similarity = 1 / (1 + distance)
         return float(similarity)
-    
-        
-    def search(self, query_text:str, domain: Optional[str] = None, top_k: int=5) -> List[Dict]:
-        
-        if not self.vector_store:
-            return []
-        
-        raw_results = self.vector_store.similarity_search_with_score(
-            query_text,
-            k=top_k*5
-        )
-        
+
+
+    def vectors_by_paragraph(self) -> Dict[int, np.ndarray]:
+        """
+        Embedding per paragraph id (dense and loaded stores).
+        """
+
+        if self.matrix is None:
+            return {}
+
+        return {int(pid): self.matrix[row] for row, pid in enumerate(self.paragraph_ids)}
+
+
+    def _candidates(self, raw_results, domains: Iterable[str]) -> List[Dict]:
+
+        domains = set(domains)
         candidates = []
-        
+
         for doc, distance in raw_results:
-            
+
             similarity = self._distance_to_similarity(distance)
-            
+
+            labels = doc.metadata.get("domains") or [doc.metadata.get("domain")]
+
             domain_match = (
-                1.05 if domain and doc.metadata.get("domain") == domain
+                DOMAIN_BOOST if domains and domains.intersection(labels)
                 else 1.0
             )
-            
+
             boosted_score = similarity * domain_match
 
             candidates.append({
                 "paragraph_id": doc.metadata.get("paragraph_id"),
                 "text": doc.page_content,
                 "domain": doc.metadata.get("domain"),
+                "domains": labels,
                 "score": round(min(boosted_score, 1.0), 4)
             })
-                
+
         candidates.sort(key=lambda x: x["score"], reverse=True)
-            
-        return candidates[:top_k]
\ No newline at end of file
+
+        return candidates
+
+
+    def _dense_candidate(self, index: int, score: float) -> Dict:
+        labels = self.domain_labels[index]
+        return {
+            "paragraph_id": int(self.paragraph_ids[index]),
+            "text": self.texts[index],
+            "domain": labels[0],
+            "domains": labels,
+            "score": round(float(score), 4)
+        }
+
+
+    @staticmethod
+    def _top_k_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Column indices of the top_k scores per row, best first.
+        """
+
+        top_k = min(top_k, scores.shape[1])
+
+        if top_k <= 0:
+            return np.zeros((scores.shape[0], 0), dtype=np.int64)
+
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+
+        return np.take_along_axis(top, order, axis=1)
+
+
+    def _dense_search_batch(self, query_texts: List[str], domain_sets: List[List[str]], top_k_domain: int, top_k_global: int) -> List[List[Dict]]:
+
+        results: List[List[Dict]] = []
+
+        #Fewer queries per chunk against large (loaded) stores
+        chunk_size = max(1, min(DENSE_QUERY_CHUNK, DENSE_SCORE_CELLS // max(len(self.texts), 1)))
+
+        for start in range(0, len(query_texts), chunk_size):
+            chunk_texts = query_texts[start:start + chunk_size]
+            chunk_domains = domain_sets[start:start + chunk_size]
+
+            query_vectors = self.embeddings.encoder.encode(chunk_texts, normalize_embeddings=True)
+            similarity = cosine_to_similarity(query_vectors @ self.matrix.T)
+
+            #Domain mask: rows whose label set overlaps each vendor's labels
+            query_labels = np.zeros((len(chunk_texts), len(self.label_index)), dtype=np.float32)
+            for row, labels in enumerate(chunk_domains):
+                for label in labels:
+                    if label in self.label_index:
+                        query_labels[row, self.label_index[label]] = 1.0
+
+            overlap = (query_labels @ self.label_matrix.T) > 0
+            boosted = np.minimum(np.where(overlap, similarity * DOMAIN_BOOST, similarity), 1.0)
+
+            global_top = self._top_k_rows(similarity, top_k_global)
+            domain_top = self._top_k_rows(boosted, top_k_domain)
+
+            for row, labels in enumerate(chunk_domains):
+                combined = {}
+
+                for index in global_top[row]:
+                    combined[int(self.paragraph_ids[index])] = self._dense_candidate(index, similarity[row, index])
+
+                if labels:
+                    for index in domain_top[row]:
+                        combined[int(self.paragraph_ids[index])] = self._dense_candidate(index, boosted[row, index])
+
+                results.append(list(combined.values()))
+
+        return results
+
+
+    def search(self, query_text:str, domain: Optional[str] = None, top_k: int=5) -> List[Dict]:
+
+        if self.matrix is not None:
+            if domain:
+                return self._dense_search_batch([query_text], [[domain]], top_k, 0)[0]
+            return self._dense_search_batch([query_text], [[]], 0, top_k)[0]
+
+        if not self.vector_store:
+            return []
+
+        raw_results = self.vector_store.similarity_search_with_score(
+            query_text,
+            k=top_k*5
+        )
+
+        return self._candidates(raw_results, [domain] if domain else [])[:top_k]
+
+
+    def search_domains(self, query_text: str, domains: List[str], top_k_domain: int = 2, top_k_global: int = 1) -> List[Dict]:
+        """
+        Union of the best domain-boosted hits across all of the query's domain
+        labels and the best global hits, served from a single search.
+        """
+
+        return self.search_domains_batch([query_text], [domains], top_k_domain, top_k_global)[0]
+
+
+    def search_domains_batch(self, query_texts: List[str], domain_sets: List[List[str]], top_k_domain: int = 2, top_k_global: int = 1) -> List[List[Dict]]:
+        """
+        search_domains for many queries. Dense stores score them all with
+        one matrix product per chunk; FAISS stores search one at a time.
+        """
+
+        if self.matrix is not None:
+            return self._dense_search_batch(query_texts, domain_sets, top_k_domain, top_k_global)
+
+        if not self.vector_store:
+            return [[] for _ in query_texts]
+
+        results = []
+
+        for query_text, domains in zip(query_texts, domain_sets):
+            raw_results = self.vector_store.similarity_search_with_score(
+                query_text,
+                k=max(top_k_domain, top_k_global)*5
+            )
+
+            global_matches = self._candidates(raw_results, [])[:top_k_global]
+            domain_matches = self._candidates(raw_results, domains)[:top_k_domain] if domains else []
+
+            combined = {}
+            for m in global_matches + domain_matches:
+                combined[m["paragraph_id"]] = m
+
+            results.append(list(combined.values()))
+
+        return results
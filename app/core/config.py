@@ -1,6 +1,105 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+
+#Document-matching jobs
+MATCH_JOB_WORKERS = int(os.getenv("MATCH_JOB_WORKERS", "2"))
+MATCH_JOB_MAX_PENDING = int(os.getenv("MATCH_JOB_MAX_PENDING", "20"))
+MATCH_JOB_RETENTION_SECONDS = int(os.getenv("MATCH_JOB_RETENTION_SECONDS", "3600"))
+
+#LLM provider: mistral, or fake (app.core.fake_llm) for load tests and local runs
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mistral").lower()
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "800"))
+LLM_FAKE_JITTER_MS = float(os.getenv("LLM_FAKE_JITTER_MS", "400"))
+LLM_FAKE_THROTTLE_RATE = float(os.getenv("LLM_FAKE_THROTTLE_RATE", "0"))  # share of calls answered with 429
+LLM_FAKE_RETRY_AFTER_SECONDS = float(os.getenv("LLM_FAKE_RETRY_AFTER_SECONDS", "1"))
+
+#LLM call retries (exponential backoff with full jitter, Retry-After wins when longer)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+
+#LLM circuit breaker: consecutive provider failures before failing fast, and for how long
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+#Adaptive (AIMD) limit on in-flight LLM calls per process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+#Token estimates are made before each call; the provider's real counts land in the usage report
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3.5"))
+
+#Budget per clause in pairwise prompts (semantic, atomic, remediation, classification)
+LLM_CLAUSE_TOKEN_BUDGET = int(os.getenv("LLM_CLAUSE_TOKEN_BUDGET", "1024"))
+
+#Document text sent per paragraph-splitting call
+LLM_SPLIT_CHUNK_TOKENS = int(os.getenv("LLM_SPLIT_CHUNK_TOKENS", "3000"))
+
+#Shared LLM call pacing: thread (one process), file (all processes on a host), redis (all hosts)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "file").lower()
+RATE_LIMIT_INTERVAL_SECONDS = float(os.getenv("RATE_LIMIT_INTERVAL_SECONDS", "1.0"))
+RATE_LIMIT_STATE_FILE = os.getenv(
+    "RATE_LIMIT_STATE_FILE",
+    os.path.join(tempfile.gettempdir(), "policyalign-rate-limit")
+)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_REDIS_KEY = os.getenv("RATE_LIMIT_REDIS_KEY", "policyalign:rate-limit:next-slot")
+
+#Atomic gap analysis: unmatched paragraphs analysed per batch (flushed early after the wait), and concurrent LLM checks
+GAP_ANALYSIS_BATCH = int(os.getenv("GAP_ANALYSIS_BATCH", "8"))
+GAP_ANALYSIS_MAX_WAIT_SECONDS = float(os.getenv("GAP_ANALYSIS_MAX_WAIT_SECONDS", "5"))
+GAP_ANALYSIS_WORKERS = int(os.getenv("GAP_ANALYSIS_WORKERS", "8"))
+
+#Embedding backend
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR") or EMBEDDING_MODEL_NAME
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | int8 | onnx
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8192"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+
+#Embedding cache: (model id, normalized text hash) -> float16 vector, in memory then on disk
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "50000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "index_data/embedding_cache.sqlite3")  # empty = memory only
+EMBEDDING_CACHE_DISK_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ITEMS", "1000000"))  # ~0.8 GB of 384-dim vectors
+
+#On-demand request/job profiling (?profile=true or X-Profile: true, with X-Admin-Token)
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")  # empty = profiling disabled
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+#Startup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+#Vector search: stores up to this size use an exact NumPy similarity matrix instead of FAISS
+DENSE_SEARCH_MAX_VECTORS = int(os.getenv("DENSE_SEARCH_MAX_VECTORS", "5000"))
+
+#Corpus-wide clause search index
+CORPUS_INDEX_DIR = os.getenv("CORPUS_INDEX_DIR", "index_data/corpus")
+CORPUS_HNSW_M = int(os.getenv("CORPUS_HNSW_M", "32"))
+CORPUS_HNSW_EF_CONSTRUCTION = int(os.getenv("CORPUS_HNSW_EF_CONSTRUCTION", "200"))
+CORPUS_HNSW_EF_SEARCH = int(os.getenv("CORPUS_HNSW_EF_SEARCH", "128"))
+
+#Per-document vendor vector stores, memory-mapped by every worker
+DOCUMENT_INDEX_DIR = os.getenv("DOCUMENT_INDEX_DIR", "index_data/documents")
+
+#Bulk ingestion pipeline
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "200"))
+BULK_MAX_TOTAL_MB = int(os.getenv("BULK_MAX_TOTAL_MB", "1024"))  # all files of a batch, zip entries uncompressed
+BULK_EXTRACT_PROCESSES = int(os.getenv("BULK_EXTRACT_PROCESSES", "4"))
+BULK_SPLIT_WORKERS = int(os.getenv("BULK_SPLIT_WORKERS", "4"))
+BULK_CLASSIFY_WORKERS = int(os.getenv("BULK_CLASSIFY_WORKERS", "4"))
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "8"))
+BULK_EMBED_BATCH = int(os.getenv("BULK_EMBED_BATCH", "256"))
+BULK_WRITE_BATCH = int(os.getenv("BULK_WRITE_BATCH", "8"))
+BULK_RETENTION_SECONDS = int(os.getenv("BULK_RETENTION_SECONDS", "3600"))
+
+#Offline CLI (python -m app.cli): match processes, each loads its own embedding model
+CLI_MATCH_WORKERS = int(os.getenv("CLI_MATCH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
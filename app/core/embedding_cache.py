@@ -0,0 +1,255 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_DISK_MAX_ITEMS,
+)
+
+#Keys per SELECT ... IN (...), under SQLite's bound-parameter limit
+DISK_LOOKUP_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """
+    Whitespace and Unicode composition differences do not change what the
+    tokenizer sees, so they share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_id: str, text: str, normalized: bool) -> bytes:
+    #Raw and normalized vectors of one text are different entries
+    prefix = f"{model_id}\0{'n' if normalized else 'r'}\0"
+    return hashlib.sha256((prefix + normalize_text(text)).encode("utf-8")).digest()
+
+
+def from_stored(vectors: np.ndarray, normalized: bool) -> np.ndarray:
+    """
+    float16 cache entries as float32, back to unit length if they were
+    normalized. Misses are returned the same way, so results do not depend
+    on whether a text was already cached.
+    """
+
+    vectors = vectors.astype(np.float32)
+
+    if normalized:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+
+    return vectors
+
+
+class MemoryTier:
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.items: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+
+        found = {}
+
+        with self.lock:
+            for key in keys:
+                vector = self.items.get(key)
+                if vector is not None:
+                    self.items.move_to_end(key)
+                    found[key] = vector
+
+        return found
+
+    def put_many(self, entries: Dict[bytes, np.ndarray]):
+
+        with self.lock:
+            for key, vector in entries.items():
+                self.items[key] = vector
+                self.items.move_to_end(key)
+
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+
+class DiskTier:
+    """
+    SQLite file of float16 vectors, shared by every process on the host.
+    One connection per thread; WAL lets readers run during writes.
+    Holds at most max_items rows: the oldest entries are deleted first,
+    and SQLite reuses their pages, so the file stops growing.
+    """
+
+    def __init__(self, path: str, max_items: int = EMBEDDING_CACHE_DISK_MAX_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self.local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        #Unbounded table of earlier versions, without the insertion order needed for pruning
+        connection.execute("DROP TABLE IF EXISTS embeddings")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_vectors (id INTEGER PRIMARY KEY, key BLOB NOT NULL UNIQUE, vector BLOB NOT NULL)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+
+        connection = getattr(self.local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+
+        return connection
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+
+        connection = self._connection()
+        found = {}
+
+        for start in range(0, len(keys), DISK_LOOKUP_CHUNK):
+            chunk = keys[start:start + DISK_LOOKUP_CHUNK]
+            rows = connection.execute(
+                f"SELECT key, vector FROM embedding_vectors WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float16)
+
+        return found
+
+    def put_many(self, entries: Dict[bytes, np.ndarray]):
+
+        connection = self._connection()
+
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO embedding_vectors (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in entries.items()]
+            )
+            #Ids grow with each insert, so this keeps the newest max_items rows
+            connection.execute(
+                "DELETE FROM embedding_vectors WHERE id <= (SELECT MAX(id) FROM embedding_vectors) - ?",
+                (self.max_items,)
+            )
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM embedding_vectors").fetchone()[0]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embeddings keyed by (model id, normalized text hash):
+    an in-process LRU in front of an on-disk tier, both holding float16.
+    A disk failure (full disk, locked file, unwritable directory) only
+    costs the cache, never the encode.
+    """
+
+    def __init__(self, memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS, path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.memory = MemoryTier(memory_items)
+        self.disk: Optional[DiskTier] = None
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            try:
+                self.disk = DiskTier(path)
+            except (sqlite3.Error, OSError) as e:
+                print("Embedding disk cache unavailable, using memory only:", e)
+
+    def _disk_call(self, method: str, *args):
+
+        try:
+            return getattr(self.disk, method)(*args)
+        except (sqlite3.Error, OSError) as e:
+            print("Embedding disk cache error:", e)
+            return {}
+
+    def encode(self, model_id: str, texts: List[str], normalized: bool, encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings of texts, running encode_fn only on texts not cached yet
+        (each distinct text once).
+        """
+
+        keys = [cache_key(model_id, text, normalized) for text in texts]
+
+        #First position of each distinct key
+        first_index: Dict[bytes, int] = {}
+        for index, key in enumerate(keys):
+            first_index.setdefault(key, index)
+
+        unique_keys = list(first_index)
+        found = self.memory.get_many(unique_keys)
+        memory_hits = len(found)
+
+        missing = [key for key in unique_keys if key not in found]
+
+        if missing and self.disk is not None:
+            from_disk = self._disk_call("get_many", missing)
+            if from_disk:
+                self.memory.put_many(from_disk)
+                found.update(from_disk)
+                missing = [key for key in missing if key not in from_disk]
+
+        if missing:
+            encoded = encode_fn([texts[first_index[key]] for key in missing]).astype(np.float16)
+            #Row copies, so one cached row does not pin the whole batch in memory
+            new_entries = {key: row.copy() for key, row in zip(missing, encoded)}
+
+            self.memory.put_many(new_entries)
+            if self.disk is not None:
+                self._disk_call("put_many", new_entries)
+
+            found.update(new_entries)
+
+        with self.lock:
+            self.hits += memory_hits
+            self.disk_hits += len(unique_keys) - memory_hits - len(missing)
+            self.misses += len(missing)
+
+        return from_stored(np.stack([found[key] for key in keys]), normalized)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "memory_hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self.memory.items),
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _cache
+
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
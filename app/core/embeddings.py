@@ -0,0 +1,201 @@
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import (
+    EMBEDDING_MODEL_DIR,
+    EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_THREADS,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_MAX_BATCH_SIZE,
+)
+from app.core.embedding_cache import get_embedding_cache
+from app.core.profiler import profiled_thread
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+class SentenceEncoder:
+    """
+    CPU sentence encoder with a selectable backend:
+
+    - torch: the plain fp32 SentenceTransformer
+    - int8:  the same model with dynamic int8 quantization of its Linear layers
+    - onnx:  an ONNX Runtime export loaded from the model directory
+
+    Inputs are sorted by token length and packed into batches under a
+    padded-token budget, so short clauses are not padded to the longest one.
+    Texts already embedded by this model come from the embedding cache.
+    """
+
+    def __init__(self, backend: str = EMBEDDING_BACKEND, model_path: str = EMBEDDING_MODEL_DIR, threads: int = EMBEDDING_THREADS):
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}'. Choose from {BACKENDS}.")
+
+        self.backend = backend
+        self.model_path = model_path
+        self.threads = threads
+        self.model = self._load()
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "onnx":
+            try:
+                import onnxruntime
+            except ImportError as e:
+                raise ImportError(
+                    "EMBEDDING_BACKEND=onnx requires onnxruntime and optimum to be installed."
+                ) from e
+
+            session_options = onnxruntime.SessionOptions()
+            if self.threads:
+                session_options.intra_op_num_threads = self.threads
+
+            return SentenceTransformer(
+                self.model_path,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={
+                    "file_name": EMBEDDING_ONNX_FILE,
+                    "provider": "CPUExecutionProvider",
+                    "session_options": session_options,
+                }
+            )
+
+        import torch
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+        model = SentenceTransformer(self.model_path, device="cpu")
+
+        if self.backend == "int8":
+            model = torch.quantization.quantize_dynamic(
+                model,
+                {torch.nn.Linear},
+                dtype=torch.qint8
+            )
+
+        return model
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+
+        encoded = self.model.tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=True,
+            max_length=self.model.max_seq_length
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Groups text indices, shortest first, so each batch stays under
+        EMBEDDING_BATCH_TOKENS once padded to its longest member.
+        """
+
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind="stable")
+
+        batches = []
+        batch: List[int] = []
+        batch_max = 0
+
+        for index in order:
+            length = lengths[index]
+            padded = max(batch_max, length) * (len(batch) + 1)
+
+            if batch and (padded > EMBEDDING_BATCH_TOKENS or len(batch) >= EMBEDDING_MAX_BATCH_SIZE):
+                batches.append(batch)
+                batch = []
+                batch_max = 0
+
+            batch.append(int(index))
+            batch_max = max(batch_max, length)
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, use_cache: bool = True) -> np.ndarray:
+
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        cache = get_embedding_cache() if use_cache else None
+
+        with profiled_thread():
+            if cache is None:
+                return self._encode(texts, normalize_embeddings)
+
+            return cache.encode(
+                self.model_id,
+                texts,
+                normalize_embeddings,
+                lambda missing: self._encode(missing, normalize_embeddings)
+            )
+
+    def _encode(self, texts: List[str], normalize_embeddings: bool) -> np.ndarray:
+
+        embeddings: Optional[np.ndarray] = None
+
+        for batch in self._batches(texts):
+            vectors = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+
+            embeddings[batch] = vectors
+
+        return embeddings
+
+    @property
+    def model_id(self) -> str:
+        # Vectors from different backends are close but not identical
+        return f"{self.model_path}@{self.backend}"
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class EncoderEmbeddings(Embeddings):
+    """
+    LangChain adapter so vector stores share the process-wide encoder
+    instead of loading their own copy of the model.
+    """
+
+    def __init__(self, encoder: Optional[SentenceEncoder] = None):
+        self.encoder = encoder or get_embedding_model()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encoder.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encoder.encode([text])[0].tolist()
+
+
+_encoder: Optional[SentenceEncoder] = None
+_encoder_lock = threading.Lock()
+
+
+def get_embedding_model() -> SentenceEncoder:
+    global _encoder
+
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = SentenceEncoder()
+    return _encoder
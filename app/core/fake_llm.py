@@ -0,0 +1,181 @@
+import ast
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.config import (
+    LLM_FAKE_LATENCY_MS,
+    LLM_FAKE_JITTER_MS,
+    LLM_FAKE_THROTTLE_RATE,
+    LLM_FAKE_RETRY_AFTER_SECONDS,
+)
+
+#Token-overlap score at which the fake judges two clauses equivalent
+MATCH_THRESHOLD = 0.5
+
+FORMAT_INSTRUCTIONS_START = "The output should be formatted as a JSON instance"
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def overlap(a: str, b: str) -> float:
+
+    a, b = _tokens(a), _tokens(b)
+
+    if not a or not b:
+        return 0.0
+
+    return len(a & b) / len(a | b)
+
+
+def _between(text: str, start: str, end: Optional[str] = None) -> str:
+
+    _, _, rest = text.partition(start)
+
+    if end:
+        rest = rest.split(end)[0]
+
+    return rest.strip()
+
+
+def _split_document(document: str) -> List[str]:
+    """
+    One paragraph per numbered clause, or per sentence-ending line.
+    """
+
+    paragraphs = []
+    current = []
+
+    for line in document.splitlines():
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if current and re.match(r"\d+(\.\d+)*[.)]\s", line):
+            paragraphs.append(" ".join(current))
+            current = []
+
+        current.append(line)
+
+        if line.endswith((".", ";", ":")):
+            paragraphs.append(" ".join(current))
+            current = []
+
+    if current:
+        paragraphs.append(" ".join(current))
+
+    return paragraphs
+
+
+def fake_answer(system: str, user: str) -> str:
+    """
+    A well-formed answer for each prompt the app sends, derived from its
+    inputs, so repeated runs give the same results.
+    """
+
+    if "split the given policy document" in system:
+        document = _between(user, "Document:", FORMAT_INSTRUCTIONS_START)
+        return json.dumps({"paragraphs": _split_document(document)})
+
+    if "classify the paragraph into EXACTLY ONE domain" in system:
+        domains = ast.literal_eval(re.search(r"\[.*?\]", system, re.DOTALL).group(0))
+        domain = domains[zlib.crc32(user.encode()) % len(domains)] if domains else ""
+        return json.dumps({"domain": domain, "confidence": 0.8})
+
+    if "substantially satisfies" in user:
+        score = overlap(
+            _between(user, "Client Paragraph:", "Vendor Paragraph:"),
+            _between(user, "Vendor Paragraph:", "Determine whether")
+        )
+        return json.dumps({
+            "match": score >= MATCH_THRESHOLD,
+            "similarity_score": round(score, 3),
+            "reason": "Fake provider: token overlap."
+        })
+
+    if "Compare client clause and vendor clause" in system:
+        score = overlap(_between(user, "CLIENT:", "VENDOR:"), _between(user, "VENDOR:"))
+        matched = score >= MATCH_THRESHOLD
+        return json.dumps({
+            "match": matched,
+            "similarity_score": round(score, 3),
+            "gap_type": None if matched else "Missing implementation detail",
+            "reason": "Fake provider: token overlap."
+        })
+
+    if "Rewrite the vendor clause" in system:
+        return f"{_between(user, 'VENDOR:')} {_between(user, 'CLIENT:', 'VENDOR:')}"
+
+    return "{}"
+
+
+def throttled_error() -> httpx.HTTPStatusError:
+
+    request = httpx.Request("POST", "https://fake-llm.invalid/v1/chat/completions")
+    response = httpx.Response(
+        429,
+        headers={"Retry-After": str(LLM_FAKE_RETRY_AFTER_SECONDS)},
+        request=request
+    )
+
+    return httpx.HTTPStatusError("Error response 429 while fetching fake completion", request=request, response=response)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model with configurable latency and 429 injection. Answers are
+    valid for every chain in the app (splitting, classification, matching,
+    remediation) and report token usage like the real client.
+    """
+
+    latency_ms: float = LLM_FAKE_LATENCY_MS
+    jitter_ms: float = LLM_FAKE_JITTER_MS
+    throttle_rate: float = LLM_FAKE_THROTTLE_RATE
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+
+        if random.random() < self.throttle_rate:
+            raise throttled_error()
+
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        system = "\n".join(str(m.content) for m in messages if m.type == "system")
+        user = "\n".join(str(m.content) for m in messages if m.type != "system")
+
+        content = fake_answer(system, user)
+
+        token_usage = {
+            "prompt_tokens": (len(system) + len(user)) // 4,
+            "completion_tokens": len(content) // 4,
+        }
+
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={"token_usage": token_usage}
+        )
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+
+        #Summed like ChatMistralAI does, so UsageCallbackHandler sees provider-style counts
+        token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+        for output in llm_outputs:
+            for key, value in ((output or {}).get("token_usage") or {}).items():
+                token_usage[key] = token_usage.get(key, 0) + value
+
+        return {"token_usage": token_usage}
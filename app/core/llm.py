@@ -1,20 +1,65 @@
 import os
-from langchain_mistralai import ChatMistralAI
+import threading
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.core.usage import record_tokens
+from app.core.config import LLM_PROVIDER
 
 
 load_dotenv()
 
 MISTRAL_API_KEY =os.getenv("MISTRAL_API_KEY")
-_llm = None
-
-def get_llm():
-    global _llm
-    
-    if _llm is None:
-        _llm = ChatMistralAI(
-            model="mistral-small-latest",
-            api_key=MISTRAL_API_KEY,
-            temperature=0
+LLM_MODEL = "mistral-small-latest"
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Records the token counts the provider reports for every completion.
+    """
+
+    def on_llm_end(self, response, **kwargs):
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+
+        record_tokens(
+            token_usage.get("prompt_tokens", 0) or 0,
+            token_usage.get("completion_tokens", 0) or 0
         )
-    return _llm
\ No newline at end of file
+
+
+_llms: Dict[Tuple[bool, Optional[int]], object] = {}
+_llm_lock = threading.Lock()
+
+def get_llm(json_mode: bool = False, timeout: Optional[int] = None):
+    """
+    Returns a shared ChatMistralAI client, built on first use.
+    json_mode forces a JSON object response; timeout is in seconds.
+    With LLM_PROVIDER=fake every client is the offline FakeChatModel.
+    """
+    key = (json_mode, timeout)
+
+    if key not in _llms:
+        with _llm_lock:
+            if key not in _llms and LLM_PROVIDER == "fake":
+                from app.core.fake_llm import FakeChatModel
+
+                _llms[key] = FakeChatModel(callbacks=[UsageCallbackHandler()])
+
+            if key not in _llms:
+                from langchain_mistralai import ChatMistralAI
+
+                #Retries live in app.core.llm_policy, so the client makes a single attempt
+                kwargs = {"max_retries": 1}
+                if json_mode:
+                    kwargs["model_kwargs"] = {"response_format": {"type": "json_object"}}
+                if timeout:
+                    kwargs["timeout"] = timeout
+
+                _llms[key] = ChatMistralAI(
+                    model=LLM_MODEL,
+                    api_key=MISTRAL_API_KEY,
+                    temperature=0,
+                    callbacks=[UsageCallbackHandler()],
+                    **kwargs
+                )
+    return _llms[key]
@@ -0,0 +1,287 @@
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, TypeVar
+
+from app.core.rate_limiter import rate_limiter
+from app.core.usage import record_attempt, usage_stage
+from app.core.profiler import profiled_thread, record_blocked
+from app.core.config import (
+    LLM_MAX_ATTEMPTS,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_BREAKER_THRESHOLD,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_MAX_CONCURRENCY,
+)
+
+T = TypeVar("T")
+
+LLM_MIN_CONCURRENCY = 1
+
+STATUS_IN_MESSAGE = re.compile(r"(?:status|response|error code)\D{0,12}?([1-5]\d\d)\b", re.IGNORECASE)
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised without calling the provider while the circuit breaker is open.
+    """
+
+
+def status_code(exc: Exception) -> Optional[int]:
+
+    code = getattr(exc, "status_code", None)
+
+    if code is None and getattr(exc, "response", None) is not None:
+        code = getattr(exc.response, "status_code", None)
+
+    if code is None:
+        #Some clients only put the status in the message ("Error response 429 while fetching ...")
+        match = STATUS_IN_MESSAGE.search(str(exc))
+        if match:
+            code = int(match.group(1))
+
+    return code
+
+
+def classify_error(exc: Exception) -> str:
+
+    code = status_code(exc)
+
+    if code == 429:
+        return THROTTLED
+
+    if code is not None and code >= 500:
+        return TRANSIENT
+
+    #Timeouts and dropped connections (httpx, requests and builtins)
+    name = type(exc).__name__
+    if isinstance(exc, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connect" in name:
+        return TRANSIENT
+
+    return FATAL
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """
+    Seconds requested by a Retry-After header, if the error carries one.
+    """
+
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+
+    if not headers:
+        return None
+
+    value = headers.get("retry-after")
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: Exception) -> float:
+
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    requested = retry_after(exc)
+
+    if requested is not None:
+        delay = max(delay, min(requested, LLM_BACKOFF_MAX_SECONDS))
+
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive provider failures; after the cooldown
+    a single trial call is let through and its outcome closes or reopens it.
+    A throttled trial reopens it as well, so the next trial waits another
+    cooldown instead of the circuit staying stuck open.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError while open; True if the caller got the trial call.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return False
+
+            if time.time() - self.opened_at < self.cooldown or self.trial_running:
+                raise CircuitOpenError("LLM provider circuit is open")
+
+            self.trial_running = True
+            return True
+
+    def on_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"LLM circuit opened after {self.failures} failures")
+                self.opened_at = time.time()
+
+    def on_throttle(self, trial: bool):
+        #429s say nothing about provider health, but a trial must be settled
+        if not trial:
+            return
+
+        with self.lock:
+            self.trial_running = False
+            self.opened_at = time.time()
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight calls: each success raises the limit by
+    1/limit (about +1 per round trip of calls), each throttle halves it.
+    """
+
+    def __init__(self, initial: int = LLM_MAX_CONCURRENCY, minimum: int = LLM_MIN_CONCURRENCY, maximum: int = LLM_MAX_CONCURRENCY):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        with self.condition:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def on_throttle(self):
+        with self.condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class LLMCallPolicy:
+    """
+    The one place LLM calls are paced, limited and retried.
+    """
+
+    def __init__(self, max_attempts: int = LLM_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.breaker = CircuitBreaker()
+        self.concurrency = AdaptiveConcurrency()
+
+    def call(self, fn: Callable[[], T], stage: str = "llm", prompt_tokens: int = 0) -> T:
+        """
+        stage and prompt_tokens (an estimate) feed the run's usage report.
+        """
+
+        with profiled_thread():
+            return self._call(fn, stage, prompt_tokens)
+
+    def _call(self, fn: Callable[[], T], stage: str, prompt_tokens: int) -> T:
+
+        for attempt in range(self.max_attempts):
+
+            trial = self.breaker.before_call()
+
+            queued_at = time.perf_counter()
+            started_at = None
+            self.concurrency.acquire()
+            record_blocked("llm_concurrency", time.perf_counter() - queued_at)
+
+            try:
+                rate_limiter.wait()
+                started_at = time.perf_counter()
+
+                with usage_stage(stage):
+                    result = fn()
+                error = None
+
+            except Exception as e:
+                error = e
+
+            finally:
+                self.concurrency.release()
+
+            if started_at is not None:
+                record_blocked("llm", time.perf_counter() - started_at)
+                record_attempt(
+                    stage,
+                    prompt_tokens,
+                    time.perf_counter() - started_at,
+                    started_at - queued_at,
+                    error is not None
+                )
+
+            if error is None:
+                self.breaker.on_success()
+                self.concurrency.on_success()
+                return result
+
+            kind = classify_error(error)
+
+            if kind == FATAL:
+                #The provider answered (bad request, unparsable output): retrying will not help
+                self.breaker.on_success()
+                raise error
+
+            if kind == THROTTLED:
+                self.breaker.on_throttle(trial)
+                self.concurrency.on_throttle()
+            else:
+                self.breaker.on_failure()
+
+            if attempt + 1 >= self.max_attempts:
+                raise error
+
+            delay = backoff_delay(attempt, error)
+            print(f"LLM call {kind} ({type(error).__name__}), retrying in {delay:.1f}s")
+
+            #Throttles pause every worker sharing the limiter; other errors only this caller
+            if kind == THROTTLED:
+                rate_limiter.defer(delay)
+            else:
+                time.sleep(delay)
+
+
+llm_policy = LLMCallPolicy()
+
+
+def call_llm(fn: Callable[[], T], stage: str = "llm", prompt_tokens: int = 0) -> T:
+    return llm_policy.call(fn, stage, prompt_tokens)
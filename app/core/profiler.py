@@ -0,0 +1,414 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.core.config import (
+    PROFILE_ADMIN_TOKEN,
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+)
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["Profiling"]
+)
+
+#Frames kept per sample, innermost last
+MAX_STACK_DEPTH = 256
+
+#Blocking time broken out next to the samples (summed over the run's threads)
+BLOCKED_CATEGORIES = ("rate_limiter", "llm_concurrency", "llm", "db")
+
+TRUE_VALUES = ("1", "true", "yes")
+
+
+class Profile:
+    """
+    Sampling profile of one run (a request, a match job, an ingestion).
+
+    A sampler thread reads the stacks of the run's threads from
+    sys._current_frames() every PROFILE_INTERVAL_MS; the profiled code is
+    not instrumented, so the overhead stays around the sampling cost.
+    Threads are sampled only while they work for the run (profiled_thread()),
+    so pooled threads shared with other runs stay out of the profile.
+    """
+
+    def __init__(self, name: str, interval_ms: int = PROFILE_INTERVAL_MS):
+        self.profile_id = str(uuid.uuid4())
+        self.name = name
+        self.interval = interval_ms / 1000
+
+        self.lock = threading.Lock()
+        self.threads: Dict[int, str] = {}
+        #Threads working for the run right now, with their nesting depth
+        self.active: Dict[int, int] = {}
+
+        #Frames and whole stacks are interned, so long runs store one int per sample
+        self.frames: Dict[Tuple[str, str, int], int] = {}
+        self.stacks: Dict[Tuple[int, ...], int] = {}
+        #(stack id, wall seconds since the previous tick) per thread
+        self.samples: Dict[int, List[Tuple[int, float]]] = {}
+
+        self.blocked = {category: {"seconds": 0.0, "calls": 0} for category in BLOCKED_CATEGORIES}
+
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stop_event = threading.Event()
+        self.sampler: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"/api/profiles/{self.profile_id}"
+
+    def attach(self, thread_id: int, thread_name: str):
+        with self.lock:
+            self.threads.setdefault(thread_id, thread_name)
+            self.samples.setdefault(thread_id, [])
+            self.active[thread_id] = self.active.get(thread_id, 0) + 1
+
+    def detach(self, thread_id: int):
+        with self.lock:
+            depth = self.active.pop(thread_id, 0) - 1
+            if depth > 0:
+                self.active[thread_id] = depth
+
+    def record_blocked(self, category: str, seconds: float):
+        with self.lock:
+            self.blocked[category]["seconds"] += seconds
+            self.blocked[category]["calls"] += 1
+
+    def start(self):
+        install_db_timing()
+
+        self.started_at = time.perf_counter()
+        self.sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.profile_id[:8]}", daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        self.finished_at = time.perf_counter()
+
+    def _stack_id(self, frame) -> int:
+
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+
+            frame_id = self.frames.get(key)
+            if frame_id is None:
+                frame_id = self.frames[key] = len(self.frames)
+
+            stack.append(frame_id)
+            frame = frame.f_back
+
+        stack.reverse()
+        stack_key = tuple(stack)
+
+        stack_id = self.stacks.get(stack_key)
+        if stack_id is None:
+            stack_id = self.stacks[stack_key] = len(self.stacks)
+
+        return stack_id
+
+    def _sample_loop(self):
+
+        last_tick = self.started_at
+
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter()
+            frames = sys._current_frames()
+
+            with self.lock:
+                for thread_id in self.active:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self.samples[thread_id].append((self._stack_id(frame), now - last_tick))
+
+            del frames
+            last_tick = now
+
+    def speedscope(self) -> Dict:
+        """
+        speedscope file (https://www.speedscope.app), one sampled profile
+        per thread, each sample weighted by the wall time since the
+        previous tick.
+        """
+
+        frames = [None] * len(self.frames)
+        for (name, filename, line), frame_id in self.frames.items():
+            frames[frame_id] = {"name": name, "file": filename, "line": line}
+
+        stacks = [None] * len(self.stacks)
+        for stack, stack_id in self.stacks.items():
+            stacks[stack_id] = list(stack)
+
+        end = self.finished_at - self.started_at
+        profiles = []
+
+        for thread_id, samples in self.samples.items():
+            if not samples:
+                continue
+
+            profiles.append({
+                "type": "sampled",
+                "name": self.threads[thread_id],
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": end,
+                "samples": [stacks[stack_id] for stack_id, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "PolicyAlign profiler",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self) -> Dict:
+        return {
+            "profile_id": self.profile_id,
+            "name": self.name,
+            "wall_seconds": round(self.finished_at - self.started_at, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "threads": {name: len(self.samples[tid]) for tid, name in self.threads.items()},
+            "blocked": {
+                category: {"seconds": round(v["seconds"], 3), "calls": v["calls"]}
+                for category, v in self.blocked.items()
+            },
+            "speedscope_url": self.url,
+        }
+
+    def save(self, directory: str = PROFILE_DIR):
+
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, f"{self.profile_id}.speedscope.json"), "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f)
+
+        with open(os.path.join(directory, f"{self.profile_id}.summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f)
+
+        prune_profiles(directory)
+        print("Profile saved:", self.name, self.summary())
+
+
+_active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+
+def current_profile() -> Optional[Profile]:
+    return _active_profile.get()
+
+
+@contextmanager
+def profiled_thread():
+    """
+    Samples the calling thread for the block, if the run is profiled.
+    Wraps the places where pooled threads do a run's work (LLM calls,
+    encoding).
+    """
+
+    profile = _active_profile.get()
+
+    if profile is None:
+        yield
+        return
+
+    thread = threading.current_thread()
+    profile.attach(thread.ident, thread.name)
+    try:
+        yield
+    finally:
+        profile.detach(thread.ident)
+
+
+def record_blocked(category: str, seconds: float):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.record_blocked(category, seconds)
+
+
+@contextmanager
+def profiling(profile: Optional[Profile]):
+    """
+    Runs the block as part of profile (None = not profiled).
+    """
+
+    if profile is None:
+        yield None
+        return
+
+    token = _active_profile.set(profile)
+    try:
+        with profiled_thread():
+            yield profile
+    finally:
+        _active_profile.reset(token)
+
+
+@contextmanager
+def profile_run(profile: Optional[Profile]):
+    """
+    Samples the block and saves the profile when it ends.
+    """
+
+    if profile is None:
+        yield None
+        return
+
+    profile.start()
+    try:
+        with profiling(profile):
+            yield profile
+    finally:
+        profile.stop()
+        try:
+            profile.save()
+        except OSError as e:
+            print("Profile could not be saved:", e)
+
+
+_db_timing_installed = False
+_db_timing_lock = threading.Lock()
+
+
+def install_db_timing():
+    """
+    Times every statement on the sync engines, counted for the profiled
+    run the statement belongs to. Installed on first use, so unprofiled
+    processes never pay for it.
+    """
+
+    global _db_timing_installed
+
+    if _db_timing_installed:
+        return
+
+    with _db_timing_lock:
+        if _db_timing_installed:
+            return
+
+        from sqlalchemy import event
+        from app.db.database import engine, worker_engine
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("profile_query_started", []).append(time.perf_counter())
+
+        def after_execute(conn, cursor, statement, parameters, context, executemany):
+            #Empty for a statement already running when the listeners were installed
+            if conn.info.get("profile_query_started"):
+                started = conn.info["profile_query_started"].pop()
+                record_blocked("db", time.perf_counter() - started)
+
+        def on_error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get("profile_query_started"):
+                started = conn.info["profile_query_started"].pop()
+                record_blocked("db", time.perf_counter() - started)
+
+        for target in (engine, worker_engine):
+            event.listen(target, "before_cursor_execute", before_execute)
+            event.listen(target, "after_cursor_execute", after_execute)
+            event.listen(target, "handle_error", on_error)
+
+        _db_timing_installed = True
+
+
+def prune_profiles(directory: str):
+
+    files = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".speedscope.json")),
+        key=os.path.getmtime
+    )
+
+    for path in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        for suffix in (".speedscope.json", ".summary.json"):
+            try:
+                os.remove(path[:-len(".speedscope.json")] + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def require_admin(request: Request):
+
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (PROFILE_ADMIN_TOKEN not set).")
+
+    token = request.headers.get("X-Admin-Token", "")
+
+    if not hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+
+def profile_requested(request: Request) -> bool:
+    """
+    Dependency: True when the caller asked for a profile with
+    ?profile=true or an X-Profile: true header. Admins only.
+    """
+
+    requested = (
+        request.query_params.get("profile", "").lower() in TRUE_VALUES
+        or request.headers.get("X-Profile", "").lower() in TRUE_VALUES
+    )
+
+    if requested:
+        require_admin(request)
+
+    return requested
+
+
+def new_profile(requested: bool, name: str) -> Optional[Profile]:
+    return Profile(name) if requested else None
+
+
+def _profile_path(profile_id: str, suffix: str) -> str:
+
+    #Ids are uuid4 strings; anything else could walk out of PROFILE_DIR
+    try:
+        uuid.UUID(profile_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{suffix}")
+
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found (or the run has not finished).")
+
+    return path
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+
+    require_admin(request)
+
+    return FileResponse(
+        _profile_path(profile_id, ".speedscope.json"),
+        media_type="application/json",
+        filename=f"{profile_id}.speedscope.json"
+    )
+
+
+@router.get("/{profile_id}/summary")
+def get_profile_summary(profile_id: str, request: Request):
+
+    require_admin(request)
+
+    with open(_profile_path(profile_id, ".summary.json"), encoding="utf-8") as f:
+        return json.load(f)
@@ -1,17 +1,158 @@
+import struct
 import time
 import threading
 
+from app.core.usage import record_llm_call
+from app.core.profiler import record_blocked
+from app.core.config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_INTERVAL_SECONDS,
+    RATE_LIMIT_STATE_FILE,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_REDIS_KEY,
+)
+
+
+class ThreadSlots:
+    """
+    Slot bookkeeping for the threads of one process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def reserve(self, interval: float) -> float:
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + interval
+            return slot - now
+
+    def defer(self, seconds: float):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.time() + seconds)
+
+
+class FileSlots:
+    """
+    Slot bookkeeping shared by every process on the host: the next free
+    slot is a timestamp in a small state file guarded by a file lock.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_STATE_FILE):
+        from filelock import FileLock
+
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+
+    def _read(self) -> float:
+        try:
+            with open(self.path, "rb") as f:
+                return struct.unpack("d", f.read(8))[0]
+        except (FileNotFoundError, struct.error):
+            return 0.0
+
+    def _write(self, value: float):
+        with open(self.path, "wb") as f:
+            f.write(struct.pack("d", value))
+
+    def reserve(self, interval: float) -> float:
+        with self.lock:
+            now = time.time()
+            slot = max(now, self._read())
+            self._write(slot + interval)
+            return slot - now
+
+    def defer(self, seconds: float):
+        with self.lock:
+            self._write(max(self._read(), time.time() + seconds))
+
+
+class RedisSlots:
+    """
+    Slot bookkeeping shared across hosts. The script runs atomically on
+    the server and uses the server clock, so host clock skew does not matter.
+    """
+
+    RESERVE = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local slot = math.max(now, tonumber(redis.call('GET', KEYS[1]) or '0'))
+    redis.call('SET', KEYS[1], tostring(slot + tonumber(ARGV[1])), 'EX', 3600)
+    return tostring(slot - now)
+    """
+
+    DEFER = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local slot = math.max(now + tonumber(ARGV[1]), tonumber(redis.call('GET', KEYS[1]) or '0'))
+    redis.call('SET', KEYS[1], tostring(slot), 'EX', 3600)
+    return tostring(slot - now)
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, key: str = RATE_LIMIT_REDIS_KEY):
+        import redis
+
+        client = redis.Redis.from_url(url)
+        self.key = key
+        self.reserve_script = client.register_script(self.RESERVE)
+        self.defer_script = client.register_script(self.DEFER)
+
+    def reserve(self, interval: float) -> float:
+        return float(self.reserve_script(keys=[self.key], args=[interval]))
+
+    def defer(self, seconds: float):
+        self.defer_script(keys=[self.key], args=[seconds])
+
+
+SLOT_BACKENDS = {
+    "thread": ThreadSlots,
+    "file": FileSlots,
+    "redis": RedisSlots,
+}
+
+
 class RateLimiter:
-    def __init__(self, min_interval_seconds: float = 1.0):
+    """
+    Spaces LLM calls min_interval_seconds apart across every caller sharing
+    the backend. Each call reserves the next free slot and sleeps until it
+    outside the lock, so callers queue at a steady rate instead of bursting.
+    """
+
+    def __init__(self, min_interval_seconds: float = RATE_LIMIT_INTERVAL_SECONDS, backend: str = RATE_LIMIT_BACKEND):
         self.min_interval = min_interval_seconds
+        self.backend = backend
+        self.slots = None
         self.lock = threading.Lock()
-        self.last_call_time = 0
+
+    def _get_slots(self):
+        #Created on first use, so importing this module needs no optional packages
+        if self.slots is None:
+            with self.lock:
+                if self.slots is None:
+                    if self.backend not in SLOT_BACKENDS:
+                        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {self.backend}")
+                    self.slots = SLOT_BACKENDS[self.backend]()
+        return self.slots
 
     def wait(self):
-        with self.lock:
-            elapsed = time.time() - self.last_call_time
-            if elapsed < self.min_interval:
-                time.sleep(self.min_interval - elapsed)
-            self.last_call_time = time.time()
+        started = time.perf_counter()
+        delay = self._get_slots().reserve(self.min_interval)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        record_blocked("rate_limiter", time.perf_counter() - started)
+
+        # Every LLM call passes through here, so this is where runs count them
+        record_llm_call()
+
+    def defer(self, seconds: float):
+        """
+        Pushes the next slot at least seconds into the future for every
+        caller, e.g. after the provider answers 429.
+        """
+        self._get_slots().defer(seconds)
 
-rate_limiter = RateLimiter()
\ No newline at end of file
+rate_limiter = RateLimiter()
@@ -0,0 +1,74 @@
+import math
+from typing import Dict, List
+
+from app.core.usage import record_trim
+from app.core.config import (
+    LLM_CHARS_PER_TOKEN as CHARS_PER_TOKEN,
+    LLM_CLAUSE_TOKEN_BUDGET,
+    LLM_SPLIT_CHUNK_TOKENS,
+)
+
+#Share of a trimmed clause kept from its start; the rest comes from its end
+TRIM_HEAD_SHARE = 0.7
+TRIM_MARKER = "\n[...]\n"
+
+#Role and framing tokens added per chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def estimate_prompt_tokens(prompt, inputs: Dict) -> int:
+    """
+    Estimated prompt size of a ChatPromptTemplate filled with inputs.
+    """
+    return sum(
+        estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+        for message in prompt.format_messages(**inputs)
+    )
+
+
+def fit_to_budget(text: str, max_tokens: int = LLM_CLAUSE_TOKEN_BUDGET, stage: str = "llm") -> str:
+    """
+    Trims text to about max_tokens, keeping its beginning and end: clauses
+    state the obligation up front and qualifications or references last.
+    """
+
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = int(max_tokens * CHARS_PER_TOKEN) - len(TRIM_MARKER)
+    head = int(max_chars * TRIM_HEAD_SHARE)
+    tail = max_chars - head
+
+    record_trim(stage)
+
+    return text[:head].rstrip() + TRIM_MARKER + text[len(text) - tail:].lstrip()
+
+
+def chunk_lines(lines: List[str], max_tokens: int) -> List[str]:
+    """
+    Groups consecutive lines into newline-joined chunks of at most
+    max_tokens. A single line over the budget becomes its own chunk.
+    """
+
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for line in lines:
+        tokens = estimate_tokens(line) + 1
+
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+
+        current.append(line)
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return chunks
@@ -0,0 +1,140 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class StageUsage:
+    """
+    LLM usage of one pipeline stage (semantic_match, classification, ...).
+    estimated_prompt_tokens is counted before each call; prompt_tokens and
+    completion_tokens are what the provider reported back.
+    """
+
+    FIELDS = (
+        "calls",
+        "errors",
+        "trimmed_inputs",
+        "estimated_prompt_tokens",
+        "prompt_tokens",
+        "completion_tokens",
+        "llm_seconds",
+        "wait_seconds",
+    )
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["llm_seconds"] = round(self.llm_seconds, 3)
+        data["wait_seconds"] = round(self.wait_seconds, 3)
+        return data
+
+
+class UsageCounter:
+    """
+    Counts LLM calls made on behalf of one run (a match job, an ingestion).
+    Shared by reference, so threads working for the same run can record into it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.llm_calls = 0
+        self.stages: Dict[str, StageUsage] = {}
+
+    def record_llm_call(self):
+        with self.lock:
+            self.llm_calls += 1
+
+    def _stage(self, stage: str) -> StageUsage:
+        if stage not in self.stages:
+            self.stages[stage] = StageUsage()
+        return self.stages[stage]
+
+    def record_attempt(self, stage: str, estimated_prompt_tokens: int, llm_seconds: float, wait_seconds: float, failed: bool):
+        with self.lock:
+            usage = self._stage(stage)
+            usage.calls += 1
+            usage.errors += int(failed)
+            usage.estimated_prompt_tokens += estimated_prompt_tokens
+            usage.llm_seconds += llm_seconds
+            usage.wait_seconds += wait_seconds
+
+    def record_tokens(self, stage: str, prompt_tokens: int, completion_tokens: int):
+        with self.lock:
+            usage = self._stage(stage)
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+
+    def record_trim(self, stage: str):
+        with self.lock:
+            self._stage(stage).trimmed_inputs += 1
+
+    def report(self) -> Dict:
+        with self.lock:
+            stages = {name: usage.to_dict() for name, usage in sorted(self.stages.items())}
+
+        totals = StageUsage().to_dict()
+        for usage in stages.values():
+            for field, value in usage.items():
+                totals[field] += value
+
+        totals["llm_seconds"] = round(totals["llm_seconds"], 3)
+        totals["wait_seconds"] = round(totals["wait_seconds"], 3)
+
+        return {"stages": stages, "totals": totals}
+
+
+_current_counter: ContextVar[Optional[UsageCounter]] = ContextVar("usage_counter", default=None)
+_current_stage: ContextVar[str] = ContextVar("usage_stage", default="llm")
+
+
+@contextmanager
+def track_usage(counter: UsageCounter):
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+@contextmanager
+def usage_stage(stage: str):
+    """
+    Attributes provider-reported tokens inside the block to stage.
+    """
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def current_usage() -> Optional[UsageCounter]:
+    return _current_counter.get()
+
+
+def record_llm_call():
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record_llm_call()
+
+
+def record_attempt(stage: str, estimated_prompt_tokens: int, llm_seconds: float, wait_seconds: float, failed: bool):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record_attempt(stage, estimated_prompt_tokens, llm_seconds, wait_seconds, failed)
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record_tokens(_current_stage.get(), prompt_tokens, completion_tokens)
+
+
+def record_trim(stage: str):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record_trim(stage)
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Dict
+
+import app.core.embeddings as embeddings
+import app.core.llm as llm
+from app.core.embeddings import get_embedding_model
+from app.core.llm import get_llm
+from app.core.config import WARMUP_ON_STARTUP
+
+# Components that must be loaded before the pod takes traffic
+REQUIRED_COMPONENTS = ("embedding_model", "llm_clients")
+
+_state: Dict = {
+    "started_at": None,
+    "finished_at": None,
+    "components": {
+        "embedding_model": False,
+        "llm_clients": False,
+        "domain_embeddings": False,
+    },
+    "errors": {},
+}
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def _load(component: str, loader):
+    try:
+        loader()
+        _state["components"][component] = True
+    except Exception as e:
+        print(f"Warmup of {component} failed:", e)
+        _state["errors"][component] = str(e)
+
+
+def _load_embedding_model():
+    # One forward pass so the first request does not pay for lazy allocation
+    get_embedding_model().encode(["warmup"], use_cache=False)
+
+
+def _load_llm_clients():
+    get_llm()
+    get_llm(json_mode=True)
+    get_llm(timeout=180)
+
+
+def _load_domain_embeddings():
+    from app.db.database import SessionLocal
+    from app.classification.domain_classifier import load_domains_from_db
+
+    db = SessionLocal()
+    try:
+        load_domains_from_db(db)
+    finally:
+        db.close()
+
+
+def warmup():
+    _state["started_at"] = time.time()
+
+    _load("embedding_model", _load_embedding_model)
+    _load("llm_clients", _load_llm_clients)
+    _load("domain_embeddings", _load_domain_embeddings)
+
+    _state["finished_at"] = time.time()
+
+
+def start_warmup():
+    """
+    Loads heavy resources on a background thread so the server can start
+    accepting connections (and answer /ready) immediately.
+    """
+    global _warmup_thread
+
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warmup, name="warmup", daemon=True)
+            _warmup_thread.start()
+
+
+def _loaded_on_demand() -> Dict[str, bool]:
+    #The shared singletons, however they got loaded (warmup or first use)
+    return {
+        "embedding_model": embeddings._encoder is not None,
+        "llm_clients": bool(llm._llms),
+    }
+
+
+def readiness() -> Dict:
+    """
+    With warmup, ready once it has loaded every required component.
+    Without it, components load on first use, so the pod is always ready;
+    the flags still show what has been loaded so far.
+    """
+
+    components = dict(_state["components"])
+
+    for component, loaded in _loaded_on_demand().items():
+        components[component] = components[component] or loaded
+
+    if WARMUP_ON_STARTUP:
+        ready = all(_state["components"][c] for c in REQUIRED_COMPONENTS)
+    else:
+        ready = True
+
+    return {
+        "ready": ready,
+        "warmup": WARMUP_ON_STARTUP,
+        "components": components,
+        "errors": dict(_state["errors"]),
+        "warmup_seconds": (
+            round(_state["finished_at"] - _state["started_at"], 2)
+            if _state["finished_at"] else None
+        ),
+    }
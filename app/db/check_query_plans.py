@@ -0,0 +1,151 @@
+"""
+Query-plan regression check for the main access paths.
+
+    python -m app.db.check_query_plans
+    python -m app.db.check_query_plans --document-id 42 --verbose
+
+Runs EXPLAIN on the lookups that ingestion, matching and the corpus index
+issue per document and per paragraph. Sequential scans are disabled for
+the check, so the planner still picks one only when no index can serve
+the query; any Seq Scan on a large table fails the check (exit code 1),
+whatever the current table sizes are.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+
+import app.models.documents
+import app.models.domains
+from app.db.database import SessionLocal
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+from app.models.paragraph_classification import ParagraphClassification
+
+#Tables that grow with the corpus; the others hold a few hundred rows at most
+LARGE_TABLES = {"paragraphs", "paragraph_classifications"}
+
+#Paragraph ids per IN (...) lookup, as in a typical match run
+SAMPLE_PARAGRAPHS = 200
+
+
+def access_paths(document_id: int, paragraph_ids: List[int]) -> Dict:
+    """
+    The statements behind the hot queries, keyed by where they are issued.
+    """
+
+    return {
+        "paragraphs of a document (document_matcher, corpus_index, revision)": (
+            select(Paragraph.id, Paragraph.text)
+            .where(Paragraph.document_id == document_id)
+            .order_by(Paragraph.id)
+        ),
+        "carried paragraphs of a revision (semantic_matcher.carried_vectors)": (
+            select(Paragraph.id, Paragraph.source_paragraph_id)
+            .where(Paragraph.document_id == document_id, Paragraph.source_paragraph_id.isnot(None))
+        ),
+        "paragraphs carried from a paragraph (FK on delete)": (
+            select(Paragraph.id)
+            .where(Paragraph.source_paragraph_id.in_(paragraph_ids))
+        ),
+        "labels of paragraphs (semantic_matcher.get_domain_labels_bulk)": (
+            select(ParagraphClassification)
+            .where(
+                ParagraphClassification.paragraph_id.in_(paragraph_ids),
+                ParagraphClassification.domain_id.isnot(None)
+            )
+            .order_by(ParagraphClassification.paragraph_id, ParagraphClassification.rank)
+        ),
+        "label ids of paragraphs (corpus_index)": (
+            select(ParagraphClassification.paragraph_id, ParagraphClassification.domain_id)
+            .where(
+                ParagraphClassification.paragraph_id.in_(paragraph_ids),
+                ParagraphClassification.domain_id.isnot(None)
+            )
+        ),
+        "paragraphs by id with their document (corpus search)": (
+            select(Paragraph.id, Paragraph.text, Paragraph.document_id, Document.filename)
+            .join(Document, Document.id == Paragraph.document_id)
+            .where(Paragraph.id.in_(paragraph_ids))
+        ),
+    }
+
+
+def plan_nodes(node: Dict) -> List[Dict]:
+
+    nodes = [node]
+    for child in node.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def describe(node: Dict) -> str:
+
+    parts = [node["Node Type"]]
+    if "Relation Name" in node:
+        parts.append(f"on {node['Relation Name']}")
+    if "Index Name" in node:
+        parts.append(f"using {node['Index Name']}")
+    return " ".join(parts)
+
+
+def check(document_id: int = None, verbose: bool = False) -> bool:
+
+    db = SessionLocal()
+
+    try:
+        if document_id is None:
+            document_id = db.scalar(select(func.max(Paragraph.document_id)))
+
+        if document_id is None:
+            print("No paragraphs in the database; checking plans with placeholder ids.")
+            document_id = 0
+
+        paragraph_ids = db.scalars(
+            select(Paragraph.id).where(Paragraph.document_id == document_id).limit(SAMPLE_PARAGRAPHS)
+        ).all() or [0]
+
+        #Local to this transaction, rolled back below
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+
+        passed = True
+
+        for name, statement in access_paths(document_id, paragraph_ids).items():
+            sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            nodes = plan_nodes(plan[0]["Plan"])
+            scans = [n for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in LARGE_TABLES]
+
+            status = "FAIL" if scans else "ok"
+            passed = passed and not scans
+
+            print(f"[{status}] {name}")
+            for node in nodes:
+                if verbose or node in scans or "Scan" in node["Node Type"]:
+                    print("       ", describe(node))
+
+        return passed
+
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document-id", type=int, help="Document to plan for; defaults to the newest one")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan node")
+    args = parser.parse_args()
+
+    if not check(args.document_id, args.verbose):
+        print("Query-plan regression: a hot query has no usable index.")
+        sys.exit(1)
+
+    print("All access paths use an index.")
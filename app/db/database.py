@@ -13,15 +13,114 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-if not DB_PASSWORD:
-    raise ValueError("DB_PASSWORD not loaded. Check .env path and contents.")
+#Pool sizing for API request handlers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-password = quote_plus(DB_PASSWORD)
+#Separate pool for ingestion tasks and match jobs, which hold sessions for minutes
+WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", "5"))
+WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "5"))
+WORKER_DB_POOL_TIMEOUT = int(os.getenv("WORKER_DB_POOL_TIMEOUT", "60"))
 
-DATABASE_URL = (
-    f"postgresql://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+#Full URL override, e.g. sqlite:///loadtest.db for a local stand-in (load tests, CI)
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if DATABASE_URL:
+    ASYNC_DATABASE_URL = (
+        DATABASE_URL
+        .replace("postgresql://", "postgresql+asyncpg://", 1)
+        .replace("sqlite://", "sqlite+aiosqlite://", 1)
+    )
+
+else:
+    if not DB_PASSWORD:
+        raise ValueError("DB_PASSWORD not loaded. Check .env path and contents.")
+
+    password = quote_plus(DB_PASSWORD)
+
+    DATABASE_URL = (
+        f"postgresql://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    ASYNC_DATABASE_URL = (
+        f"postgresql+asyncpg://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+#SQLite connections are shared across the request and worker threads, and writers wait for the file lock
+CONNECT_ARGS = {"check_same_thread": False, "timeout": 30} if DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args=CONNECT_ARGS
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+worker_engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=WORKER_DB_POOL_SIZE,
+    max_overflow=WORKER_DB_MAX_OVERFLOW,
+    pool_timeout=WORKER_DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args=CONNECT_ARGS
+)
+WorkerSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=worker_engine)
+
 Base = declarative_base()
+
+
+#Async engine for FastAPI routes, created on first use so scripts
+#and workers never need the asyncpg driver
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_sessionmaker():
+    global _async_engine, _async_sessionmaker
+
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_pre_ping=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args=CONNECT_ARGS
+        )
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return _async_sessionmaker
+
+
+#DB Dependencies
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+def get_worker_db():
+    db = WorkerSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
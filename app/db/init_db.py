@@ -1,12 +1,37 @@
-from app.db.database import engine, Base
-from app.models.domains import ComplianceDomain  # IMPORTANT
-from app.models.paragraph import Paragraph
-from app.models.documents import Document
-from app.models.paragraph_classification import ParagraphClassification
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from app.db.database import engine
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+#Schema that the old create_all-based init_db produced
+BASELINE_REVISION = "0001_baseline"
+
+
+def alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """
+    Brings the database to the latest migration. Databases created before
+    migrations existed are stamped at the baseline first.
+    """
+
+    tables = inspect(engine).get_table_names()
+    config = alembic_config()
+
+    if "documents" in tables and "alembic_version" not in tables:
+        print("Existing schema without migration history, stamping", BASELINE_REVISION)
+        command.stamp(config, BASELINE_REVISION)
+
+    command.upgrade(config, "head")
+
 
 if __name__ == "__main__":
     init_db()
-    print("Database tables created successfully.")
+    print("Database schema is up to date.")
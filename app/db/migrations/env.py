@@ -0,0 +1,54 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.db.database import Base, engine
+
+#Register all models so autogenerate sees the full schema
+import app.models.documents
+import app.models.paragraph
+import app.models.paragraph_classification
+import app.models.domains
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """
+    Emits the SQL instead of running it: alembic upgrade head --sql
+    """
+
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            #One transaction per migration, so a CONCURRENTLY step can leave it
+            transaction_per_migration=True,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
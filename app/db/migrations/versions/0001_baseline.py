@@ -0,0 +1,70 @@
+"""Baseline: schema as created by create_all before migrations
+
+Databases created by the old init_db are stamped at this revision
+(see app.db.init_db) instead of running it.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "documents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("document_id", sa.String(length=50), nullable=True),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("file_path", sa.String(length=255), nullable=False),
+        sa.Column("document_type", sa.String(length=50), nullable=False),
+        sa.Column("status", sa.String(length=50), nullable=True),
+    )
+    op.create_index("ix_documents_id", "documents", ["id"])
+    op.create_index("ix_documents_document_id", "documents", ["document_id"], unique=True)
+
+    op.create_table(
+        "compliance_domains",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("description", sa.String(length=255), nullable=True),
+        sa.Column("weight", sa.Float(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+    )
+    op.create_index("ix_compliance_domains_id", "compliance_domains", ["id"])
+
+    op.create_table(
+        "paragraphs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("paragraph_id", sa.String(length=50), nullable=True),
+        sa.Column("text", sa.Text(), nullable=False),
+    )
+    op.create_index("ix_paragraphs_id", "paragraphs", ["id"])
+    op.create_index("ix_paragraphs_paragraph_id", "paragraphs", ["paragraph_id"], unique=True)
+
+    op.create_table(
+        "paragraph_classifications",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("paragraph_id", sa.Integer(), sa.ForeignKey("paragraphs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("domain_id", sa.Integer(), sa.ForeignKey("compliance_domains.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("confidence", sa.Float(), nullable=False),
+        sa.Column("method", sa.String(length=50), nullable=False),
+    )
+    op.create_index("ix_paragraph_classifications_id", "paragraph_classifications", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("paragraph_classifications")
+    op.drop_table("paragraphs")
+    op.drop_table("compliance_domains")
+    op.drop_table("documents")
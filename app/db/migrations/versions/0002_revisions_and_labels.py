@@ -0,0 +1,97 @@
+"""Columns added since the baseline: domain embeddings and taxonomy
+version, ranked classifications, document revisions and extracted text
+
+Databases built by create_all part-way through may already have some of
+these, so each step checks first. Every column is nullable or has a
+constant default, which Postgres adds without rewriting the table.
+
+Revision ID: 0002_revisions_and_labels
+Revises: 0001_baseline
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002_revisions_and_labels"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _offline() -> bool:
+    #alembic upgrade --sql: nothing to inspect, assume the baseline schema
+    return op.get_context().as_sql
+
+
+def _columns(table: str):
+    if _offline():
+        return set()
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _add_column(table: str, column: sa.Column):
+    if column.name not in _columns(table):
+        op.add_column(table, column)
+
+
+def _add_self_reference(table: str, column: str, referent: str, name: str):
+
+    existing = [] if _offline() else sa.inspect(op.get_bind()).get_foreign_keys(table)
+
+    if any(fk["constrained_columns"] == [column] for fk in existing):
+        return
+
+    if op.get_bind().dialect.name == "postgresql":
+        #NOT VALID skips the scan under the write-blocking lock; VALIDATE scans without blocking writes
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+            f"REFERENCES {referent} (id) ON DELETE SET NULL NOT VALID"
+        )
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+        return
+
+    #SQLite cannot alter constraints in place; batch mode copies the table
+    with op.batch_alter_table(table) as batch:
+        batch.create_foreign_key(name, referent, [column], ["id"], ondelete="SET NULL")
+
+
+def upgrade() -> None:
+    _add_column("compliance_domains", sa.Column("embedding", sa.LargeBinary(), nullable=True))
+    _add_column("compliance_domains", sa.Column("embedding_model", sa.String(length=255), nullable=True))
+
+    if _offline() or "domain_taxonomy_version" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "domain_taxonomy_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        )
+
+    _add_column("paragraph_classifications", sa.Column("rank", sa.Integer(), nullable=False, server_default="0"))
+
+    _add_column("documents", sa.Column("previous_document_id", sa.Integer(), nullable=True))
+    _add_column("documents", sa.Column("extracted_text", sa.Text(), nullable=True))
+    _add_column("documents", sa.Column("extraction_info", sa.JSON(), nullable=True))
+    _add_self_reference("documents", "previous_document_id", "documents", "documents_previous_document_id_fkey")
+
+    _add_column("paragraphs", sa.Column("source_paragraph_id", sa.Integer(), nullable=True))
+    _add_self_reference("paragraphs", "source_paragraph_id", "paragraphs", "paragraphs_source_paragraph_id_fkey")
+
+
+def _drop_columns(table: str, *columns: str):
+    #Batch mode: SQLite cannot drop a column named in a foreign key, so the table is copied without it.
+    #Postgres drops them in place, along with their constraints
+    with op.batch_alter_table(table) as batch:
+        for column in columns:
+            batch.drop_column(column)
+
+
+def downgrade() -> None:
+    _drop_columns("paragraphs", "source_paragraph_id")
+    _drop_columns("documents", "extraction_info", "extracted_text", "previous_document_id")
+    _drop_columns("paragraph_classifications", "rank")
+    op.drop_table("domain_taxonomy_version")
+    _drop_columns("compliance_domains", "embedding_model", "embedding")
@@ -0,0 +1,100 @@
+"""Indexes for the per-document and per-paragraph lookups
+
+- paragraphs (document_id, id): every document's paragraphs, in order
+- paragraphs (source_paragraph_id): revision lookups, and the SET NULL
+  foreign key when a previous revision is deleted
+- paragraph_classifications unique (paragraph_id, rank) including
+  domain_id: label lookups read the index only, and a paragraph cannot
+  get two labels of the same rank
+
+On Postgres the indexes are built CONCURRENTLY, so ingestion and
+matching keep writing while they build.
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_revisions_and_labels
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0003_hot_path_indexes"
+down_revision: Union[str, None] = "0002_revisions_and_labels"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+#name, table, columns, unique, included columns
+INDEXES = [
+    ("ix_paragraphs_document_id_id", "paragraphs", ["document_id", "id"], False, []),
+    ("ix_paragraphs_source_paragraph_id", "paragraphs", ["source_paragraph_id"], False, []),
+    ("uq_paragraph_classifications_paragraph_rank", "paragraph_classifications", ["paragraph_id", "rank"], True, ["domain_id"]),
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _drop_duplicate_labels():
+    #Re-runs of the old ingestion could store a label twice; keep the first row
+    op.execute(
+        """
+        DELETE FROM paragraph_classifications
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY paragraph_id, rank ORDER BY id) AS n
+                FROM paragraph_classifications
+            ) ranked
+            WHERE n > 1
+        )
+        """
+    )
+
+
+def _create_index(name: str, table: str, columns, unique: bool, include):
+
+    if not _is_postgres():
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+        return
+
+    #A failed CONCURRENTLY build leaves an invalid index behind; drop it and build again
+    invalid = not op.get_context().as_sql and op.get_bind().execute(
+        sa.text(
+            "SELECT NOT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name}
+    ).scalar()
+
+    with op.get_context().autocommit_block():
+        if invalid:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+        op.create_index(
+            name,
+            table,
+            columns,
+            unique=unique,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            postgresql_include=include,
+        )
+
+
+def upgrade() -> None:
+    _drop_duplicate_labels()
+
+    for name, table, columns, unique, include in INDEXES:
+        _create_index(name, table, columns, unique, include)
+
+
+def downgrade() -> None:
+    for name, table, *_ in reversed(INDEXES):
+        if _is_postgres():
+            with op.get_context().autocommit_block():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        else:
+            op.drop_index(name, table_name=table, if_exists=True)
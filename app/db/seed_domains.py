@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.db.database import SessionLocal
 from app.models.domains import ComplianceDomain
+from app.classification.domain_classifier import encode_domain_embeddings, bump_taxonomy_version
 
 MIN_WEIGHT = 1.0
 MAX_WEIGHT = 2.5
@@ -105,11 +106,13 @@ def seed_domains():
                 
             existing = (
                 db.query(ComplianceDomain)
-                .filter(ComplianceDomain.name == name.lower())
+                .filter(func.lower(ComplianceDomain.name) == name.lower())
                 .first()
             )
             
             if existing:
+                if existing.description != domain_data["description"]:
+                    existing.embedding = None
                 existing.description = domain_data["description"]
                 existing.weight = weight
                 updated += 1
@@ -122,6 +125,12 @@ def seed_domains():
                 )
                 db.add(new_domain)
                 created += 1
+        
+        db.flush()
+        
+        #Store description embeddings and publish the new taxonomy version
+        encode_domain_embeddings(db.query(ComplianceDomain).all())
+        version = bump_taxonomy_version(db)
             
         db.commit()
         
@@ -129,6 +138,7 @@ def seed_domains():
         print("Domain Seeding Completed Successfully")
         print("Created:", created)
         print("Updated:", updated)
+        print("Taxonomy version:", version)
         print("=====================================")
         
     except Exception as e:
@@ -0,0 +1,667 @@
+import io
+import os
+import queue
+import threading
+import time
+import uuid
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ingestion.extractor import extract_text_with_info
+from app.ingestion.paragraph_splitter import split_into_paragraphs
+from app.ingestion.paragraph_service import sav_paragraphs
+from app.ingestion.upload import UPLOAD_DIR, MAX_FILE_SIZE_MB, mark_document_failed
+from app.classification.domain_classifier import classify_texts
+from app.comparison.corpus_index import add_document_to_corpus
+from app.comparison.semantic_matcher import persist_vendor_vector_store
+from app.db.database import WorkerSessionLocal, get_async_db
+from app.models.documents import Document
+from app.core.usage import UsageCounter, track_usage
+from app.core.profiler import Profile, new_profile, profile_requested, profile_run, profiling
+from app.core.config import (
+    BULK_MAX_FILES,
+    BULK_MAX_TOTAL_MB,
+    BULK_EXTRACT_PROCESSES,
+    BULK_SPLIT_WORKERS,
+    BULK_CLASSIFY_WORKERS,
+    BULK_QUEUE_SIZE,
+    BULK_EMBED_BATCH,
+    BULK_WRITE_BATCH,
+    BULK_RETENTION_SECONDS,
+)
+
+router = APIRouter(
+    prefix="/upload/bulk",
+    tags=["Document Upload"]
+)
+
+# One batch at a time: a batch already keeps every stage busy, and its
+# stages run on their own threads and processes, not the request threadpool.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-ingest")
+
+ALLOWED_EXTENSIONS = (".pdf", ".docx")
+STAGES = ("extract", "split", "classify", "write")
+
+#End-of-stream marker passed down the queues
+_DONE = object()
+
+#How often a stage blocked on a queue checks whether the batch was aborted
+QUEUE_POLL_SECONDS = 0.5
+
+
+class BulkItem:
+
+    def __init__(self, document_id: int, filename: str, file_path: str):
+        self.document_id = document_id
+        self.filename = filename
+        self.file_path = file_path
+
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.paragraphs = 0
+
+        self.extracted_text: Optional[str] = None
+        self.extraction_info: Optional[Dict] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "status": self.status,
+            "paragraphs": self.paragraphs,
+            "error": self.error,
+        }
+
+
+class BulkBatch:
+
+    def __init__(self, document_type: str, items: List[BulkItem], profile: Optional[Profile] = None):
+        self.batch_id = str(uuid.uuid4())
+        self.document_type = document_type
+        self.items = items
+
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.usage = UsageCounter()
+        self.profile = profile
+
+        #Set when a stage dies, so the others stop instead of blocking on its queue
+        self.aborted = threading.Event()
+        self.abort_reason: Optional[str] = None
+
+        #Busy time per stage, summed over its workers
+        self.lock = threading.Lock()
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+
+    def add_stage_time(self, stage: str, seconds: float):
+        with self.lock:
+            self.stage_seconds[stage] += seconds
+
+    def abort(self, reason: str):
+        with self.lock:
+            if self.abort_reason is None:
+                self.abort_reason = reason
+        self.aborted.set()
+
+    def outcome(self) -> str:
+        """
+        Final status: completed, completed_with_errors or failed.
+        """
+
+        completed = sum(1 for item in self.items if item.status == "completed")
+
+        if completed == len(self.items):
+            return "completed"
+
+        return "completed_with_errors" if completed else "failed"
+
+    def to_dict(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+
+        return {
+            "batch_id": self.batch_id,
+            "document_type": self.document_type,
+            "status": self.status,
+            "error": self.abort_reason,
+            "counts": counts,
+            "documents": [item.to_dict() for item in self.items],
+            "elapsed_seconds": elapsed,
+            "stage_seconds": {stage: round(s, 3) for stage, s in self.stage_seconds.items()},
+            "usage": self.usage.report(),
+            "profile_url": self.profile.url if self.profile else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_batches: Dict[str, BulkBatch] = {}
+_batches_lock = threading.Lock()
+
+
+def _prune_finished_batches():
+
+    cutoff = time.time() - BULK_RETENTION_SECONDS
+
+    for batch_id, batch in list(_batches.items()):
+        if batch.finished_at and batch.finished_at < cutoff:
+            del _batches[batch_id]
+
+
+def _fail(batch: BulkBatch, item: BulkItem, stage: str, error: Exception):
+
+    print(f"Bulk {stage} failed:", item.filename, error)
+    item.status = "failed"
+    item.error = f"{stage}: {error}"
+
+
+def _put(batch: BulkBatch, target: queue.Queue, entry) -> bool:
+    """
+    Blocks until the entry is queued, or returns False once the batch is
+    aborted (the consumer may be gone).
+    """
+
+    while not batch.aborted.is_set():
+        try:
+            target.put(entry, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _get(batch: BulkBatch, source: queue.Queue):
+    """
+    Next entry, or the end marker once the batch is aborted.
+    """
+
+    while not batch.aborted.is_set():
+        try:
+            return source.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+
+    return _DONE
+
+
+def _take_batch(batch: BulkBatch, source: queue.Queue, size, limit: int) -> Tuple[List, bool]:
+    """
+    Blocks for one entry, then drains whatever is already queued until
+    size(entries) reaches limit. Returns the entries and whether the end
+    marker was seen (or the batch was aborted).
+    """
+
+    first = _get(batch, source)
+    if first is _DONE:
+        return [], True
+
+    entries = [first]
+
+    while size(entries) < limit:
+        try:
+            entry = source.get_nowait()
+        except queue.Empty:
+            break
+
+        if entry is _DONE:
+            return entries, True
+
+        entries.append(entry)
+
+    return entries, False
+
+
+def _extract_stage(batch: BulkBatch, split_queue: queue.Queue, extract_processes: int = BULK_EXTRACT_PROCESSES):
+    """
+    Extraction is CPU-bound (PDF and DOCX parsing), so it runs in worker
+    processes. At most BULK_QUEUE_SIZE files are in flight, and a full
+    split queue stops new submissions.
+    """
+
+    processes = max(1, min(extract_processes, len(batch.items)))
+    pending = {}
+    items = iter(batch.items)
+
+    #spawn: forking a process that already runs threads and DB pools is unsafe
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        def submit_next() -> bool:
+            item = next(items, None)
+            if item is None:
+                return False
+
+            item.status = "extracting"
+            pending[pool.submit(extract_text_with_info, item.file_path, item.filename)] = (item, time.perf_counter())
+            return True
+
+        while len(pending) < BULK_QUEUE_SIZE and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                item, submitted_at = pending.pop(future)
+
+                try:
+                    item.extracted_text, item.extraction_info = future.result()
+                    batch.add_stage_time("extract", time.perf_counter() - submitted_at)
+                except Exception as e:
+                    _fail(batch, item, "extract", e)
+                    continue
+
+                finally:
+                    if not batch.aborted.is_set():
+                        submit_next()
+
+                _put(batch, split_queue, item)
+
+    for _ in range(BULK_SPLIT_WORKERS):
+        _put(batch, split_queue, _DONE)
+
+
+def _split_stage(batch: BulkBatch, split_queue: queue.Queue, classify_queue: queue.Queue):
+
+    while True:
+        item = _get(batch, split_queue)
+        if item is _DONE:
+            return
+
+        item.status = "splitting"
+        started = time.perf_counter()
+
+        try:
+            paragraphs = split_into_paragraphs(item.extracted_text)
+        except Exception as e:
+            _fail(batch, item, "split", e)
+            continue
+
+        finally:
+            batch.add_stage_time("split", time.perf_counter() - started)
+
+        _put(batch, classify_queue, (item, paragraphs))
+
+
+def _classify_stage(batch: BulkBatch, classify_queue: queue.Queue, write_queue: queue.Queue):
+    """
+    Paragraphs of several documents share one embedding batch of up to
+    BULK_EMBED_BATCH texts; AI fallbacks run on BULK_CLASSIFY_WORKERS threads.
+    """
+
+    db = WorkerSessionLocal()
+
+    try:
+        finished = False
+
+        while not finished:
+            entries, finished = _take_batch(
+                batch,
+                classify_queue,
+                lambda entries: sum(len(paragraphs) for _, paragraphs in entries),
+                BULK_EMBED_BATCH
+            )
+
+            if not entries:
+                continue
+
+            started = time.perf_counter()
+
+            for item, _ in entries:
+                item.status = "classifying"
+
+            texts = [para["text"] for _, paragraphs in entries for para in paragraphs]
+
+            try:
+                results, embeddings = classify_texts(texts, db, max_workers=BULK_CLASSIFY_WORKERS)
+            except Exception as e:
+                db.rollback()
+                for item, _ in entries:
+                    _fail(batch, item, "classify", e)
+                batch.add_stage_time("classify", time.perf_counter() - started)
+                continue
+
+            offset = 0
+            for item, paragraphs in entries:
+                end = offset + len(paragraphs)
+                _put(batch, write_queue, (item, paragraphs, results[offset:end], embeddings[offset:end]))
+                offset = end
+
+            batch.add_stage_time("classify", time.perf_counter() - started)
+
+    finally:
+        db.close()
+        _put(batch, write_queue, _DONE)
+
+
+def _write_documents(db, entries: List) -> Dict[int, Dict]:
+    """
+    Saves the entries in the session without committing. Returns the
+    embedding of every saved paragraph, by paragraph id, per document.
+    """
+
+    vectors = {}
+
+    for item, paragraphs, results, embeddings in entries:
+        db.query(Document).filter(Document.id == item.document_id).update({
+            "extracted_text": item.extracted_text,
+            "extraction_info": item.extraction_info,
+            "status": "completed"
+        })
+
+        saved = sav_paragraphs(db, item.document_id, paragraphs, results=results, commit=False)
+        vectors[item.document_id] = {p.id: embeddings[i] for i, p in enumerate(saved)}
+
+    return vectors
+
+
+def _write_stage(batch: BulkBatch, write_queue: queue.Queue):
+    """
+    Commits up to BULK_WRITE_BATCH documents per transaction. A failed
+    transaction is retried one document at a time, so one bad document
+    does not fail its neighbours.
+    """
+
+    db = WorkerSessionLocal()
+
+    try:
+        finished = False
+
+        while not finished:
+            entries, finished = _take_batch(batch, write_queue, len, BULK_WRITE_BATCH)
+
+            if not entries:
+                continue
+
+            started = time.perf_counter()
+
+            for item, *_ in entries:
+                item.status = "writing"
+
+            try:
+                vectors = _write_documents(db, entries)
+                db.commit()
+                written = entries
+
+            except Exception as e:
+                db.rollback()
+                print("Bulk write batch failed, retrying per document:", e)
+
+                vectors, written = {}, []
+                for entry in entries:
+                    try:
+                        vectors.update(_write_documents(db, [entry]))
+                        db.commit()
+                        written.append(entry)
+                    except Exception as e:
+                        db.rollback()
+                        _fail(batch, entry[0], "write", e)
+
+            for item, paragraphs, *_ in written:
+                item.status = "completed"
+                item.paragraphs = len(paragraphs)
+                item.extracted_text = None
+
+            #Search indexes reuse the classification embeddings instead of encoding again
+            for item, *_ in written:
+                try:
+                    persist_vendor_vector_store(db, item.document_id, known_vectors=vectors[item.document_id])
+                    add_document_to_corpus(db, item.document_id)
+                except Exception as e:
+                    db.rollback()
+                    print("Index build failed:", item.document_id, e)
+
+            batch.add_stage_time("write", time.perf_counter() - started)
+
+    finally:
+        db.close()
+
+
+def _run_stage(batch: BulkBatch, target, *args) -> threading.Thread:
+    """
+    Runs a stage on its own thread. A stage that dies aborts the batch, so
+    the stages feeding or draining its queues stop instead of blocking.
+    """
+
+    def run():
+        #LLM usage (and profile samples) of every stage are attributed to the batch
+        with track_usage(batch.usage), profiling(batch.profile):
+            try:
+                target(batch, *args)
+            except Exception as e:
+                print(f"Bulk stage {target.__name__.strip('_')} failed, aborting batch:", e)
+                batch.abort(f"{target.__name__.strip('_')}: {e}")
+
+    thread = threading.Thread(target=run, name=f"bulk-{target.__name__.strip('_')}", daemon=True)
+    thread.start()
+    return thread
+
+
+def run_bulk_ingestion(batch: BulkBatch, extract_processes: int = BULK_EXTRACT_PROCESSES):
+
+    with profile_run(batch.profile):
+        _run_bulk_ingestion(batch, extract_processes)
+
+
+def _run_bulk_ingestion(batch: BulkBatch, extract_processes: int):
+    """
+    extract (processes) -> split (threads) -> classify (one embedding
+    batch across documents) -> write (batched commits), connected by
+    bounded queues so every stage works on a different document at once
+    and a slow stage holds back the ones before it. If a stage dies, the
+    batch is aborted and the documents not written yet are marked failed.
+    """
+
+    batch.status = "running"
+    batch.started_at = time.time()
+
+    split_queue: queue.Queue = queue.Queue(maxsize=BULK_QUEUE_SIZE)
+    classify_queue: queue.Queue = queue.Queue(maxsize=BULK_QUEUE_SIZE)
+    write_queue: queue.Queue = queue.Queue(maxsize=BULK_QUEUE_SIZE)
+
+    try:
+        writer = _run_stage(batch, _write_stage, write_queue)
+        classifier = _run_stage(batch, _classify_stage, classify_queue, write_queue)
+        splitters = [
+            _run_stage(batch, _split_stage, split_queue, classify_queue)
+            for _ in range(BULK_SPLIT_WORKERS)
+        ]
+
+        try:
+            with track_usage(batch.usage):
+                _extract_stage(batch, split_queue, extract_processes)
+
+        except Exception as e:
+            print("Bulk extraction failed:", e)
+            for item in batch.items:
+                if item.status in ("queued", "extracting"):
+                    _fail(batch, item, "extract", e)
+            for _ in splitters:
+                _put(batch, split_queue, _DONE)
+
+        for splitter in splitters:
+            splitter.join()
+
+        _put(batch, classify_queue, _DONE)
+        classifier.join()
+        writer.join()
+
+    finally:
+        failed = [item.document_id for item in batch.items if item.status != "completed"]
+
+        if failed:
+            db = WorkerSessionLocal()
+            try:
+                for document_id in failed:
+                    mark_document_failed(db, document_id)
+            finally:
+                db.close()
+
+        for item in batch.items:
+            if item.status != "completed":
+                item.status = "failed"
+                item.error = item.error or (f"aborted: {batch.abort_reason}" if batch.abort_reason else "not processed")
+
+        batch.status = batch.outcome()
+        batch.finished_at = time.time()
+
+        print("Bulk ingestion:", batch.batch_id, batch.stage_seconds, batch.usage.report()["totals"])
+
+
+def _check_batch_limits(file_count: int, total_bytes: int):
+
+    if file_count > BULK_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Max {BULK_MAX_FILES} per batch."
+        )
+
+    if total_bytes > BULK_MAX_TOTAL_MB*1024*1024:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large. Max {BULK_MAX_TOTAL_MB} MB of files (uncompressed) per batch."
+        )
+
+
+def _read_upload(filename: str, contents: bytes, file_count: int = 0, total_bytes: int = 0) -> List[Tuple[str, bytes]]:
+    """
+    (filename, bytes) of the policy files in one upload: the file itself,
+    or the PDF and DOCX entries of a zip archive. file_count and
+    total_bytes are what the batch already holds; the batch limits are
+    checked against the sizes a zip declares, before anything is decompressed.
+    """
+
+    max_bytes = MAX_FILE_SIZE_MB*1024*1024
+
+    if filename.lower().endswith(".zip"):
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(contents))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"{filename} is not a valid zip archive.")
+
+        with archive:
+            entries = [
+                info for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(ALLOWED_EXTENSIONS)
+            ]
+
+            for info in entries:
+                if info.file_size > max_bytes:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"{os.path.basename(info.filename)} in {filename} is too large. Max {MAX_FILE_SIZE_MB} MB allowed."
+                    )
+
+            _check_batch_limits(file_count + len(entries), total_bytes + sum(info.file_size for info in entries))
+
+            #zipfile stops at the declared size, so a lying header fails the CRC check instead
+            return [(os.path.basename(info.filename), archive.read(info)) for info in entries]
+
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"{filename}: only PDF, DOCX or ZIP allowed.")
+
+    if len(contents) > max_bytes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{filename} is too large. Max {MAX_FILE_SIZE_MB} MB allowed."
+        )
+
+    _check_batch_limits(file_count + 1, total_bytes + len(contents))
+
+    return [(filename, contents)]
+
+
+def get_batch(batch_id: str) -> BulkBatch:
+
+    batch = _batches.get(batch_id)
+
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+
+    return batch
+
+
+@router.post("/", status_code=202)
+async def upload_policies(
+    document_type: str,
+    files: List[UploadFile] = File(...),
+    profile: bool = Depends(profile_requested),
+    db: AsyncSession = Depends(get_async_db)
+):
+
+    policy_files = []
+    total_bytes = 0
+
+    for upload in files:
+        read = _read_upload(upload.filename, await upload.read(), len(policy_files), total_bytes)
+        policy_files.extend(read)
+        total_bytes += sum(len(contents) for _, contents in read)
+
+    if not policy_files:
+        raise HTTPException(status_code=400, detail="No PDF or DOCX files found.")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    documents = []
+
+    try:
+        for filename, contents in policy_files:
+            file_id = str(uuid.uuid4())
+            file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{filename}")
+
+            with open(file_path, "wb") as f:
+                f.write(contents)
+
+            documents.append(Document(
+                filename=filename,
+                file_path=file_path,
+                document_id=file_id,
+                document_type=document_type,
+                status="processing"
+            ))
+
+        db.add_all(documents)
+        await db.commit()
+
+        for document in documents:
+            await db.refresh(document)
+
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Document creation failed: {str(e)}"
+        )
+
+    batch = BulkBatch(
+        document_type,
+        [BulkItem(d.id, d.filename, d.file_path) for d in documents],
+        new_profile(profile, f"bulk ingestion of {len(documents)} files")
+    )
+
+    with _batches_lock:
+        _prune_finished_batches()
+        _batches[batch.batch_id] = batch
+
+    executor.submit(run_bulk_ingestion, batch)
+
+    return batch.to_dict()
+
+
+@router.get("/{batch_id}")
+def get_bulk_batch(batch_id: str):
+    return get_batch(batch_id).to_dict()
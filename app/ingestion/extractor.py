@@ -1,8 +1,11 @@
 import pdfplumber
 import fitz # PyMuPDF
-from docx import Document
+from lxml import etree
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
 import re
 import os
+import zipfile
 
 
 def clean_text(text: str) -> str:
@@ -16,44 +19,262 @@ def clean_text(text: str) -> str:
     return text
     
 
-def extract_text_from_pdf(file_path: str) -> str:
-    text = ""
-    
+#Per-page PDF engine choice: PyMuPDF unless its text for the page looks unreliable
+PDF_MIN_PAGE_CHARS = 40
+PDF_BROKEN_WORD_RATIO = 0.30
+PDF_TABLE_MIN_ROWS = 3
+PDF_TABLE_MIN_COLUMNS = 3
+
+#Legitimate one/two-letter words, not counted as broken-word fragments
+SHORT_WORDS = {
+    "a", "i", "an", "as", "at", "be", "by", "do", "he", "if", "in", "is", "it",
+    "me", "my", "no", "of", "on", "or", "so", "to", "up", "us", "we",
+}
+
+
+def pymupdf_page_issue(page, text: str) -> Optional[str]:
+    """
+    Cheap checks on PyMuPDF's output for one page. Returns why pdfplumber
+    should be tried on the page, or None if the text is good enough.
+    """
+
+    stripped = text.strip()
+
+    #Little or no text layer
+    if len(stripped) < PDF_MIN_PAGE_CHARS:
+        return "sparse-text"
+
+    #Words extracted letter by letter ("c o m p l i a n c e")
+    words = re.findall(r"[A-Za-z]+", stripped)
+    if words:
+        fragments = sum(1 for w in words if len(w) <= 2 and w.lower() not in SHORT_WORDS)
+        if fragments / len(words) > PDF_BROKEN_WORD_RATIO:
+            return "broken-words"
+
+    #Several text lines side by side on several rows: likely a table
+    lines = {}
+    for x0, y0, _, _, _, block_no, line_no, _ in page.get_text("words"):
+        lines.setdefault((block_no, line_no), y0)
+
+    rows = Counter(round(y0 / 5) for y0 in lines.values())
+
+    if sum(1 for n in rows.values() if n >= PDF_TABLE_MIN_COLUMNS) >= PDF_TABLE_MIN_ROWS:
+        return "table-layout"
+
+    return None
+
+
+def extract_pdf_pages(file_path: str) -> Tuple[List[str], List[Dict]]:
+    """
+    Page texts plus, per page, the engine used and why pdfplumber was
+    consulted. pdfplumber is opened only if some page needs it.
+    """
+
+    pages = []
+    page_info = []
+    plumber = None
+
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        with fitz.open(file_path) as doc:
+            for number, page in enumerate(doc):
+                text = page.get_text("text")
+                issue = pymupdf_page_issue(page, text)
+                engine = "pymupdf"
+
+                if issue:
+                    try:
+                        if plumber is None:
+                            plumber = pdfplumber.open(file_path)
+
+                        plumber_text = plumber.pages[number].extract_text() or ""
+
+                        if plumber_text.strip():
+                            text = plumber_text
+                            engine = "pdfplumber"
+
+                    except Exception as e:
+                        print(f"pdfplumber failed on page {number + 1}:", e)
+
+                pages.append(text)
+                page_info.append({"page": number + 1, "engine": engine, "reason": issue})
+
     except Exception as e:
-        print("pdfplumber failed:", e)
-    
-    if not text.strip():
-        try:
-            doc = fitz.open(file_path)
-            for page in doc:
-                text += page.get_text("text")
-        except Exception as e:
-            print("PyMuPDF fallback failed:", e)
-            
+        #PyMuPDF could not read the file at all: pdfplumber for every page
+        print("PyMuPDF failed:", e)
+        pages, page_info = [], []
+
+        with pdfplumber.open(file_path) as pdf:
+            for number, page in enumerate(pdf.pages):
+                pages.append(page.extract_text() or "")
+                page_info.append({"page": number + 1, "engine": "pdfplumber", "reason": "pymupdf-failed"})
+
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+    return pages, page_info
+
+
+def extract_text_from_pdf(file_path: str) -> Tuple[str, Dict]:
+
+    pages, page_info = extract_pdf_pages(file_path)
+    text = "\n".join(page for page in pages if page)
+
     if not text.strip():
         raise ValueError("unable to extract text from PDF.")
-            
-    return clean_text(text)
 
+    info = {
+        "engines": dict(Counter(p["engine"] for p in page_info)),
+        "pages": page_info
+    }
+
+    return clean_text(text), info
+
+
+
+#WordprocessingML element tags
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+W_TBL = W_NS + "tbl"
+W_TR = W_NS + "tr"
+W_TC = W_NS + "tc"
+
+DOCX_HEADER_PART = re.compile(r"word/header\d*\.xml")
+DOCX_FOOTER_PART = re.compile(r"word/footer\d*\.xml")
+
+
+def _paragraph_text(paragraph) -> str:
+
+    parts = []
+
+    for node in paragraph.iter(W_T, W_TAB, W_BR, W_CR):
+        if node.tag == W_T:
+            parts.append(node.text or "")
+        elif node.tag == W_TAB:
+            parts.append(" ")
+        else:
+            parts.append("\n")
+
+    return "".join(parts).strip()
+
+
+def _release(elem):
+    """
+    Frees a processed element and the already-processed siblings before it,
+    so the parsed tree never grows past the current block.
+    """
+
+    elem.clear()
+
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_docx_part_lines(stream) -> Iterator[str]:
+    """
+    Streams one WordprocessingML part in document order: one line per
+    paragraph, one "cell | cell | ..." line per table row (nested tables are
+    inlined into their cell) and a blank line around each table.
+    """
+
+    #Open rows and cells, innermost last
+    rows: List[List[str]] = []
+    cells: List[List[str]] = []
+
+    for event, elem in etree.iterparse(stream, events=("start", "end")):
+
+        if event == "start":
+            if elem.tag == W_TBL and not cells:
+                yield ""
+            elif elem.tag == W_TR:
+                rows.append([])
+            elif elem.tag == W_TC:
+                cells.append([])
+            continue
+
+        if elem.tag == W_P:
+            text = _paragraph_text(elem)
+
+            if cells:
+                if text:
+                    cells[-1].append(text)
+            elif text:
+                yield text
+
+            _release(elem)
+
+        elif elem.tag == W_TC:
+            rows[-1].append(" ".join(cells.pop()))
+            _release(elem)
+
+        elif elem.tag == W_TR:
+            row = " | ".join(cell for cell in rows.pop() if cell)
+
+            if cells:
+                cells[-1].append(row)
+            elif row:
+                yield row
+
+            _release(elem)
+
+        elif elem.tag == W_TBL and not cells:
+            yield ""
+            _release(elem)
+
+
+def iter_docx_lines(file_path: str) -> Iterator[str]:
+    """
+    Text lines of a DOCX without building python-docx's object model:
+    headers, then the body, then footers. Each distinct header or footer is
+    emitted once, introduced by a [Header] or [Footer] marker line.
+    """
+
+    with zipfile.ZipFile(file_path) as archive:
+        names = archive.namelist()
+
+        headers = sorted(n for n in names if DOCX_HEADER_PART.fullmatch(n))
+        footers = sorted(n for n in names if DOCX_FOOTER_PART.fullmatch(n))
+
+        seen = set()
+
+        def section(marker: str, parts: List[str]) -> Iterator[str]:
+            for name in parts:
+                with archive.open(name) as stream:
+                    lines = [line for line in iter_docx_part_lines(stream) if line]
+
+                key = tuple(lines)
+                if lines and key not in seen:
+                    seen.add(key)
+                    yield marker
+                    yield from lines
+
+        yield from section("[Header]", headers)
+
+        with archive.open("word/document.xml") as stream:
+            yield from iter_docx_part_lines(stream)
+
+        yield from section("[Footer]", footers)
 
 
 def extract_text_from_docx(file_path: str) -> str:
     
     try:
-        doc = Document(file_path)
-        text = "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
+        text = "\n".join(iter_docx_lines(file_path))
     except Exception as e:
         raise ValueError(f"DOCX extraction failed: {e}")
     
     return clean_text(text)
 
-def extract_text(file_path: str, filename: str) -> str:
+def extract_text_with_info(file_path: str, filename: str) -> Tuple[str, Dict]:
+    """
+    Extracted text plus diagnostics (for PDFs, the engine used per page).
+    """
     
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
@@ -64,8 +285,13 @@ def extract_text(file_path: str, filename: str) -> str:
         return extract_text_from_pdf(file_path)
     
     elif filename.endswith(".docx"):
-        return extract_text_from_docx(file_path)
+        return extract_text_from_docx(file_path), {"engines": {"docx-stream": 1}}
     
     else:
         raise ValueError("Unsupported file format. Only PDF and DOCX are supported.")
+
+
+def extract_text(file_path: str, filename: str) -> str:
+    
+    return extract_text_with_info(file_path, filename)[0]
     
\ No newline at end of file
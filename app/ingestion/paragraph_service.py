@@ -1,58 +1,121 @@
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.paragraph import Paragraph
 from app.models.paragraph_classification import ParagraphClassification
 from app.models.domains import ComplianceDomain
-from app.classification.domain_classifier import classify_paragraph
+from app.classification.domain_classifier import classify_texts
 
 
-def sav_paragraphs(db: Session, document_id: int, paragraphs: list):
-    
-    try:
-        for para in paragraphs:
+def get_domain(db: Session, domain_name: str, domains_by_name: dict):
+
+    # Fetch domain from DB once per name
+    if domain_name not in domains_by_name:
+        domains_by_name[domain_name] = (
+            db.query(ComplianceDomain)
+            .filter(ComplianceDomain.name == domain_name)
+            .first()
+        )
+    return domains_by_name[domain_name]
+
+
+def build_paragraph(db: Session, document_id: int, para: dict, result, domains_by_name: dict) -> Paragraph:
+    """
+    Paragraph row with its classification rows attached through the
+    relationship, so a whole document is inserted by one flush.
+    """
+
+    source = para.get("source_paragraph")
+
+    paragraph_obj = Paragraph(
+        paragraph_id=para["paragraph_id"],
+        document_id=document_id,
+        text=para["text"],
+        source_paragraph_id=source.id if source is not None else None
+    )
 
-            # Save paragraph
-            paragraph_obj = Paragraph(
-                paragraph_id=para["paragraph_id"],
-                document_id=document_id,
-                text=para["text"]
+    # Unchanged paragraph of a revision: reuse its classifications
+    if source is not None:
+        paragraph_obj.classifications = [
+            ParagraphClassification(
+                domain_id=c.domain_id,
+                confidence=c.confidence,
+                method=c.method,
+                rank=c.rank
             )
+            for c in source.classifications
+        ]
+        return paragraph_obj
 
-            db.add(paragraph_obj)
-            db.flush() #generates paragraph_obj.id
+    method = result.get("method", "unknown")
+    labels = result.get("labels") or [
+        {"domain": result.get("domain"), "score": result.get("confidence", 0.0)}
+    ]
 
-            # Classify paragraph
-            result = classify_paragraph(para["text"], db)
+    # Store every label, primary domain at rank 0
+    for rank, label in enumerate(labels):
 
-            domain_name = result.get("domain")
-            confidence = result.get("confidence", 0.0)
-            method = result.get("method", "unknown")
-            
-            # Fetch domain from DB
-            domain = (
-                db.query(ComplianceDomain)
-                .filter(ComplianceDomain.name == domain_name)
-                .first()
+        domain = get_domain(db, label["domain"], domains_by_name)
+
+        if not domain:
+            if rank > 0:
+                continue
+
+            classification = ParagraphClassification(
+                domain_id=None,
+                confidence=label["score"],
+                method="invalid-domain",
+                rank=rank
             )
-            
-            if not domain:
-                classification = ParagraphClassification(
-                    paragraph_id=paragraph_obj.id,
-                    domain_id=None,
-                    confidence=confidence,
-                    method="invalid-domain"
-                )
-            else:
-                classification = ParagraphClassification(
-                    paragraph_id=paragraph_obj.id,
-                    domain_id=domain.id,
-                    confidence=confidence,
-                    method=method
-                )
-
-            db.add(classification)
-        db.commit()
+        else:
+            classification = ParagraphClassification(
+                domain_id=domain.id,
+                confidence=label["score"],
+                method=method if rank == 0 else "secondary-domain",
+                rank=rank
+            )
+
+        paragraph_obj.classifications.append(classification)
+
+    return paragraph_obj
+
+
+def sav_paragraphs(db: Session, document_id: int, paragraphs: list, results: Optional[list] = None, commit: bool = True) -> List[Paragraph]:
+    """
+    Saves paragraphs in order. A paragraph dict with a "source_paragraph"
+    (carried over from a previous revision) copies its classifications
+    instead of being classified again.
+
+    results may hold precomputed classify_texts results, one per paragraph
+    (ignored for carried paragraphs); otherwise new paragraphs are
+    classified here in one batch. With commit=False the caller commits,
+    e.g. to write several documents in one transaction.
+    """
+    
+    domains_by_name = {}
+    
+    try:
+        if results is None:
+            new_indexes = [i for i, para in enumerate(paragraphs) if para.get("source_paragraph") is None]
+            new_results, _ = classify_texts([paragraphs[i]["text"] for i in new_indexes], db)
+
+            results = [None] * len(paragraphs)
+            for i, result in zip(new_indexes, new_results):
+                results[i] = result
+
+        saved = [
+            build_paragraph(db, document_id, para, result, domains_by_name)
+            for para, result in zip(paragraphs, results)
+        ]
+
+        db.add_all(saved)
+        db.flush() #generates the paragraph ids
+
+        if commit:
+            db.commit()
+
+        return saved
             
     except SQLAlchemyError as e:
         db.rollback()
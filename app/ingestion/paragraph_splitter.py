@@ -1,11 +1,13 @@
+import re
 import uuid
 from typing import List
 from pydantic import BaseModel, Field
-from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from app.utils.pdf_cleanup import normalize, looks_like_metadata, detect_repeated_lines
-from app.core.rate_limiter import rate_limiter
+from app.core.llm_policy import call_llm
+from app.core.tokens import chunk_lines, estimate_prompt_tokens, LLM_SPLIT_CHUNK_TOKENS
+from app.core.llm import get_llm
 
 MIN_PARAGRAPH_LENGTH = 50 #characters
 
@@ -17,13 +19,6 @@ class ParagraphList(BaseModel):
     
 parser = PydanticOutputParser(pydantic_object=ParagraphList)
 
-#Initialize Mistral
-llm = ChatMistralAI(
-    model="mistral-small-latest",
-    temperature=0,
-    timeout=180
-)
-
 #Create Prompt
 prompt = ChatPromptTemplate.from_messages(
     [
@@ -61,11 +56,40 @@ Document:
     ]
 )
 
-chain = prompt | llm | parser
+_chain = None
 
-#Main Function
+def get_chain():
+    global _chain
 
-def split_into_paragraphs(text: str):
+    if _chain is None:
+        _chain = prompt | get_llm(timeout=180) | parser
+    return _chain
+
+def split_chunk(text: str) -> List[str]:
+    
+    inputs = {
+        "document": text,
+        "format_instructions": parser.get_format_instructions(),
+    }
+    
+    #AI-based semantic splitting
+    try:
+        result = call_llm(
+            lambda: get_chain().invoke(inputs),
+            stage="paragraph_split",
+            prompt_tokens=estimate_prompt_tokens(prompt, inputs)
+        )
+        return result.paragraphs
+        
+    except Exception as e:
+        print("AI splitting failed:", e)
+        return re.split(r'\n(?=\d+\.)', text)
+
+def clean_lines(text: str) -> List[str]:
+    """
+    Non-empty, stripped lines of the extracted text without repeated
+    header/footer metadata. Revisions are diffed on these lines.
+    """
 
     text = text.replace("\r\n", "\n").replace("\r","\n")
     lines = text.split("\n")
@@ -82,25 +106,16 @@ def split_into_paragraphs(text: str):
         if stripped:
             cleaned_lines.append(stripped)
             
-    cleaned_text = "\n".join(cleaned_lines)
-    
-    if len(cleaned_text) >12000:
-        cleaned_text = cleaned_text[:12000]
+    return cleaned_lines
+
+
+def split_lines(lines: List[str]):
+
+    #Long documents are split chunk by chunk within the token budget instead of being cut off
+    paragraphs = []
     
-    #AI-based semantic splitting
-    try:
-        rate_limiter.wait()  # Ensure we respect rate limits
-        result = chain.invoke(
-            {
-                "document": cleaned_text,
-                "format_instructions": parser.get_format_instructions(),
-            }
-        )
-        paragraphs = result.paragraphs
-        
-    except Exception as e:
-        print("AI splitting failed:", e)
-        paragraphs = cleaned_text.split(r'\n(?=\d+\.)')
+    for chunk in chunk_lines(lines, LLM_SPLIT_CHUNK_TOKENS):
+        paragraphs.extend(split_chunk(chunk))
     
     return [
         {
@@ -109,4 +124,10 @@ def split_into_paragraphs(text: str):
         }
         for p in paragraphs
         if len(p.strip()) >= MIN_PARAGRAPH_LENGTH
-    ]
\ No newline at end of file
+    ]
+
+#Main Function
+
+def split_into_paragraphs(text: str):
+
+    return split_lines(clean_lines(text))
@@ -0,0 +1,215 @@
+import difflib
+import os
+import uuid
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.ingestion.extractor import extract_text
+from app.ingestion.paragraph_splitter import clean_lines, split_lines
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+def locate_paragraphs(lines: List[str], paragraphs: List[Paragraph]) -> Dict[int, Tuple[int, int]]:
+    """
+    First and last line index of each paragraph within the cleaned lines,
+    ignoring whitespace differences. Paragraphs are searched in document
+    order; ones the splitter reworded cannot be located and are left out.
+    """
+
+    line_starts = []
+    joined = ""
+
+    for line in lines:
+        line_starts.append(len(joined))
+        joined += _squash(line) + " "
+
+    spans = {}
+    position = 0
+
+    for para in paragraphs:
+        needle = _squash(para.text)
+
+        if not needle:
+            continue
+
+        at = joined.find(needle, position)
+        if at < 0:
+            at = joined.find(needle)
+        if at < 0:
+            continue
+
+        first = bisect_right(line_starts, at) - 1
+        last = bisect_right(line_starts, at + len(needle) - 1) - 1
+        spans[para.id] = (first, last)
+        position = at + len(needle)
+
+    return spans
+
+
+def plan_revision(old_lines: List[str], new_lines: List[str], old_paragraphs: List[Paragraph]) -> List[Dict]:
+    """
+    Orders the new revision as a list of segments:
+    {"carry": Paragraph} for a previous paragraph whose lines are all
+    unchanged, or {"lines": [...]} for a changed region to split again.
+    """
+
+    #Old line index -> new line index, for lines the diff keeps
+    kept: Dict[int, int] = {}
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                kept[i1 + offset] = j1 + offset
+
+    spans = locate_paragraphs(old_lines, old_paragraphs)
+
+    covered = [False] * len(new_lines)
+    carried_at: Dict[int, List[Paragraph]] = {}
+
+    for para in old_paragraphs:
+        if para.id not in spans:
+            continue
+
+        first, last = spans[para.id]
+
+        if not all(i in kept for i in range(first, last + 1)):
+            continue
+
+        #Unchanged lines must also stay together in the new revision
+        if kept[last] - kept[first] != last - first:
+            continue
+
+        for j in range(kept[first], kept[last] + 1):
+            covered[j] = True
+
+        carried_at.setdefault(kept[first], []).append(para)
+
+    segments = []
+    pending: List[str] = []
+
+    for j, line in enumerate(new_lines):
+
+        if j in carried_at:
+            if pending:
+                segments.append({"lines": pending})
+                pending = []
+
+            for para in carried_at[j]:
+                segments.append({"carry": para})
+
+        if not covered[j]:
+            pending.append(line)
+
+    if pending:
+        segments.append({"lines": pending})
+
+    return segments
+
+
+def previous_text(previous: Document) -> Optional[str]:
+
+    if previous.extracted_text:
+        return previous.extracted_text
+
+    #Documents ingested before extracted text was stored
+    if previous.file_path and os.path.exists(previous.file_path):
+        return extract_text(previous.file_path, previous.filename)
+
+    return None
+
+
+def revision_paragraphs(db: Session, previous_document_id: int, extracted_text: str) -> List[Dict]:
+    """
+    Paragraph dicts for a new revision, in document order, ready for
+    sav_paragraphs. Only changed regions go through split_lines (and so
+    through the LLM splitter and classification); unchanged paragraphs are
+    carried over with a "source_paragraph".
+    """
+
+    new_lines = clean_lines(extracted_text)
+
+    previous = db.query(Document).filter(Document.id == previous_document_id).first()
+    old_text = previous_text(previous) if previous else None
+
+    if old_text is None:
+        print("Previous revision unavailable, splitting the whole document:", previous_document_id)
+        return split_lines(new_lines)
+
+    old_paragraphs = (
+        db.query(Paragraph)
+        .options(selectinload(Paragraph.classifications))
+        .filter(Paragraph.document_id == previous_document_id)
+        .order_by(Paragraph.id)
+        .all()
+    )
+
+    segments = plan_revision(clean_lines(old_text), new_lines, old_paragraphs)
+
+    paragraphs = []
+    carried = 0
+
+    for segment in segments:
+        if "carry" in segment:
+            source = segment["carry"]
+            carried += 1
+            paragraphs.append({
+                "paragraph_id": str(uuid.uuid4()),
+                "text": source.text,
+                "source_paragraph": source
+            })
+        else:
+            paragraphs.extend(split_lines(segment["lines"]))
+
+    print(f"Revision of {previous_document_id}: {carried} paragraphs carried over, {len(paragraphs) - carried} re-split")
+
+    return paragraphs
+
+
+def revision_changes(db: Session, document_id: int) -> Optional[Dict]:
+    """
+    Paragraph-level change set of a revision against its previous revision,
+    so match results can be refreshed for the changed paragraphs only.
+    """
+
+    document = db.query(Document).filter(Document.id == document_id).first()
+
+    if not document:
+        return None
+
+    paragraphs = (
+        db.query(Paragraph.id, Paragraph.source_paragraph_id)
+        .filter(Paragraph.document_id == document_id)
+        .order_by(Paragraph.id)
+        .all()
+    )
+
+    previous_ids = []
+    if document.previous_document_id:
+        previous_ids = [
+            p.id for p in
+            db.query(Paragraph.id)
+            .filter(Paragraph.document_id == document.previous_document_id)
+            .order_by(Paragraph.id)
+            .all()
+        ]
+
+    sources = {p.source_paragraph_id for p in paragraphs if p.source_paragraph_id}
+
+    return {
+        "document_id": document_id,
+        "previous_document_id": document.previous_document_id,
+        "unchanged": [
+            {"paragraph_id": p.id, "previous_paragraph_id": p.source_paragraph_id}
+            for p in paragraphs if p.source_paragraph_id
+        ],
+        "added": [p.id for p in paragraphs if not p.source_paragraph_id],
+        "removed": [pid for pid in previous_ids if pid not in sources],
+    }
@@ -1,12 +1,20 @@
 import os
 import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from app.ingestion.extractor import extract_text
+from app.ingestion.extractor import extract_text_with_info
 from app.ingestion.paragraph_splitter import split_into_paragraphs
 from app.ingestion.paragraph_service import sav_paragraphs
-from app.db.database import SessionLocal
+from app.ingestion.revision import revision_paragraphs, revision_changes
+from app.db.database import WorkerSessionLocal, get_async_db, get_db
 from app.models.documents import Document
+from app.core.usage import UsageCounter, track_usage
+from app.core.profiler import Profile, new_profile, profile_requested, profile_run
+from app.comparison.corpus_index import add_document_to_corpus
+from app.comparison.semantic_matcher import persist_vendor_vector_store
 
 #from app.classification.domain_classifier import classify_paragraphs
 
@@ -17,28 +25,69 @@ router = APIRouter(
 
 UPLOAD_DIR = "uploaded_files"
 MAX_FILE_SIZE_MB = 50
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
-def process_document(file_path: str, filename: str, document_id: int):
-    db = SessionLocal()
+def mark_document_failed(db: Session, document_id: int):
     
     try:
-        extracted_text = extract_text(file_path, filename)
-        
-        paragraphs = split_into_paragraphs(extracted_text)
-        
-        sav_paragraphs(
-            db=db,
-            document_id=document_id,
-            paragraphs=paragraphs,
-        )
-        
+        db.query(Document).filter(Document.id == document_id).update({"status": "failed"})
         db.commit()
+    except Exception as e:
+        db.rollback()
+        print("Could not mark document as failed:", document_id, e)
+
+
+def process_document(file_path: str, filename: str, document_id: int, previous_document_id: Optional[int] = None, profile: Optional[Profile] = None):
+    
+    with profile_run(profile):
+        _process_document(file_path, filename, document_id, previous_document_id)
+
+
+def _process_document(file_path: str, filename: str, document_id: int, previous_document_id: Optional[int] = None):
+    db = WorkerSessionLocal()
+    usage = UsageCounter()
+    
+    try:
+        with track_usage(usage):
+            extracted_text, extraction_info = extract_text_with_info(file_path, filename)
+            print("Extraction engines:", document_id, extraction_info["engines"])
+            
+            db.query(Document).filter(Document.id == document_id).update(
+                {"extracted_text": extracted_text, "extraction_info": extraction_info}
+            )
+            
+            # Revisions only re-split and re-classify the regions that changed
+            if previous_document_id:
+                paragraphs = revision_paragraphs(db, previous_document_id, extracted_text)
+            else:
+                paragraphs = split_into_paragraphs(extracted_text)
+            
+            sav_paragraphs(
+                db=db,
+                document_id=document_id,
+                paragraphs=paragraphs,
+                commit=False
+            )
+            
+            db.query(Document).filter(Document.id == document_id).update({"status": "completed"})
+            db.commit()
+        
+        print("Ingestion usage:", document_id, usage.report())
         
     except Exception as e:
         db.rollback()
         print("Background processing failed:", e)
+        mark_document_failed(db, document_id)
+        db.close()
+        return
+    
+    #Search indexes are derived data; a failure here leaves the document usable
+    try:
+        persist_vendor_vector_store(db, document_id)
+        add_document_to_corpus(db, document_id)
+        
+    except Exception as e:
+        print("Index build failed:", e)
         
     finally:
         db.close()
@@ -46,7 +95,14 @@ def process_document(file_path: str, filename: str, document_id: int):
         
 
 @router.post("/upload-policy/")
-async def upload_policy(background_tasks: BackgroundTasks, document_type: str, file: UploadFile = File(...)):
+async def upload_policy(
+    background_tasks: BackgroundTasks,
+    document_type: str,
+    file: UploadFile = File(...),
+    previous_document_id: Optional[int] = None,
+    profile: bool = Depends(profile_requested),
+    db: AsyncSession = Depends(get_async_db)
+):
     
     if not file.filename.lower().endswith((".pdf", ".docx")):
         raise HTTPException(status_code=400, detail="Only PDF or DOCX allowed.")
@@ -59,46 +115,92 @@ async def upload_policy(background_tasks: BackgroundTasks, document_type: str, f
             detail=f"File too large. Max {MAX_FILE_SIZE_MB} MB allowed."
         )
     
+    if previous_document_id is not None:
+        previous = await db.get(Document, previous_document_id)
+        
+        if not previous:
+            raise HTTPException(status_code=404, detail="Previous document not found.")
+        
+        if previous.document_type != document_type:
+            raise HTTPException(status_code=400, detail="A revision must have the same document type.")
+    
+    run_profile = new_profile(profile, f"ingestion {file.filename}")
+    
     file_id = str(uuid.uuid4())
     file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
     
     with open(file_path, "wb") as f:
         f.write(contents)
         
-    db = SessionLocal()
-        
     try:
         db_document = Document(
             filename=file.filename,
             file_path=file_path,
             document_id=file_id,
             document_type=document_type,
-            status="processing"
+            status="processing",
+            previous_document_id=previous_document_id
         )
         
         db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
+        await db.commit()
+        await db.refresh(db_document)
         
         background_tasks.add_task(
             process_document,
             file_path,
             file.filename,
-            db_document.id
+            db_document.id,
+            previous_document_id,
+            run_profile
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Document creation failed: {str(e)}"
         )
         
-    finally:
-        db.close()
-        
-    return {
+    response = {
         "file_id": file_id,
+        "document_id": db_document.id,
         "filename": file.filename,
         "message": "File uploaded. Processing started."
     }
+    
+    # Available once processing finishes
+    if run_profile:
+        response["profile_url"] = run_profile.url
+    
+    return response
+
+
+#Processing status of an upload
+@router.get("/documents/{document_id}")
+async def document_status(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    
+    document = await db.get(Document, document_id)
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    return {
+        "document_id": document.id,
+        "filename": document.filename,
+        "document_type": document.document_type,
+        "status": document.status,
+        "previous_document_id": document.previous_document_id,
+    }
+
+
+@router.get("/documents/{document_id}/changes")
+def document_changes(document_id: int, db: Session = Depends(get_db)):
+    
+    changes = revision_changes(db, document_id)
+    
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    return changes
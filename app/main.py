@@ -1,44 +1,132 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import os
+import json
+from typing import Optional
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env")
-print("MISTRAL_API_KEY:", os.getenv("MISTRAL_API_KEY"))
 #Register all models before app starts
 import app.models.documents
 import app.models.paragraph
 import app.models.paragraph_classification
 import app.models.domains
 
-from app.db.database import SessionLocal
-from app.comparison.document_matcher import match_documents
+from app.db.database import WorkerSessionLocal, get_worker_db
+from app.comparison.document_matcher import match_documents, iter_document_matches
 from app.ingestion.upload import router as ingestion_router
+from app.ingestion.bulk import router as bulk_ingestion_router
+from app.comparison.match_jobs import router as match_jobs_router
+from app.comparison.corpus_index import router as corpus_search_router
+from app.comparison.match_views import router as paragraphs_router, VIEWS, view_report, json_response
 from app.comparison.gap_analyzer import analyze_gaps
+from app.core.config import WARMUP_ON_STARTUP
+from app.core.warmup import start_warmup, readiness
+from app.core.profiler import router as profiles_router, new_profile, profile_requested, profile_run
 
 
-app = FastAPI(title="PolicyAlign - Policy Compliance System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        start_warmup()
+    yield
+
+
+app = FastAPI(title="PolicyAlign - Policy Compliance System", lifespan=lifespan)
 
 # Include ingestion routes
 app.include_router(ingestion_router, prefix="/api")
 
+# Include bulk (multi-file / zip) ingestion routes
+app.include_router(bulk_ingestion_router, prefix="/api")
 
-#DB Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Include document-matching job routes
+app.include_router(match_jobs_router, prefix="/api")
+
+# Include corpus-wide clause search
+app.include_router(corpus_search_router, prefix="/api")
+
+# Include paragraph text lookup for compact match views
+app.include_router(paragraphs_router, prefix="/api")
+
+# Include saved request/job profiles (admin only)
+app.include_router(profiles_router, prefix="/api")
+
+
+#Readiness probe: 503 until the embedding model and LLM clients are loaded
+@app.get("/ready")
+def ready():
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
 
 
 #Document-Level Matching API
 @app.get("/api/document-matching/")
 def document_matching(
+    request: Request,
     client_document_id: int,
     vendor_document_id: int,
-    db: Session = Depends(get_db)
+    view: str = "full",
+    fields: Optional[str] = None,
+    profile: bool = Depends(profile_requested),
+    db: Session = Depends(get_worker_db)
 ):
-    return match_documents(db, client_document_id, vendor_document_id)
+    # Validated before the (long) match runs
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'compact'.")
+
+    run_profile = new_profile(profile, f"document matching {client_document_id} vs {vendor_document_id}")
+
+    with profile_run(run_profile):
+        report = match_documents(db, client_document_id, vendor_document_id)
+
+    response = json_response(request, view_report(report, view, fields))
+
+    if run_profile:
+        response.headers["X-Profile-URL"] = run_profile.url
+
+    return response
+
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def _stream_document_matches(client_document_id: int, vendor_document_id: int, stream_format: str):
+    # The session lives as long as the stream, not the request handler
+    db = WorkerSessionLocal()
+
+    try:
+        for event in iter_document_matches(db, client_document_id, vendor_document_id):
+            payload = json.dumps(event["data"])
+
+            if stream_format == "sse":
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield json.dumps({"event": event["event"], "data": event["data"]}) + "\n"
+
+    finally:
+        db.close()
+
+
+#Streaming Document-Level Matching API
+@app.get("/api/document-matching/stream/")
+def document_matching_stream(
+    client_document_id: int,
+    vendor_document_id: int,
+    format: str = "ndjson"
+):
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'.")
+
+    return StreamingResponse(
+        _stream_document_matches(client_document_id, vendor_document_id, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
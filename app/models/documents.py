@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, JSON
 from app.db.database import Base
 from sqlalchemy.orm import relationship
 
@@ -16,6 +16,15 @@ class Document(Base):
     document_type = Column(String(50), nullable=False)
     status = Column(String(50), default="processing")
     
+    # Revision uploads: the revision this document replaces
+    previous_document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    
+    # Extracted text, kept so the next revision can be diffed against it
+    extracted_text = Column(Text, nullable=True)
+    
+    # Extraction diagnostics, e.g. the PDF engine used per page
+    extraction_info = Column(JSON, nullable=True)
+    
     paragraphs = relationship(
         "Paragraph",
         back_populates="document",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float
+from sqlalchemy import Column, Integer, String, Boolean, Float, LargeBinary, DateTime, func
 from app.db.database import Base
 
 class ComplianceDomain(Base):
@@ -9,3 +9,16 @@ class ComplianceDomain(Base):
     description = Column(String(255))
     weight = Column(Float, default=1.0)
     is_active = Column(Boolean, default=True)
+
+    # float32 description embedding and the encoder that produced it
+    embedding = Column(LargeBinary, nullable=True)
+    embedding_model = Column(String(255), nullable=True)
+
+
+class DomainTaxonomyVersion(Base):
+    __tablename__ = "domain_taxonomy_version"
+
+    # Single row; bumped whenever domains or their embeddings change
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
 from app.db.database import Base
 from sqlalchemy.orm import relationship
 from app.models.paragraph_classification import ParagraphClassification
@@ -6,6 +6,11 @@ from app.models.paragraph_classification import ParagraphClassification
 class Paragraph(Base):
     __tablename__ = "paragraphs"
     
+    # Paragraphs of one document, in order (see migrations 0003)
+    __table_args__ = (
+        Index("ix_paragraphs_document_id_id", "document_id", "id"),
+    )
+    
     id = Column(Integer, primary_key=True, index=True)
     
     document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
@@ -14,12 +19,16 @@ class Paragraph(Base):
     
     text = Column(Text, nullable=False)
     
+    # Set when carried over unchanged from the previous revision's paragraph
+    source_paragraph_id = Column(Integer, ForeignKey("paragraphs.id", ondelete="SET NULL"), nullable=True, index=True)
+    
     document = relationship("Document", back_populates="paragraphs", passive_deletes=True)
     
-    classification = relationship(
+    # Top-k domain labels, primary (rank 0) first
+    classifications = relationship(
     "ParagraphClassification",
     back_populates="paragraph",
-    uselist=False,
+    order_by="ParagraphClassification.rank",
     cascade="all, delete-orphan",
     passive_deletes=True
 )
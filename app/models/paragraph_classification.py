@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -6,6 +6,17 @@ from app.db.database import Base
 class ParagraphClassification(Base):
     __tablename__ = "paragraph_classifications"
 
+    # One label per rank; label lookups are served from the index alone
+    __table_args__ = (
+        Index(
+            "uq_paragraph_classifications_paragraph_rank",
+            "paragraph_id",
+            "rank",
+            unique=True,
+            postgresql_include=["domain_id"]
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
 
     paragraph_id = Column(Integer, ForeignKey("paragraphs.id", ondelete="CASCADE"), nullable=False)
@@ -14,8 +25,11 @@ class ParagraphClassification(Base):
 
     confidence = Column(Float, nullable=False)
     method = Column(String(50), nullable=False)
+    
+    # 0 = primary domain, 1.. = secondary domains by descending score
+    rank = Column(Integer, nullable=False, default=0, server_default="0")
 
-    paragraph = relationship("Paragraph", back_populates="classification", passive_deletes=True)
+    paragraph = relationship("Paragraph", back_populates="classifications", passive_deletes=True)
     
     
     domain = relationship("ComplianceDomain", passive_deletes=True)
@@ -0,0 +1,117 @@
+"""
+Checks an optimized embedding backend against the fp32 reference model.
+
+    python -m app.utils.embedding_agreement validate --backend int8 --sample 500
+    python -m app.utils.embedding_agreement validate --backend onnx --file clauses.txt
+    python -m app.utils.embedding_agreement export --output models/mpnet-onnx
+
+Reports per-text cosine agreement, nearest-neighbour agreement within the
+sample and throughput for both encoders.
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from app.core.config import EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_DIR, EMBEDDING_THREADS
+from app.core.embeddings import SentenceEncoder, BACKENDS
+
+
+def load_sample_texts(sample: int, file_path: str = None) -> List[str]:
+
+    if file_path:
+        with open(file_path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        return texts[:sample]
+
+    from app.db.database import SessionLocal
+    import app.models.documents
+    import app.models.paragraph_classification
+    import app.models.domains
+    from app.models.paragraph import Paragraph
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Paragraph.text).order_by(Paragraph.id.desc()).limit(sample).all()
+    finally:
+        db.close()
+
+    return [r.text for r in rows]
+
+
+def timed_encode(encoder: SentenceEncoder, texts: List[str]):
+
+    start = time.perf_counter()
+    #Uncached, so both encoders run a real forward pass
+    embeddings = encoder.encode(texts, use_cache=False)
+    return embeddings, time.perf_counter() - start
+
+
+def validate(backend: str, model_path: str, texts: List[str], threads: int):
+
+    if not texts:
+        raise ValueError("No texts to validate against.")
+
+    reference = SentenceEncoder("torch", EMBEDDING_MODEL_NAME, threads)
+    candidate = SentenceEncoder(backend, model_path, threads)
+
+    # Warm both models so load time does not count as throughput
+    reference.encode(texts[:8], use_cache=False)
+    candidate.encode(texts[:8], use_cache=False)
+
+    ref_vectors, ref_seconds = timed_encode(reference, texts)
+    cand_vectors, cand_seconds = timed_encode(candidate, texts)
+
+    cosines = np.sum(ref_vectors * cand_vectors, axis=1)
+
+    ref_sim = ref_vectors @ ref_vectors.T
+    cand_sim = cand_vectors @ cand_vectors.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    nn_agreement = float(np.mean(ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1))) if len(texts) > 1 else 1.0
+
+    print("=====================================")
+    print(f"Backend: {backend} ({model_path})")
+    print("Texts:", len(texts))
+    print(f"Cosine vs fp32   mean={cosines.mean():.4f}  min={cosines.min():.4f}  p01={np.percentile(cosines, 1):.4f}")
+    print(f"Nearest-neighbour agreement: {nn_agreement * 100:.1f}%")
+    print(f"fp32 throughput: {len(texts) / ref_seconds:.1f} texts/s")
+    print(f"{backend} throughput: {len(texts) / cand_seconds:.1f} texts/s  ({ref_seconds / cand_seconds:.2f}x)")
+    print("=====================================")
+
+
+def export(output_dir: str, quantize: bool):
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu", backend="onnx")
+    model.save_pretrained(output_dir)
+
+    if quantize:
+        export_dynamic_quantized_onnx_model(model, "avx512_vnni", output_dir)
+
+    print("ONNX model exported to", output_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    validate_cmd = commands.add_parser("validate", help="Compare a backend with the fp32 model")
+    validate_cmd.add_argument("--backend", choices=BACKENDS, required=True)
+    validate_cmd.add_argument("--model-dir", default=EMBEDDING_MODEL_DIR)
+    validate_cmd.add_argument("--sample", type=int, default=500)
+    validate_cmd.add_argument("--file", help="One text per line; defaults to recent paragraphs in the database")
+    validate_cmd.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+
+    export_cmd = commands.add_parser("export", help="Export an ONNX model directory")
+    export_cmd.add_argument("--output", required=True)
+    export_cmd.add_argument("--no-quantize", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        validate(args.backend, args.model_dir, load_sample_texts(args.sample, args.file), args.threads)
+    else:
+        export(args.output, not args.no_quantize)
@@ -0,0 +1,488 @@
+"""
+End-to-end HTTP load test of one node.
+
+    python -m app.utils.load_test --boot --rates 0.5,1,2,4 --step-seconds 60
+    python -m app.utils.load_test --base-url http://localhost:8000 --mix upload=1,status=6,match=1
+
+--boot starts the app under uvicorn against a local database (a SQLite
+file by default, requires aiosqlite; or --database-url) and the fake LLM
+provider (LLM_PROVIDER=fake) with configurable latency and 429 injection.
+Without it, an already running stack at --base-url is tested.
+
+Seed documents are uploaded first. Each step then replays a mixed
+workload of uploads, status polls and matches at a fixed arrival rate
+(open loop: requests are sent on schedule whether or not earlier ones
+have finished) and reports p50/p95/p99 latency and error rates per
+endpoint. The first step where an endpoint misses --p95-slo-ms or
+--max-error-rate, or where the node falls behind the arrival rate, is
+reported as its saturation point. Match jobs live in the worker process
+that accepted them, so job polls expect a single uvicorn worker.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+OPERATIONS = ("upload", "status", "match", "job", "job_status")
+DEFAULT_MIX = "upload=1,status=4,match=1,job=1,job_status=3"
+
+#Share of the offered rate a step must complete to count as keeping up
+MIN_ACHIEVED_RATIO = 0.9
+
+#Clauses the generated policies are drawn from; client and vendor documents share some
+CLAUSES = [
+    "Personal data shall be encrypted at rest using AES-256 and in transit using TLS 1.2 or higher.",
+    "Access to production systems requires multi-factor authentication for all administrators.",
+    "User access rights shall be reviewed quarterly and revoked within 24 hours of termination.",
+    "Security incidents shall be reported to the client within 72 hours of detection.",
+    "Customer data shall be deleted or returned within 30 days after contract termination.",
+    "Backups shall be performed daily and restoration tested at least annually.",
+    "Subprocessors may only be engaged with prior written approval of the client.",
+    "Vulnerability scans shall be run monthly and critical findings remediated within 14 days.",
+    "Employees shall complete security awareness training upon hiring and annually thereafter.",
+    "Audit logs shall be retained for at least twelve months and protected from tampering.",
+    "A business continuity plan shall be maintained and tested once per year.",
+    "Data subject requests shall be answered within one month as required by GDPR Article 12.",
+    "Penetration tests shall be performed annually by an independent third party.",
+    "Physical access to data centres shall be restricted to authorised personnel and logged.",
+    "Changes to production systems shall follow a documented change management process.",
+    "Cryptographic keys shall be rotated at least annually and stored in a hardware security module.",
+    "The vendor shall maintain ISO 27001 certification for the duration of the agreement.",
+    "Personal data shall not be transferred outside the EEA without appropriate safeguards.",
+    "Privileged accounts shall be limited to named individuals and monitored continuously.",
+    "Security policies shall be reviewed by management at least once a year.",
+]
+
+VENDOR_PREFIXES = ["We ensure that", "The provider commits that", "As standard practice,"]
+
+#Documents generated per type before the run; building DOCX files on the event loop would delay arrivals
+DOCUMENT_POOL_SIZE = 20
+
+
+def policy_docx(document_type: str, rng: random.Random) -> bytes:
+    """
+    A small numbered policy. Vendor documents reword part of the clauses
+    and leave others out, so matching produces both matches and gaps.
+    """
+
+    from docx import Document as DocxDocument
+
+    clauses = rng.sample(CLAUSES, rng.randint(6, 12))
+
+    if document_type == "vendor":
+        clauses = [
+            f"{rng.choice(VENDOR_PREFIXES)} {c[0].lower()}{c[1:]}" if rng.random() < 0.5 else c
+            for c in clauses if rng.random() < 0.75
+        ] or clauses[:1]
+
+    document = DocxDocument()
+    document.add_heading(f"{document_type.title()} Security Policy {rng.randint(1000, 9999)}", level=1)
+
+    for number, clause in enumerate(clauses, start=1):
+        document.add_paragraph(f"{number}. {clause}")
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+
+    weights = {}
+
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name} (choose from {', '.join(OPERATIONS)})")
+
+        weights[name] = float(weight or 1)
+
+    return weights
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class LoadState:
+    """
+    Ids the workload draws from: completed seed documents for matches,
+    recent uploads for status polls, submitted jobs for job polls.
+    """
+
+    def __init__(self, client_ids: List[int], vendor_ids: List[int]):
+        self.client_ids = client_ids
+        self.vendor_ids = vendor_ids
+        self.uploaded: List[int] = list(client_ids + vendor_ids)
+        self.job_ids: List[str] = []
+        self.rng = random.Random(7)
+
+        self.documents = {
+            document_type: [policy_docx(document_type, self.rng) for _ in range(DOCUMENT_POOL_SIZE)]
+            for document_type in ("client", "vendor")
+        }
+
+
+async def upload(client: httpx.AsyncClient, state: LoadState, document_type: str = None) -> httpx.Response:
+
+    document_type = document_type or state.rng.choice(("client", "vendor"))
+    content = state.rng.choice(state.documents[document_type])
+
+    response = await client.post(
+        "/api/upload/upload-policy/",
+        params={"document_type": document_type},
+        files={"file": (f"loadtest-{document_type}.docx", content)}
+    )
+
+    if response.status_code == 200:
+        state.uploaded.append(response.json()["document_id"])
+        #Only the newest uploads are polled, as a client waiting on them would
+        del state.uploaded[:-200]
+
+    return response
+
+
+async def run_operation(client: httpx.AsyncClient, state: LoadState, operation: str) -> httpx.Response:
+
+    rng = state.rng
+
+    if operation == "upload":
+        return await upload(client, state)
+
+    if operation == "status":
+        return await client.get(f"/api/upload/documents/{rng.choice(state.uploaded)}")
+
+    pair = {
+        "client_document_id": rng.choice(state.client_ids),
+        "vendor_document_id": rng.choice(state.vendor_ids),
+    }
+
+    if operation == "match":
+        return await client.get("/api/document-matching/", params={**pair, "view": "compact"})
+
+    if operation == "job":
+        response = await client.post("/api/document-matching/jobs/", params=pair)
+        if response.status_code == 202:
+            state.job_ids.append(response.json()["job_id"])
+            del state.job_ids[:-200]
+        return response
+
+    return await client.get(f"/api/document-matching/jobs/{rng.choice(state.job_ids)}")
+
+
+async def run_step(client: httpx.AsyncClient, state: LoadState, rate: float, seconds: float, mix: Dict[str, float], max_in_flight: int) -> Dict:
+    """
+    Poisson arrivals at rate per second for seconds; requests still in
+    flight at the end are awaited and counted in the step.
+    """
+
+    loop = asyncio.get_running_loop()
+    operations, weights = zip(*mix.items())
+
+    samples = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    in_flight = set()
+    sent = 0
+    dropped = 0
+
+    async def timed(operation: str):
+        started = loop.time()
+        try:
+            response = await run_operation(client, state, operation)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+
+        samples[operation].append((loop.time() - started, status))
+        statuses[operation][status] += 1
+
+    started = loop.time()
+    next_arrival = started
+
+    while True:
+        next_arrival += random.expovariate(rate)
+        if next_arrival - started >= seconds:
+            break
+
+        await asyncio.sleep(max(0.0, next_arrival - loop.time()))
+
+        #The client must not become the bottleneck; arrivals over the cap are counted, not sent
+        if len(in_flight) >= max_in_flight:
+            dropped += 1
+            continue
+
+        operation = random.choices(operations, weights)[0]
+
+        #Nothing to poll until the first job is submitted
+        if operation == "job_status" and not state.job_ids:
+            operation = "status"
+
+        sent += 1
+        task = asyncio.create_task(timed(operation))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    await asyncio.gather(*in_flight)
+    elapsed = loop.time() - started
+
+    endpoints = {}
+    for operation, results in samples.items():
+        latencies = [latency for latency, _ in results]
+        errors = sum(1 for _, status in results if not status.startswith(("2", "3")))
+
+        endpoints[operation] = {
+            "requests": len(results),
+            "error_rate": round(errors / len(results), 4),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "statuses": dict(statuses[operation]),
+        }
+
+    completed = sum(len(results) for results in samples.values())
+
+    #Arrivals are random, so a step is judged against what was actually sent
+    return {
+        "target_rate": rate,
+        "offered_rate": round((sent + dropped) / seconds, 3),
+        "achieved_rate": round(completed / elapsed, 3),
+        "elapsed_seconds": round(elapsed, 1),
+        "dropped": dropped,
+        "endpoints": endpoints,
+    }
+
+
+def saturation_points(steps: List[Dict], p95_slo_ms: float, max_error_rate: float) -> Dict:
+    """
+    First target rate at which each endpoint (and the node as a whole)
+    stops meeting the SLO; None if it held for every step.
+    """
+
+    points = {}
+
+    for step in steps:
+        for operation, stats in step["endpoints"].items():
+            if operation in points:
+                continue
+
+            if stats["p95_ms"] > p95_slo_ms:
+                points[operation] = {"rate": step["target_rate"], "reason": f"p95 {stats['p95_ms']} ms"}
+            elif stats["error_rate"] > max_error_rate:
+                points[operation] = {"rate": step["target_rate"], "reason": f"error rate {stats['error_rate']:.1%}"}
+
+        if "node" not in points and (step["dropped"] or step["achieved_rate"] < MIN_ACHIEVED_RATIO * step["offered_rate"]):
+            points["node"] = {
+                "rate": step["target_rate"],
+                "reason": f"achieved {step['achieved_rate']}/s, {step['dropped']} arrivals over the in-flight cap"
+            }
+
+    for operation in list(OPERATIONS) + ["node"]:
+        points.setdefault(operation, None)
+
+    return points
+
+
+def print_step(step: Dict):
+
+    print(
+        f"\n== {step['target_rate']}/s target, {step['offered_rate']}/s offered, {step['achieved_rate']}/s achieved, "
+        f"{step['dropped']} dropped, {step['elapsed_seconds']} s"
+    )
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+
+    for operation, stats in sorted(step["endpoints"].items()):
+        print(
+            f"{operation:<12}{stats['requests']:>10}{stats['error_rate']:>9.1%}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}  {stats['statuses']}"
+        )
+
+
+async def seed(client: httpx.AsyncClient, pairs: int, timeout: float) -> LoadState:
+    """
+    Uploads client/vendor documents and waits until they are processed.
+    """
+
+    state = LoadState([], [])
+    pending = {}
+
+    for _ in range(pairs):
+        for document_type in ("client", "vendor"):
+            response = await upload(client, state, document_type)
+            response.raise_for_status()
+            pending[response.json()["document_id"]] = document_type
+
+    deadline = time.monotonic() + timeout
+
+    while pending:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Seed documents not processed within {timeout} s: {sorted(pending)}")
+
+        await asyncio.sleep(2)
+
+        for document_id, document_type in list(pending.items()):
+            status = (await client.get(f"/api/upload/documents/{document_id}")).json()["status"]
+
+            if status == "failed":
+                raise SystemExit(f"Seed document {document_id} failed to process; check the server log.")
+
+            if status == "completed":
+                (state.client_ids if document_type == "client" else state.vendor_ids).append(document_id)
+                del pending[document_id]
+
+    print(f"Seeded {len(state.client_ids)} client and {len(state.vendor_ids)} vendor documents.")
+    return state
+
+
+def boot(args) -> subprocess.Popen:
+    """
+    Migrates and seeds the local database, then starts uvicorn with the
+    fake LLM provider.
+    """
+
+    os.makedirs(args.workdir, exist_ok=True)
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.abspath(os.path.join(args.workdir, 'loadtest.db'))}",
+        "LLM_PROVIDER": "fake",
+        "LLM_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_FAKE_JITTER_MS": str(args.llm_jitter_ms),
+        "LLM_FAKE_THROTTLE_RATE": str(args.llm_throttle_rate),
+    })
+
+    if args.rate_limit_interval is not None:
+        env["RATE_LIMIT_INTERVAL_SECONDS"] = str(args.rate_limit_interval)
+
+    subprocess.run([sys.executable, "-m", "app.db.init_db"], env=env, check=True)
+    subprocess.run([sys.executable, "-m", "app.db.seed_domains"], env=env, check=True)
+
+    log = open(os.path.join(args.workdir, "server.log"), "ab")
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT
+    )
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.boot_timeout
+
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited during startup; see {log.name}")
+
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                print("Server ready at", base_url)
+                return server
+        except httpx.HTTPError:
+            pass
+
+        time.sleep(1)
+
+    server.terminate()
+    raise SystemExit(f"Server not ready within {args.boot_timeout} s; see {log.name}")
+
+
+async def run(args, base_url: str) -> Dict:
+
+    mix = parse_mix(args.mix)
+    rates = [float(r) for r in args.rates.split(",")]
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        state = await seed(client, args.seed_pairs, args.seed_timeout)
+
+        steps = []
+        for rate in rates:
+            step = await run_step(client, state, rate, args.step_seconds, mix, args.max_in_flight)
+            print_step(step)
+            steps.append(step)
+
+    points = saturation_points(steps, args.p95_slo_ms, args.max_error_rate)
+
+    print("\nSaturation points (first target rate missing the SLO):")
+    for name, point in points.items():
+        print(f"  {name:<12}", f"{point['rate']}/s ({point['reason']})" if point else "held at every step")
+
+    return {
+        "base_url": base_url,
+        "mix": mix,
+        "p95_slo_ms": args.p95_slo_ms,
+        "max_error_rate": args.max_error_rate,
+        "steps": steps,
+        "saturation": points,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    target = parser.add_argument_group("target")
+    target.add_argument("--base-url", default="http://127.0.0.1:8000", help="Stack to test when not booting one")
+    target.add_argument("--boot", action="store_true", help="Start a local stack with the fake LLM")
+    target.add_argument("--database-url", help="Database for --boot (default: SQLite file in --workdir)")
+    target.add_argument("--workdir", default="loadtest", help="SQLite file, server log and results for --boot")
+    target.add_argument("--port", type=int, default=8011)
+    target.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    target.add_argument("--boot-timeout", type=float, default=600, help="Seconds to wait for /ready (models load first)")
+
+    llm = parser.add_argument_group("fake LLM (--boot)")
+    llm.add_argument("--llm-latency-ms", type=float, default=800)
+    llm.add_argument("--llm-jitter-ms", type=float, default=400)
+    llm.add_argument("--llm-throttle-rate", type=float, default=0.0, help="Share of LLM calls answered with 429")
+    llm.add_argument("--rate-limit-interval", type=float, help="Override RATE_LIMIT_INTERVAL_SECONDS")
+
+    workload = parser.add_argument_group("workload")
+    workload.add_argument("--rates", default="0.5,1,2,4", help="Arrival rates per second, one step each")
+    workload.add_argument("--step-seconds", type=float, default=60)
+    workload.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights ({', '.join(OPERATIONS)})")
+    workload.add_argument("--seed-pairs", type=int, default=2, help="Client/vendor documents uploaded before the steps")
+    workload.add_argument("--seed-timeout", type=float, default=600)
+    workload.add_argument("--max-in-flight", type=int, default=256)
+    workload.add_argument("--request-timeout", type=float, default=120)
+
+    slo = parser.add_argument_group("saturation")
+    slo.add_argument("--p95-slo-ms", type=float, default=5000)
+    slo.add_argument("--max-error-rate", type=float, default=0.01)
+    slo.add_argument("--output", help="Write the full results as JSON")
+
+    args = parser.parse_args()
+
+    server = boot(args) if args.boot else None
+    base_url = f"http://127.0.0.1:{args.port}" if args.boot else args.base_url
+
+    try:
+        results = asyncio.run(run(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
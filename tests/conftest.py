@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+#Settings for the test run, before any app module reads them (load_dotenv never overrides these).
+#A file database, since the engines' pool settings do not apply to in-memory SQLite
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "thread")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
@@ -0,0 +1,98 @@
+import itertools
+import random
+
+import pytest
+
+import app.comparison.assignment as assignment
+from app.comparison.assignment import assign_vendor_paragraphs, reuse_penalty
+
+
+@pytest.fixture
+def tight_reuse(monkeypatch):
+    #Small cases only reach the penalty slots if reuse is cheap to trigger
+    monkeypatch.setattr(assignment, "FREE_REUSE_SLOTS", 1)
+    monkeypatch.setattr(assignment, "REUSE_PENALTY", 0.15)
+
+
+def objective(candidates, chosen) -> float:
+    """
+    Summed best edge score minus reuse penalties, for client id -> vendor id.
+    """
+
+    total = 0.0
+    uses = {}
+
+    for cid, vid in chosen.items():
+        total += max(score for v, score in candidates[cid] if v == vid)
+        total -= reuse_penalty(uses.get(vid, 0))
+        uses[vid] = uses.get(vid, 0) + 1
+
+    return total
+
+
+def brute_force(candidates) -> float:
+
+    client_ids = [cid for cid, options in candidates.items() if options]
+    choices = [sorted({vid for vid, _ in candidates[cid]}) for cid in client_ids]
+
+    return max(
+        objective(candidates, dict(zip(client_ids, picked)))
+        for picked in itertools.product(*choices)
+    )
+
+
+def random_candidates(rng: random.Random, n_clients: int, n_vendors: int):
+
+    candidates = {}
+
+    for cid in range(100, 100 + n_clients):
+        vendors = rng.sample(range(n_vendors), rng.randint(0, n_vendors))
+        candidates[cid] = [(vid, round(rng.uniform(0.6, 1.0), 3)) for vid in vendors]
+
+    return candidates
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_brute_force(tight_reuse, seed):
+    rng = random.Random(seed)
+    candidates = random_candidates(rng, rng.randint(1, 6), rng.randint(1, 4))
+
+    assignments = assign_vendor_paragraphs(candidates)
+
+    assert set(assignments) == {cid for cid, options in candidates.items() if options}
+
+    if assignments:
+        chosen = {cid: vid for cid, (vid, _) in assignments.items()}
+        assert objective(candidates, chosen) == pytest.approx(brute_force(candidates), abs=1e-9)
+
+
+def test_penalized_scores_follow_document_order(tight_reuse):
+    candidates = {1: [(9, 0.9)], 2: [(9, 0.8)], 3: [(9, 0.7)]}
+
+    assert assign_vendor_paragraphs(candidates) == {1: (9, 0.9), 2: (9, 0.65), 3: (9, 0.4)}
+
+
+def test_spreads_matches_when_reuse_costs_more():
+    candidates = {cid: [(1, 0.95), (2, 0.92)] for cid in range(7)}
+
+    assignments = assign_vendor_paragraphs(candidates)
+    uses = [vid for vid, _ in assignments.values()]
+
+    #Five free uses of the best vendor paragraph, then the runner-up is cheaper than a penalty
+    assert uses.count(1) == assignment.FREE_REUSE_SLOTS
+    assert uses.count(2) == 2
+
+
+def test_duplicate_edges_keep_best_score_and_empty_clients_are_dropped():
+    candidates = {1: [(5, 0.7), (5, 0.9)], 2: []}
+
+    assert assign_vendor_paragraphs(candidates) == {1: (5, 0.9)}
+    assert assign_vendor_paragraphs({}) == {}
+
+
+def test_result_does_not_depend_on_candidate_order(tight_reuse):
+    rng = random.Random(7)
+    candidates = random_candidates(rng, 6, 3)
+    shuffled = {cid: list(reversed(options)) for cid, options in reversed(list(candidates.items()))}
+
+    assert assign_vendor_paragraphs(shuffled) == assign_vendor_paragraphs(candidates)
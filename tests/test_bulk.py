@@ -0,0 +1,137 @@
+import io
+import threading
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app.ingestion.bulk as bulk
+from app.ingestion.bulk import BulkBatch, BulkItem
+
+
+def make_batch(count: int) -> BulkBatch:
+    return BulkBatch("vendor", [BulkItem(i, f"policy_{i}.pdf", f"policy_{i}.pdf") for i in range(count)])
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    """
+    Stages without files, models or a database: extraction hands every
+    item straight to the splitters.
+    """
+
+    def extract_stage(batch, split_queue, extract_processes):
+        for item in batch.items:
+            item.extracted_text = "text"
+            bulk._put(batch, split_queue, item)
+        for _ in range(bulk.BULK_SPLIT_WORKERS):
+            bulk._put(batch, split_queue, bulk._DONE)
+
+    monkeypatch.setattr(bulk, "_extract_stage", extract_stage)
+    monkeypatch.setattr(bulk, "split_into_paragraphs", lambda text: [{"text": text}] * 3)
+    monkeypatch.setattr(bulk, "classify_texts", lambda texts, db, max_workers: ([{}] * len(texts), np.zeros((len(texts), 4))))
+    monkeypatch.setattr(bulk, "mark_document_failed", lambda db, document_id: None)
+    monkeypatch.setattr(bulk, "BULK_QUEUE_SIZE", 1)
+    monkeypatch.setattr(bulk, "BULK_EMBED_BATCH", 3)
+    monkeypatch.setattr(bulk, "QUEUE_POLL_SECONDS", 0.01)
+
+
+def run_with_timeout(batch: BulkBatch, seconds: float = 10):
+    runner = threading.Thread(target=bulk.run_bulk_ingestion, args=(batch,), daemon=True)
+    runner.start()
+    runner.join(seconds)
+    assert not runner.is_alive(), "bulk ingestion deadlocked"
+
+
+def test_dead_writer_aborts_instead_of_deadlocking(fake_pipeline, monkeypatch):
+
+    def write_stage(batch, write_queue):
+        raise RuntimeError("rollback failed")
+
+    monkeypatch.setattr(bulk, "_write_stage", write_stage)
+    batch = make_batch(20)
+
+    run_with_timeout(batch)
+
+    assert batch.status == "failed"
+    assert batch.abort_reason == "write_stage: rollback failed"
+    assert all(item.status == "failed" for item in batch.items)
+    assert batch.items[0].error == "aborted: write_stage: rollback failed"
+
+
+def test_partial_failures_complete_with_errors(fake_pipeline, monkeypatch):
+
+    def write_stage(batch, write_queue):
+        while True:
+            entries, finished = bulk._take_batch(batch, write_queue, len, 1)
+            for item, *_ in entries:
+                if item.document_id % 2:
+                    bulk._fail(batch, item, "write", ValueError("bad row"))
+                else:
+                    item.status = "completed"
+            if finished:
+                return
+
+    monkeypatch.setattr(bulk, "_write_stage", write_stage)
+    batch = make_batch(6)
+
+    run_with_timeout(batch)
+
+    assert batch.status == "completed_with_errors"
+    assert batch.abort_reason is None
+    assert batch.to_dict()["counts"] == {"completed": 3, "failed": 3}
+
+
+def test_outcome():
+    batch = make_batch(2)
+
+    for item in batch.items:
+        item.status = "completed"
+    assert batch.outcome() == "completed"
+
+    batch.items[0].status = "failed"
+    assert batch.outcome() == "completed_with_errors"
+
+    batch.items[1].status = "failed"
+    assert batch.outcome() == "failed"
+
+
+def zip_of(entries) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_zip_entries_are_read(monkeypatch):
+    contents = zip_of([("a.pdf", b"pdf"), ("docs/b.docx", b"docx"), ("notes.txt", b"skip")])
+
+    assert bulk._read_upload("policies.zip", contents) == [("a.pdf", b"pdf"), ("b.docx", b"docx")]
+
+
+def test_zip_file_count_checked_before_reading(monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_FILES", 3)
+    contents = zip_of([(f"{i}.pdf", b"pdf") for i in range(2)])
+
+    def no_reading(*args):
+        raise AssertionError("entries read before the limits were checked")
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", no_reading)
+
+    with pytest.raises(HTTPException) as error:
+        bulk._read_upload("policies.zip", contents, file_count=2)
+
+    assert "Too many files" in error.value.detail
+
+
+def test_zip_uncompressed_total_is_limited(monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_TOTAL_MB", 1)
+    #Compresses to a few KB
+    contents = zip_of([("a.pdf", b"\0" * (700 * 1024)), ("b.pdf", b"\0" * (700 * 1024))])
+
+    with pytest.raises(HTTPException) as error:
+        bulk._read_upload("policies.zip", contents)
+
+    assert "Batch too large" in error.value.detail
@@ -0,0 +1,80 @@
+import pytest
+
+import app.cli as cli
+from app.cli import Checkpoint, create_batch, file_key
+from app.db.database import Base, WorkerSessionLocal, worker_engine
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+
+
+@pytest.fixture
+def policy_files(tmp_path, monkeypatch):
+    Base.metadata.create_all(worker_engine)
+    monkeypatch.setattr(cli, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    paths = []
+    for name in ("a.pdf", "b.docx", "c.pdf"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+
+    return paths
+
+
+def document_count() -> int:
+    db = WorkerSessionLocal()
+    try:
+        return db.query(Document).count()
+    finally:
+        db.close()
+
+
+def test_claims_survive_reopening(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint"))
+    checkpoint.claim({"/data/a b.pdf:10:20": 7})
+
+    assert Checkpoint(str(tmp_path / "run.checkpoint")).claims == {"/data/a b.pdf:10:20": 7}
+
+
+def test_resumed_batch_reuses_orphaned_documents(policy_files, tmp_path):
+    keys = [file_key(path) for path in policy_files]
+    checkpoint_path = str(tmp_path / "run.checkpoint")
+
+    #First run creates the documents, then crashes before ingesting them
+    batch, items = create_batch(policy_files, keys, "vendor", Checkpoint(checkpoint_path))
+    created = document_count()
+    first_ids = [item.document_id for item in items]
+
+    #One document was written before the crash; another was marked failed
+    db = WorkerSessionLocal()
+    try:
+        db.query(Document).filter(Document.id == first_ids[0]).update({"status": "completed"})
+        db.query(Document).filter(Document.id == first_ids[1]).update({"status": "failed"})
+        db.add(Paragraph(document_id=first_ids[0], text="written"))
+        db.commit()
+    finally:
+        db.close()
+
+    batch, items = create_batch(policy_files, keys, "vendor", Checkpoint(checkpoint_path))
+
+    assert document_count() == created
+    assert [item.document_id for item in items] == first_ids
+    assert [item.status for item in items] == ["completed", "queued", "queued"]
+    assert items[0].paragraphs == 1
+    assert [item.document_id for item in batch.items] == first_ids[1:]
+
+    db = WorkerSessionLocal()
+    try:
+        assert db.query(Document).filter(Document.id == first_ids[1]).one().status == "processing"
+    finally:
+        db.close()
+
+
+def test_processes_capped(monkeypatch, tmp_path):
+    seen = {}
+    monkeypatch.setattr(cli, "BULK_EXTRACT_PROCESSES", 2)
+    monkeypatch.setattr(cli, "ingest", lambda directory, document_type, writer, checkpoint, processes, batch_size: seen.update(processes=processes))
+
+    cli.main(["ingest", str(tmp_path), "--document-type", "vendor", "--processes", "64", "--output", str(tmp_path / "out.jsonl")])
+
+    assert seen["processes"] == 2
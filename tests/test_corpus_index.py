@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.comparison.corpus_index as corpus_index
+from app.comparison.corpus_index import CorpusIndex
+from app.db.database import Base
+from app.models.documents import Document
+from app.models.paragraph import Paragraph
+import app.models.domains
+
+DIMENSION = 8
+
+
+def paragraph_vector(paragraph_id: int) -> np.ndarray:
+    vector = np.random.default_rng(paragraph_id).standard_normal(DIMENSION).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StubEncoder:
+
+    def encode(self, texts, normalize_embeddings=True):
+        return np.vstack([paragraph_vector(int(text.split()[-1])) for text in texts])
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def stub_embeddings(monkeypatch):
+    monkeypatch.setattr(
+        CorpusIndex,
+        "_document_vectors",
+        staticmethod(lambda document_id, paragraphs: np.vstack([paragraph_vector(p.id) for p in paragraphs]))
+    )
+    monkeypatch.setattr(corpus_index, "get_embedding_model", lambda: StubEncoder())
+
+
+def add_vendor_document(db, document_id: int, paragraph_ids, previous_document_id=None):
+    db.add(Document(
+        id=document_id,
+        filename=f"vendor_{document_id}.docx",
+        file_path=f"vendor_{document_id}.docx",
+        document_type="vendor",
+        status="completed",
+        previous_document_id=previous_document_id
+    ))
+    for paragraph_id in paragraph_ids:
+        db.add(Paragraph(id=paragraph_id, document_id=document_id, text=f"paragraph {paragraph_id}"))
+    db.commit()
+
+
+def base_path(index: CorpusIndex) -> str:
+    return os.path.join(index.directory, "base_meta.npz")
+
+
+def hit_ids(index: CorpusIndex, paragraph_id: int, top_k: int = 10):
+    return [hit["paragraph_id"] for hit in index.search(f"paragraph {paragraph_id}", top_k)]
+
+
+def test_add_writes_only_delta(db, tmp_path):
+    index = CorpusIndex(str(tmp_path))
+    add_vendor_document(db, 1, [1, 2, 3])
+
+    assert index.add_document(db, 1) == 3
+    assert not os.path.exists(base_path(index))
+    assert os.path.exists(os.path.join(index.directory, "delta_meta.npz"))
+    assert index.add_document(db, 1) == 0
+
+
+def test_base_rewritten_only_on_merge(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_index, "DELTA_MAX_VECTORS", 4)
+    index = CorpusIndex(str(tmp_path))
+
+    add_vendor_document(db, 1, [1, 2, 3])
+    add_vendor_document(db, 2, [4, 5])
+    add_vendor_document(db, 3, [6])
+
+    index.add_document(db, 1)
+    index.add_document(db, 2)
+
+    #Delta reached the limit and was folded into base
+    assert len(index.shards["base"]) == 5
+    assert len(index.shards["delta"]) == 0
+    merged_version = os.stat(base_path(index)).st_mtime_ns
+
+    index.add_document(db, 3)
+
+    assert os.stat(base_path(index)).st_mtime_ns == merged_version
+    assert len(index.shards["delta"]) == 1
+    assert sorted(hit_ids(index, 6)) == [1, 2, 3, 4, 5, 6]
+
+
+def test_other_process_sees_saved_shards(db, tmp_path):
+    writer = CorpusIndex(str(tmp_path))
+    add_vendor_document(db, 1, [1, 2])
+    writer.add_document(db, 1)
+
+    reader = CorpusIndex(str(tmp_path))
+
+    assert hit_ids(reader, 2, top_k=1) == [2]
+
+
+def test_superseded_revision_is_hidden(db, tmp_path):
+    index = CorpusIndex(str(tmp_path))
+    add_vendor_document(db, 1, [1, 2])
+    index.add_document(db, 1)
+
+    add_vendor_document(db, 2, [3, 4], previous_document_id=1)
+    corpus_index._corpus_index = index
+    try:
+        assert corpus_index.add_document_to_corpus(db, 2) == 2
+    finally:
+        corpus_index._corpus_index = None
+
+    assert sorted(hit_ids(index, 1)) == [3, 4]
+    assert index.is_removed(1)
+
+    #Tombstones persist for other processes
+    assert sorted(hit_ids(CorpusIndex(str(tmp_path)), 1)) == [3, 4]
+
+    #A removed document is not indexed again
+    assert index.add_document(db, 1) == 0
+
+
+def test_removed_document_dropped_at_merge(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_index, "DELTA_MAX_VECTORS", 3)
+    index = CorpusIndex(str(tmp_path))
+
+    add_vendor_document(db, 1, [1, 2])
+    index.add_document(db, 1)
+    assert index.remove_document(1)
+    assert not index.remove_document(1)
+    assert hit_ids(index, 1) == []
+
+    add_vendor_document(db, 2, [3, 4])
+    index.add_document(db, 2)
+
+    assert index.shards["base"].paragraph_ids.tolist() == [3, 4]
+    assert sorted(hit_ids(index, 3)) == [3, 4]
+
+
+def test_filtered_search_skips_removed_documents(db, tmp_path):
+    index = CorpusIndex(str(tmp_path))
+    add_vendor_document(db, 1, [1, 2])
+    add_vendor_document(db, 2, [3])
+    index.add_document(db, 1)
+    index.add_document(db, 2)
+
+    index.remove_document(2)
+
+    assert sorted(hit_ids(index, 3)) == [1, 2]
+    assert index.search("paragraph 3", 10, document_ids=[2]) == []
+
+
+def test_unfiltered_search_uses_deny_list_for_tombstones(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_index, "DELTA_MAX_VECTORS", 3)
+    index = CorpusIndex(str(tmp_path))
+    add_vendor_document(db, 1, [1, 2])
+    add_vendor_document(db, 2, [3, 4])
+    add_vendor_document(db, 3, [5])
+    index.add_document(db, 1)
+    index.add_document(db, 2)
+    index.add_document(db, 3)
+
+    #Documents 1 and 2 were merged into base; removing 1 leaves part of base searchable
+    assert index.shards["base"].paragraph_ids.tolist() == [1, 2, 3, 4]
+    index.remove_document(1)
+
+    allow_lists = []
+    real_allowed_ids = corpus_index.CorpusShard.allowed_ids
+
+    def spy(shard, domain_id, document_ids, removed_ids):
+        allowed = real_allowed_ids(shard, domain_id, document_ids, removed_ids)
+        allow_lists.append(allowed)
+        return allowed
+
+    monkeypatch.setattr(corpus_index.CorpusShard, "allowed_ids", spy)
+
+    assert sorted(hit_ids(index, 1)) == [3, 4, 5]
+    assert allow_lists and all(allowed is None for allowed in allow_lists)
+    assert index.shards["base"].removed_ids.tolist() == [1, 2]
+
+    #Removed paragraph ids are cached per shard, not recomputed per query
+    cached = index.shards["base"].removed_ids
+    hit_ids(index, 3)
+    assert index.shards["base"].removed_ids is cached
+
+    #Real filters still take the allow-list path, without the removed paragraphs
+    assert sorted(hit["paragraph_id"] for hit in index.search("paragraph 1", 10, document_ids=[1, 2])) == [3, 4]
+    assert any(allowed is not None for allowed in allow_lists)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.core.embedding_cache import DiskTier, EmbeddingCache, cache_key
+
+
+def fake_encode(texts):
+    return np.vstack([np.full(4, len(text), dtype=np.float32) for text in texts])
+
+
+def test_disk_tier_keeps_newest_rows(tmp_path):
+    disk = DiskTier(str(tmp_path / "cache.sqlite3"), max_items=3)
+    keys = [cache_key("model", f"text {i}", False) for i in range(5)]
+
+    for key in keys:
+        disk.put_many({key: np.ones(4, dtype=np.float16)})
+
+    assert len(disk) == 3
+    assert set(disk.get_many(keys)) == set(keys[2:])
+
+
+def test_disk_tier_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return fake_encode(texts)
+
+    EmbeddingCache(path=path).encode("model", ["a", "bb"], False, encode)
+    vectors = EmbeddingCache(path=path).encode("model", ["bb", "a"], False, encode)
+
+    assert calls == [["a", "bb"]]
+    assert vectors[:, 0].tolist() == [2.0, 1.0]
+
+
+def test_unwritable_directory_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+
+    cache = EmbeddingCache(path=str(blocker / "cache" / "cache.sqlite3"))
+
+    assert cache.disk is None
+    assert cache.encode("model", ["a", "a"], True, fake_encode).shape == (2, 4)
+    assert cache.stats()["misses"] == 1
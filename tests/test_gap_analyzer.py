@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+import app.comparison.gap_analyzer as gap_analyzer
+
+
+class ConcurrencyProbe:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, value):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return value * 2
+
+
+@pytest.mark.parametrize("max_workers", [2, 3])
+def test_run_concurrently_honours_max_workers(max_workers):
+    probe = ConcurrencyProbe()
+
+    results = gap_analyzer._run_concurrently(probe, [(i,) for i in range(12)], max_workers)
+
+    assert results == [i * 2 for i in range(12)]
+    assert probe.peak == max_workers
+
+
+def test_run_concurrently_inline_for_one_worker():
+    threads = []
+
+    results = gap_analyzer._run_concurrently(lambda v: threads.append(threading.current_thread()) or v, [(1,), (2,)], 1)
+
+    assert results == [1, 2]
+    assert set(threads) == {threading.current_thread()}
+
+
+def test_run_concurrently_raises_call_errors():
+
+    def fail(value):
+        if value == 3:
+            raise ValueError("bad clause")
+        return value
+
+    with pytest.raises(ValueError):
+        gap_analyzer._run_concurrently(fail, [(i,) for i in range(6)], 4)
@@ -0,0 +1,160 @@
+import pytest
+
+import app.core.llm_policy as llm_policy
+from app.core.llm_policy import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMCallPolicy,
+    FATAL,
+    THROTTLED,
+    TRANSIENT,
+    classify_error,
+)
+
+
+class ProviderError(Exception):
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Error response {status_code}")
+        self.status_code = status_code
+
+
+class NoWaitLimiter:
+
+    def wait(self):
+        pass
+
+    def defer(self, seconds: float):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    monkeypatch.setattr(llm_policy, "rate_limiter", NoWaitLimiter())
+    monkeypatch.setattr(llm_policy, "backoff_delay", lambda attempt, exc: 0.0)
+    monkeypatch.setattr(llm_policy.time, "sleep", lambda seconds: None)
+
+
+def failing(status_code: int):
+    def fn():
+        raise ProviderError(status_code)
+    return fn
+
+
+def open_breaker(policy: LLMCallPolicy):
+    for _ in range(policy.breaker.threshold):
+        policy.breaker.on_failure()
+    assert policy.breaker.opened_at is not None
+
+
+def expire_cooldown(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.cooldown + 1
+
+
+def test_classify_error():
+    assert classify_error(ProviderError(429)) == THROTTLED
+    assert classify_error(ProviderError(503)) == TRANSIENT
+    assert classify_error(TimeoutError()) == TRANSIENT
+    assert classify_error(ProviderError(400)) == FATAL
+    assert classify_error(ValueError("unparsable output")) == FATAL
+
+
+def test_transient_errors_are_retried():
+    policy = LLMCallPolicy(max_attempts=3)
+    outcomes = [ProviderError(503), ProviderError(503), "ok"]
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert policy.call(fn) == "ok"
+    assert policy.breaker.failures == 0
+
+
+def test_fatal_errors_are_not_retried():
+    policy = LLMCallPolicy(max_attempts=5)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        policy.call(fn)
+
+    assert len(calls) == 1
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    policy = LLMCallPolicy(max_attempts=1)
+
+    for _ in range(policy.breaker.threshold):
+        with pytest.raises(ProviderError):
+            policy.call(failing(503))
+
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: "never called")
+
+
+def test_successful_trial_closes_breaker():
+    policy = LLMCallPolicy(max_attempts=1)
+    open_breaker(policy)
+    expire_cooldown(policy.breaker)
+
+    assert policy.call(lambda: "ok") == "ok"
+    assert policy.breaker.opened_at is None
+    assert policy.call(lambda: "again") == "again"
+
+
+def test_failed_trial_reopens_breaker():
+    policy = LLMCallPolicy(max_attempts=1)
+    open_breaker(policy)
+    expire_cooldown(policy.breaker)
+
+    with pytest.raises(ProviderError):
+        policy.call(failing(503))
+
+    assert not policy.breaker.trial_running
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: "still open")
+
+
+def test_only_one_trial_at_a_time():
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.on_failure()
+    expire_cooldown(breaker)
+
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_throttled_trial_is_settled():
+    policy = LLMCallPolicy(max_attempts=1)
+    open_breaker(policy)
+    expire_cooldown(policy.breaker)
+
+    with pytest.raises(ProviderError):
+        policy.call(failing(429))
+
+    #Reopened for another cooldown, not stuck with a trial that never ends
+    assert not policy.breaker.trial_running
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: "cooling down")
+
+    expire_cooldown(policy.breaker)
+    assert policy.call(lambda: "ok") == "ok"
+    assert policy.breaker.opened_at is None
+
+
+def test_throttles_do_not_open_closed_breaker():
+    policy = LLMCallPolicy(max_attempts=1)
+
+    for _ in range(policy.breaker.threshold * 2):
+        with pytest.raises(ProviderError):
+            policy.call(failing(429))
+
+    assert policy.breaker.opened_at is None
+    assert policy.concurrency.limit == policy.concurrency.minimum
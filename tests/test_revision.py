@@ -0,0 +1,81 @@
+from app.ingestion.revision import locate_paragraphs, plan_revision
+from app.models.paragraph import Paragraph
+import app.models.domains
+
+OLD_LINES = [
+    "1. Scope",
+    "This policy covers all staff.",
+    "2. Access control",
+    "Access is reviewed quarterly.",
+    "3. Encryption",
+    "Data is encrypted at rest.",
+]
+
+
+def old_paragraphs():
+    return [
+        Paragraph(id=1, text="1. Scope This policy covers all staff."),
+        Paragraph(id=2, text="2. Access control Access is reviewed quarterly."),
+        Paragraph(id=3, text="3. Encryption Data is encrypted at rest."),
+    ]
+
+
+def describe(segments):
+    return [
+        ("carry", s["carry"].id) if "carry" in s else ("lines", s["lines"])
+        for s in segments
+    ]
+
+
+def test_locate_ignores_whitespace():
+    paragraphs = [Paragraph(id=1, text="1.  Scope\nThis policy   covers all staff.")]
+
+    assert locate_paragraphs(OLD_LINES, paragraphs) == {1: (0, 1)}
+
+
+def test_unchanged_revision_carries_everything():
+    assert describe(plan_revision(OLD_LINES, list(OLD_LINES), old_paragraphs())) == [
+        ("carry", 1), ("carry", 2), ("carry", 3)
+    ]
+
+
+def test_edited_paragraph_is_split_again_in_place():
+    new_lines = list(OLD_LINES)
+    new_lines[3] = "Access is reviewed monthly."
+
+    assert describe(plan_revision(OLD_LINES, new_lines, old_paragraphs())) == [
+        ("carry", 1),
+        ("lines", ["2. Access control", "Access is reviewed monthly."]),
+        ("carry", 3),
+    ]
+
+
+def test_inserted_and_removed_paragraphs():
+    new_lines = OLD_LINES[:2] + ["2a. Logging", "Logs are kept a year."] + OLD_LINES[4:]
+
+    assert describe(plan_revision(OLD_LINES, new_lines, old_paragraphs())) == [
+        ("carry", 1),
+        ("lines", ["2a. Logging", "Logs are kept a year."]),
+        ("carry", 3),
+    ]
+
+
+def test_paragraph_split_by_an_insertion_is_not_carried():
+    new_lines = OLD_LINES[:3] + ["Admins are reviewed weekly."] + OLD_LINES[3:]
+
+    assert describe(plan_revision(OLD_LINES, new_lines, old_paragraphs())) == [
+        ("carry", 1),
+        ("lines", ["2. Access control", "Admins are reviewed weekly.", "Access is reviewed quarterly."]),
+        ("carry", 3),
+    ]
+
+
+def test_unlocated_paragraph_is_split_again():
+    paragraphs = old_paragraphs()
+    paragraphs[0].text = "Scope: reworded by the splitter."
+
+    assert describe(plan_revision(OLD_LINES, list(OLD_LINES), paragraphs)) == [
+        ("lines", ["1. Scope", "This policy covers all staff."]),
+        ("carry", 2),
+        ("carry", 3),
+    ]
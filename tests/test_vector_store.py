@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+import app.core.embeddings as embeddings
+from app.comparison.vector_store import CURRENT_POINTER, DomainVectorStore
+
+TEXTS = ["access control policy", "encryption at rest", "incident response plan"]
+PARAGRAPH_IDS = [11, 12, 13]
+DOMAINS = ["Access", "Crypto", "Incidents"]
+
+
+class StubEncoder:
+    model_id = "stub-encoder"
+
+    def encode(self, texts, normalize_embeddings=True):
+        vectors = np.vstack([
+            np.random.default_rng(sum(text.encode())).standard_normal(8)
+            for text in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def stub_encoder(monkeypatch):
+    monkeypatch.setattr(embeddings, "_encoder", StubEncoder())
+
+
+def built_store(texts=TEXTS) -> DomainVectorStore:
+    store = DomainVectorStore()
+    store.build(texts, PARAGRAPH_IDS[:len(texts)], DOMAINS[:len(texts)])
+    return store
+
+
+def version_dirs(directory: str):
+    return sorted(name for name in os.listdir(directory) if name.startswith("v-"))
+
+
+def test_saved_store_searches_like_the_built_one(tmp_path):
+    directory = str(tmp_path / "7")
+    store = built_store()
+    store.save(directory, taxonomy_version=3)
+
+    loaded = DomainVectorStore.load(directory, taxonomy_version=3)
+
+    assert list(loaded.paragraph_ids) == PARAGRAPH_IDS
+    assert loaded.search("encryption at rest", top_k=3) == store.search("encryption at rest", top_k=3)
+
+
+def test_other_taxonomy_version_is_a_miss(tmp_path):
+    directory = str(tmp_path / "7")
+    built_store().save(directory, taxonomy_version=3)
+
+    assert DomainVectorStore.load(directory, taxonomy_version=4) is None
+    #Vectors stay usable for callers that do not need the labels
+    assert DomainVectorStore.load(directory) is not None
+
+
+def test_resave_publishes_new_version_and_removes_old(tmp_path):
+    directory = str(tmp_path / "7")
+    built_store().save(directory, taxonomy_version=1)
+    first = version_dirs(directory)
+
+    #A reader holding the first version keeps its mapping
+    reader = DomainVectorStore.load(directory)
+
+    built_store(TEXTS[:2]).save(directory, taxonomy_version=2)
+
+    assert len(version_dirs(directory)) == 1
+    assert version_dirs(directory) != first
+    assert len(DomainVectorStore.load(directory, taxonomy_version=2).texts) == 2
+    assert reader.texts[2] == TEXTS[2]
+
+
+def test_pre_versioning_store_is_read_and_replaced(tmp_path):
+    directory = str(tmp_path / "7")
+    built_store().save(directory)
+
+    #Lay the store out the way unversioned saves did
+    version = os.path.join(directory, version_dirs(directory)[0])
+    for name in os.listdir(version):
+        os.rename(os.path.join(version, name), os.path.join(directory, name))
+    os.rmdir(version)
+    os.remove(os.path.join(directory, CURRENT_POINTER))
+
+    assert list(DomainVectorStore.load(directory).paragraph_ids) == PARAGRAPH_IDS
+
+    built_store().save(directory, taxonomy_version=1)
+
+    assert sorted(os.listdir(directory)) == sorted([CURRENT_POINTER] + version_dirs(directory))
+    assert DomainVectorStore.load(directory, taxonomy_version=1) is not None
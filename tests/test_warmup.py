@@ -0,0 +1,75 @@
+import pytest
+
+import app.core.embeddings as embeddings
+import app.core.llm as llm
+import app.core.warmup as warmup
+
+
+class StubEncoder:
+
+    def encode(self, texts, **kwargs):
+        return [[0.0] for _ in texts]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, "_state", {
+        "started_at": None,
+        "finished_at": None,
+        "components": {name: False for name in ("embedding_model", "llm_clients", "domain_embeddings")},
+        "errors": {},
+    })
+    monkeypatch.setattr(embeddings, "_encoder", None)
+    monkeypatch.setattr(llm, "_llms", {})
+
+
+def load_stubs(monkeypatch):
+    monkeypatch.setattr(embeddings, "_encoder", StubEncoder())
+    monkeypatch.setattr(llm, "_llms", {(False, None): object()})
+
+
+def test_warmup_enabled_waits_for_warmup(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_ON_STARTUP", True)
+    assert not warmup.readiness()["ready"]
+
+    monkeypatch.setattr(warmup, "_load_embedding_model", lambda: load_stubs(monkeypatch))
+    monkeypatch.setattr(warmup, "_load_llm_clients", lambda: None)
+    monkeypatch.setattr(warmup, "_load_domain_embeddings", lambda: None)
+    warmup.warmup()
+
+    state = warmup.readiness()
+    assert state["ready"]
+    assert state["components"]["embedding_model"] and state["components"]["llm_clients"]
+    assert state["warmup_seconds"] is not None
+
+
+def test_warmup_enabled_not_ready_after_failure(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_ON_STARTUP", True)
+
+    def fail():
+        raise RuntimeError("no model files")
+
+    monkeypatch.setattr(warmup, "_load_embedding_model", fail)
+    monkeypatch.setattr(warmup, "_load_llm_clients", lambda: None)
+    monkeypatch.setattr(warmup, "_load_domain_embeddings", lambda: None)
+    warmup.warmup()
+
+    state = warmup.readiness()
+    assert not state["ready"]
+    assert state["errors"] == {"embedding_model": "no model files"}
+
+
+def test_warmup_disabled_is_ready_and_reports_lazy_loads(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_ON_STARTUP", False)
+
+    state = warmup.readiness()
+    assert state["ready"]
+    assert not state["components"]["embedding_model"]
+
+    #Loaded on first use, without warmup ever running
+    load_stubs(monkeypatch)
+
+    state = warmup.readiness()
+    assert state["ready"]
+    assert state["components"]["embedding_model"] and state["components"]["llm_clients"]
+    assert state["warmup_seconds"] is None